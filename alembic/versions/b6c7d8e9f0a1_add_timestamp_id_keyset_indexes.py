@@ -0,0 +1,30 @@
+"""Add (timestamp, id) indexes for keyset pagination of attendances and flagged logs
+
+Revision ID: b6c7d8e9f0a1
+Revises: a5b6c7d8e9f0
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6c7d8e9f0a1'
+down_revision: Union[str, None] = 'a5b6c7d8e9f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_attendance_timestamp_id', 'attendances', ['timestamp', 'id'], unique=False)
+    op.create_index('idx_flagged_logs_timestamp_id', 'flagged_logs', ['timestamp', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_flagged_logs_timestamp_id', table_name='flagged_logs')
+    op.drop_index('idx_attendance_timestamp_id', table_name='attendances')
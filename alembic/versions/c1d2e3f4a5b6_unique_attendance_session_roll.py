@@ -0,0 +1,58 @@
+"""Make attendance (session_id, roll_no) index unique
+
+Revision ID: c1d2e3f4a5b6
+Revises: bfa5c3f10971
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1d2e3f4a5b6'
+down_revision: Union[str, None] = 'bfa5c3f10971'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Offending (session_id, roll_no) pairs listed in the error
+MAX_REPORTED_DUPLICATES = 20
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The old check-then-insert race could record a student twice. Those rows
+    # are not deleted here: each may have its own selfie and flagged logs, so
+    # an operator has to decide which to keep before the index can be unique.
+    duplicates = op.get_bind().execute(sa.text("""
+        SELECT session_id, roll_no, COUNT(*) AS copies
+        FROM attendances
+        GROUP BY session_id, roll_no
+        HAVING COUNT(*) > 1
+        ORDER BY session_id, roll_no
+    """)).fetchall()
+    if duplicates:
+        extra_rows = sum(row.copies - 1 for row in duplicates)
+        pairs = ", ".join(
+            f"({row.session_id}, {row.roll_no}) x{row.copies}"
+            for row in duplicates[:MAX_REPORTED_DUPLICATES]
+        )
+        if len(duplicates) > MAX_REPORTED_DUPLICATES:
+            pairs += f", ... {len(duplicates) - MAX_REPORTED_DUPLICATES} more"
+        raise RuntimeError(
+            f"Cannot make idx_attendance_session_roll unique: {len(duplicates)} "
+            f"(session_id, roll_no) pairs have duplicate attendance rows ({extra_rows} extra rows). "
+            f"Resolve them and run the migration again: {pairs}"
+        )
+
+    op.drop_index('idx_attendance_session_roll', table_name='attendances')
+    op.create_index('idx_attendance_session_roll', 'attendances', ['session_id', 'roll_no'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_attendance_session_roll', table_name='attendances')
+    op.create_index('idx_attendance_session_roll', 'attendances', ['session_id', 'roll_no'], unique=False)
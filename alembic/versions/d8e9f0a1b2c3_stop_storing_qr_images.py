@@ -0,0 +1,33 @@
+"""Stop storing base64 QR images in qr_sessions
+
+QR images are rendered on request by GET /qr-session/{session_id}/image, so
+the column becomes nullable and existing data URIs are cleared.
+
+Revision ID: d8e9f0a1b2c3
+Revises: c7d8e9f0a1b2
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e9f0a1b2c3'
+down_revision: Union[str, None] = 'c7d8e9f0a1b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('qr_sessions', 'qr_image', existing_type=sa.String(), nullable=True)
+    op.execute("UPDATE qr_sessions SET qr_image = NULL WHERE qr_image IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("UPDATE qr_sessions SET qr_image = '' WHERE qr_image IS NULL")
+    op.alter_column('qr_sessions', 'qr_image', existing_type=sa.String(), nullable=False)
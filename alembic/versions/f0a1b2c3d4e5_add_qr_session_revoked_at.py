@@ -0,0 +1,36 @@
+"""Add revoked_at to qr_sessions for signed session token revocation
+
+Revision ID: f0a1b2c3d4e5
+Revises: e9f0a1b2c3d4
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f0a1b2c3d4e5'
+down_revision: Union[str, None] = 'e9f0a1b2c3d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('qr_sessions', sa.Column('revoked_at', sa.DateTime(timezone=True), nullable=True))
+    # The revocation list only looks at revoked sessions
+    op.create_index(
+        'idx_qr_sessions_revoked',
+        'qr_sessions',
+        ['revoked_at'],
+        postgresql_where=sa.text('revoked_at IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_qr_sessions_revoked', table_name='qr_sessions')
+    op.drop_column('qr_sessions', 'revoked_at')
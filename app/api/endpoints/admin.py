@@ -1,17 +1,19 @@
 import os
 import logging
 import pytz
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case, text
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import traceback
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 
 from app.db.base import get_db
-from app.schemas.attendance import AttendanceResponse
+from app.db.projections import attendance_response_query
+from app.schemas.attendance import AttendanceResponse, AttendanceList
 from app.schemas.admin import AdminLoginResponse, AdminCreateRequest
 from app.schemas.institution import InstitutionResponse, InstitutionCreate
 from app.schemas.venue import VenueResponse, VenueCreate
@@ -23,10 +25,15 @@ from app.models.venue import Venue
 from app.models.qr_session import QRSession  # Import QRSession model
 from app.core.dependencies import get_current_user
 from app.core.security import create_access_token
+from app.core.config import settings
+from app.utils.pagination import decode_cursor, keyset_page
+from app.services import statistics as statistics_service
+from app.services import rollup
+from app.services import attendance_export
+from app.services.venue_index import get_venue_index, invalidate_venue_index
 
 # Configure logger
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 router = APIRouter()
 
@@ -80,18 +87,28 @@ def admin_login(
     )
     return AdminLoginResponse(access_token=access_token)
 
-@router.get("/attendance/all", response_model=List[AttendanceResponse])
+@router.get("/attendance/all", response_model=Union[AttendanceList, List[AttendanceResponse]])
 def get_all_attendances(
     skip: int = 0, 
     limit: int = 100,
     branch: str = None,
     section: str = None,
     date: str = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all attendance records with optional filters"""
-    query = db.query(Attendance)
+    """
+    Get all attendance records with optional filters.
+
+    Without `cursor` this pages with skip/limit and returns a plain list.
+    Pass `cursor=` (empty) for the first page to switch to cursor pagination;
+    the response is then an AttendanceList whose next_cursor fetches the next page.
+    Its total is only counted, with a scan of every matching row, on the first
+    page and when `include_total=true`.
+    """
+    query = attendance_response_query(db)
     
     if branch:
         query = query.filter(Attendance.branch == branch)
@@ -105,12 +122,65 @@ def get_all_attendances(
             )
         except ValueError:
             pass
+
+    if cursor is not None:
+        total = query.count() if include_total and not cursor else None
+        items, next_cursor = keyset_page(query, Attendance.timestamp, Attendance.id, cursor, limit)
+        return AttendanceList(
+            items=items,
+            total=total,
+            page=1 if not cursor else None,
+            size=len(items),
+            next_cursor=next_cursor
+        )
     
     return query.order_by(Attendance.timestamp.desc())\
                 .offset(skip)\
                 .limit(limit)\
                 .all()
 
+@router.get("/attendance/export")
+def export_attendances(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    session_id: Optional[str] = None,
+    venue_id: Optional[int] = None,
+    branch: Optional[str] = None,
+    section: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Stream attendance records as CSV or NDJSON.
+    Dates are YYYY-MM-DD and inclusive. Rows are streamed from a server-side
+    cursor, so memory use stays flat however large the export is.
+    """
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else None
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid date format. Use YYYY-MM-DD"
+        )
+
+    rows = attendance_export.iter_attendance_rows(
+        session_id=session_id,
+        venue_id=venue_id,
+        branch=branch,
+        section=section,
+        start_date=start,
+        end_date=end
+    )
+    encode = attendance_export.iter_csv if format == "csv" else attendance_export.iter_ndjson
+    filename = f"attendance_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    logger.info(f"Exporting attendance as {format} for {current_user.get('sub')}")
+    return StreamingResponse(
+        encode(rows),
+        media_type=attendance_export.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 @router.get("/attendance/by-venue/{venue_id}", response_model=List[AttendanceResponse])
 def get_attendance_by_venue(
     venue_id: int,
@@ -118,13 +188,13 @@ def get_attendance_by_venue(
     current_user: dict = Depends(get_current_user)
 ):
     """Get all attendance records for a specific venue (by venue_id)"""
-    # Find all session_ids for this venue
-    session_ids = db.query(QRSession.session_id).filter(QRSession.venue_id == venue_id).all()
-    session_ids = [sid[0] for sid in session_ids]
-    if not session_ids:
-        return []
+    # Sessions for this venue, resolved by the database as a subquery
+    venue_session_ids = db.query(QRSession.session_id).filter(QRSession.venue_id == venue_id)
     # Get all attendance records for these session_ids
-    records = db.query(Attendance).filter(Attendance.session_id.in_(session_ids)).order_by(Attendance.timestamp.desc()).all()
+    records = attendance_response_query(db)\
+        .filter(Attendance.session_id.in_(venue_session_ids.scalar_subquery()))\
+        .order_by(Attendance.timestamp.desc())\
+        .all()
     return records
 
 @router.get("/statistics/daily")
@@ -141,7 +211,7 @@ def get_daily_statistics(
     logger = logging.getLogger(__name__)
     
     # Use IST timezone (UTC+5:30) to match the database timestamps
-    ist = pytz.timezone('Asia/Kolkata')
+    ist = pytz.timezone(settings.STATS_TIMEZONE)
     now = datetime.now(ist)
     
     # Calculate date range in IST
@@ -162,53 +232,15 @@ def get_daily_statistics(
         }
         current_date += timedelta(days=1)
     
-    # Get daily counts
+    # Get daily counts from the rollup table (cost doesn't grow with history)
     try:
-        # First, check if we have any attendance records at all
-        total_records = db.query(func.count(Attendance.id)).scalar()
-        logger.info(f"Total attendance records in database: {total_records}")
-        
-        # Get the date range of records in the database
-        min_date = db.query(func.min(Attendance.timestamp)).scalar()
-        max_date = db.query(func.max(Attendance.timestamp)).scalar()
-        logger.info(f"Attendance records date range: {min_date} to {max_date}")
-        
-        # Use SQL directly to handle timezone conversion properly
-        # This query extracts the date part in the database's timezone
-        query = text("""
-            SELECT 
-                DATE(timestamp) as date,
-                COUNT(*) as total,
-                SUM(CASE WHEN is_valid_location = TRUE THEN 1 ELSE 0 END) as valid,
-                SUM(CASE WHEN is_valid_location = FALSE THEN 1 ELSE 0 END) as invalid
-            FROM 
-                attendances
-            WHERE 
-                timestamp >= :start_date AND timestamp <= :end_date
-            GROUP BY 
-                DATE(timestamp)
-            ORDER BY 
-                date
-        """)
-        
-        daily_counts = db.execute(query, {
-            "start_date": start_date.strftime("%Y-%m-%d"),
-            "end_date": end_date.strftime("%Y-%m-%d 23:59:59")
-        }).fetchall()
-        
+        daily_counts = rollup.daily_counts(db, start_date.date(), end_date.date())
         logger.info(f"Daily counts query returned {len(daily_counts)} rows")
         
         # Fill in the actual data
-        for day in daily_counts:
-            date_str = day.date.strftime("%Y-%m-%d") if hasattr(day, 'date') else str(day[0])
-            logger.info(f"Processing data for date: {date_str}, total: {day.total if hasattr(day, 'total') else day[1]}")
-            
+        for date_str, counts in daily_counts.items():
             if date_str in result:
-                result[date_str] = {
-                    "total": int(day.total if hasattr(day, 'total') else day[1]),
-                    "valid": int(day.valid if hasattr(day, 'valid') else day[2] or 0),
-                    "invalid": int(day.invalid if hasattr(day, 'invalid') else day[3] or 0)
-                }
+                result[date_str] = counts
     except Exception as e:
         logger.error(f"Error getting statistics: {str(e)}")
         import traceback
@@ -221,10 +253,20 @@ def get_flagged_logs(
     skip: int = 0,
     limit: int = 100,
     roll_no: str = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all flagged attendance logs"""
+    """
+    Get all flagged attendance logs.
+
+    Pass `cursor=` (empty) for the first page to use cursor pagination; the
+    response is then {items, total, page, size, next_cursor} like AttendanceList,
+    with total only counted on the first page when `include_total=true`.
+    """
+    # Validate the cursor up front so a bad one is a 400, not a 500
+    decode_cursor(cursor)
     try:
         # Add logging
         logger.info(f"Fetching flagged logs. Skip: {skip}, Limit: {limit}, Roll No Filter: {roll_no}")
@@ -236,11 +278,16 @@ def get_flagged_logs(
         if roll_no:
             query = query.filter(FlaggedLog.roll_no == roll_no)
         
-        # Execute the query with ordering, offset and limit
-        logs = query.order_by(FlaggedLog.timestamp.desc())\
-            .offset(skip)\
-            .limit(limit)\
-            .all()
+        next_cursor = None
+        if cursor is not None:
+            total = query.count() if include_total and not cursor else None
+            logs, next_cursor = keyset_page(query, FlaggedLog.timestamp, FlaggedLog.id, cursor, limit)
+        else:
+            # Execute the query with ordering, offset and limit
+            logs = query.order_by(FlaggedLog.timestamp.desc())\
+                .offset(skip)\
+                .limit(limit)\
+                .all()
             
         # Convert to dict for response
         result = []
@@ -255,6 +302,14 @@ def get_flagged_logs(
             })
             
         logger.info(f"Found {len(result)} flagged logs")
+        if cursor is not None:
+            return {
+                "items": result,
+                "total": total,
+                "page": 1 if not cursor else None,
+                "size": len(result),
+                "next_cursor": next_cursor
+            }
         return result
         
     except Exception as e:
@@ -272,32 +327,7 @@ def get_statistics_summary(
 ) -> Dict:
     """Get summary statistics for attendance"""
     try:
-        # Get total attendance count
-        total_attendance = db.query(Attendance).count()
-        
-        # Get valid locations count
-        valid_locations = db.query(Attendance).filter(Attendance.is_valid_location == True).count()
-        
-        # Get invalid locations count
-        invalid_locations = db.query(Attendance).filter(Attendance.is_valid_location == False).count()
-        
-        # Get unique students count
-        unique_students = db.query(Attendance.roll_no).distinct().count()
-        
-        # Get today's attendance count
-        today = datetime.now().date()
-        today_start = datetime.combine(today, datetime.min.time())
-        today_attendance = db.query(Attendance).filter(Attendance.timestamp >= today_start).count()
-        
-        # Return the statistics
-        return {
-            "total_attendance": total_attendance,
-            "valid_locations": valid_locations,
-            "invalid_locations": invalid_locations,
-            "unique_students": unique_students,
-            "today_attendance": today_attendance,
-            "flagged_logs": db.query(FlaggedLog).count()
-        }
+        return statistics_service.get_statistics_summary(db)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving statistics: {str(e)}")
 
@@ -338,11 +368,15 @@ def create_venue(venue: VenueCreate, db: Session = Depends(get_db)):
         name=venue.name,
         latitude=venue.latitude,
         longitude=venue.longitude,
-        radius_meters=venue.radius_meters
+        radius_meters=venue.radius_meters,
+        geofence_zones=[
+            zone.model_dump(exclude_none=True) for zone in venue.geofence_zones
+        ] if venue.geofence_zones else None
     )
     db.add(db_venue)
     db.commit()
     db.refresh(db_venue)
+    invalidate_venue_index(db_venue.institution_id)
     return db_venue
 
 @router.get("/venues", response_model=List[dict])
@@ -383,6 +417,21 @@ def list_venues(db: Session = Depends(get_db)):
             detail=f"Failed to list venues: {str(e)}"
         )
 
+@router.get("/venues/locate")
+def locate_venue(
+    institution_id: int,
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    db: Session = Depends(get_db)
+):
+    """Find which of an institution's venues contain a location"""
+    venue_ids = get_venue_index(db, institution_id).locate(lat, lon)
+    venues = db.query(Venue.id, Venue.name).filter(Venue.id.in_(venue_ids)).all() if venue_ids else []
+    return {
+        "location": {"lat": lat, "lon": lon},
+        "venues": [{"id": venue.id, "name": venue.name} for venue in venues]
+    }
+
 @router.get("/venues/{venue_id}", response_model=VenueResponse)
 def get_venue(venue_id: int, db: Session = Depends(get_db)):
     """Get venue by ID"""
@@ -419,8 +468,8 @@ def get_venue_statistics(
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=days)
     
-    # Get QR sessions for this venue
-    sessions = db.query(QRSession).filter(
+    # Get QR session ids for this venue
+    sessions = db.query(QRSession.session_id).filter(
         QRSession.venue_id == venue_id,
         QRSession.created_at >= start_date,
         QRSession.created_at <= end_date
@@ -428,24 +477,22 @@ def get_venue_statistics(
     
     session_ids = [session.session_id for session in sessions]
     
-    # Get attendance records for these sessions
-    attendance_records = db.query(Attendance).filter(
-        Attendance.session_id.in_(session_ids)
-    ).all()
+    # Get attendance per day for this venue from the rollup table
+    attendance_by_date = {
+        date_str: counts["total"]
+        for date_str, counts in rollup.daily_counts(
+            db,
+            start_date.astimezone(pytz.timezone(settings.STATS_TIMEZONE)).date(),
+            end_date.astimezone(pytz.timezone(settings.STATS_TIMEZONE)).date(),
+            venue_id=venue_id
+        ).items()
+    }
     
-    # Get flagged logs for these sessions
-    flagged_logs = db.query(FlaggedLog).filter(
+    # Get flagged log reasons for these sessions
+    flagged_logs = db.query(FlaggedLog.reason).filter(
         FlaggedLog.session_id.in_(session_ids)
     ).all()
     
-    # Organize by date
-    attendance_by_date = {}
-    for record in attendance_records:
-        date_str = record.timestamp.strftime("%Y-%m-%d")
-        if date_str not in attendance_by_date:
-            attendance_by_date[date_str] = 0
-        attendance_by_date[date_str] += 1
-    
     # Organize flagged logs by reason
     flagged_by_reason = {}
     for log in flagged_logs:
@@ -471,7 +518,7 @@ def get_venue_statistics(
             "session_ids": session_ids
         },
         "attendance": {
-            "total": len(attendance_records),
+            "total": sum(attendance_by_date.values()),
             "by_date": attendance_by_date
         },
         "flagged_logs": {
@@ -482,37 +529,53 @@ def get_venue_statistics(
 
 @router.get("/recent-activity")
 def get_recent_activity(
-    limit: int = 10,
+    response: Response,
+    limit: int = Query(10, gt=0, le=500),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get recent QR sessions with attendee count and duration"""
-    # Get recent sessions (last 24 hours or limit)
-    recent_sessions = db.query(QRSession).order_by(QRSession.created_at.desc()).limit(limit).all()
+    """
+    Get recent QR sessions with attendee count and duration.
+    Pass the X-Next-Cursor response header back as `cursor` to get the next page.
+    """
+    # Page of sessions with their venue, newest first, keyset-paginated on (created_at, id)
+    page_query = db.query(
+        QRSession.id,
+        QRSession.session_id,
+        QRSession.created_at,
+        QRSession.expires_at,
+        Venue.name.label("venue_name"),
+        Institution.name.label("institution_name")
+    ).outerjoin(Venue, Venue.id == QRSession.venue_id)\
+        .outerjoin(Institution, Institution.id == Venue.institution_id)
+    rows, next_cursor = keyset_page(page_query, QRSession.created_at, QRSession.id, cursor, limit)
+
+    # Attendee counts for the sessions on this page only
+    attendee_counts = dict(
+        db.query(Attendance.session_id, func.count(Attendance.id))
+        .filter(Attendance.session_id.in_([row.session_id for row in rows]))
+        .group_by(Attendance.session_id)
+        .all()
+    ) if rows else {}
+
     result = []
-    for session in recent_sessions:
-        # Get venue and institution
-        venue = db.query(Venue).filter(Venue.id == session.venue_id).first()
-        institution_name = None
-        if venue:
-            institution = db.query(Institution).filter(Institution.id == venue.institution_id).first()
-            institution_name = institution.name if institution else None
+    for row in rows:
         # Calculate duration in minutes
         duration = None
-        if session.created_at and session.expires_at:
-            duration = int((session.expires_at - session.created_at).total_seconds() // 60)
-        # Count attendees
-        attendee_count = db.query(func.count(Attendance.id)).filter(Attendance.session_id == session.session_id).scalar()
+        if row.created_at and row.expires_at:
+            duration = int((row.expires_at - row.created_at).total_seconds() // 60)
         result.append({
-            "session_id": session.session_id,
-            "venue_name": venue.name if venue else None,
-            "institution_name": institution_name,
-            "campus": f"{venue.name} ({institution_name})" if venue and institution_name else None,
-            "created_at": session.created_at,
-            "expires_at": session.expires_at,
+            "session_id": row.session_id,
+            "venue_name": row.venue_name,
+            "institution_name": row.institution_name,
+            "campus": f"{row.venue_name} ({row.institution_name})" if row.venue_name and row.institution_name else None,
+            "created_at": row.created_at,
+            "expires_at": row.expires_at,
             "duration": duration,
-            "attendee_count": attendee_count
+            "attendee_count": attendee_counts.get(row.session_id, 0)
         })
-    return result
-
 
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return result
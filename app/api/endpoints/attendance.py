@@ -1,21 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import Column, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Column, DateTime, select
 from datetime import datetime, timezone, UTC
 from typing import Optional
 import logging
 import os
-import traceback
-from app.db.base import get_db, SessionLocal
+from app.db.base import get_db, get_async_db
 from app.models.qr_session import QRSession
 from app.models.attendance import Attendance
 from app.models.venue import Venue
 from app.models.flagged_log import FlaggedLog
 from app.schemas.attendance import AttendanceCreate, AttendanceResponse
 from app.services.attendance_handler import AttendanceHandler
+from app.services.session_cache import get_cached_session_async, revoked_sessions, session_cache
+from app.services.upload_queue import upload_queue
 from app.core.exceptions import (
     AttendanceException,
     InvalidLocationException,
+    InvalidSessionException,
     SessionNotFoundException,
     SessionExpiredException,
     DuplicateAttendanceException,
@@ -23,53 +26,52 @@ from app.core.exceptions import (
     CoordinatePrecisionException,
     InvalidFileException,
     FileSizeTooLargeException,
-    FileTypeNotAllowedException
+    FileTypeNotAllowedException,
+    InvalidQRTokenException
 )
 from app.core.config import settings
+from app.core.metrics import mark_stage, observe_stage_since_request_start
 from app.services.geo_validation import GeoValidator
+from app.services.qr_tokens import read_session_token, session_from_claims, verify_rotating_token
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-def log_failed_attempt(log_data: dict):
+async def log_failed_attempt(db: AsyncSession, log_data: dict):
     """
-    Logs a failed attendance attempt in a separate database session
-    to ensure it's saved even if the main transaction is rolled back.
+    Logs a failed attendance attempt on the request's own session, so a
+    rejected request never holds a second pool connection. Every caller has
+    either written nothing on it yet or already rolled its write back, so
+    the commit saves only the log.
     """
-    db_log = None
     try:
-        db_log = SessionLocal()
-        flagged_log = FlaggedLog(**log_data)
-        db_log.add(flagged_log)
-        db_log.commit()
-        logger.info(f"Successfully logged failed attempt for roll_no: {log_data.get('roll_no')}")
-    except Exception as e:
-        # --- START AGGRESSIVE DEBUGGING ---
-        # Make the error extremely visible in the server logs
-        print("---!!! CRITICAL ERROR WRITING TO FLAGGED LOGS !!!---")
-        import traceback
-        traceback.print_exc()
-        print(f"---!!! LOGGING ERROR DETAILS: {e} !!!---")
-        # --- END AGGRESSIVE DEBUGGING ---
-        
-        logger.error(f"Critical error writing to flagged_logs: {e}")
-        if db_log:
-            db_log.rollback()
-    finally:
-        if db_log:
-            db_log.close()
+        db.add(FlaggedLog(**log_data))
+        await db.commit()
+        logger.debug("Logged failed attempt for roll_no %s", log_data.get("roll_no"))
+    except Exception:
+        await db.rollback()
+        logger.exception("Critical error writing to flagged_logs")
 
 @router.get("/selfie/{attendance_id}")
 async def get_selfie(
     attendance_id: int,
     db: Session = Depends(get_db)
 ):
-    # Get the attendance record
+    # Get the attendance record (legacy selfie bytes are deferred on the model)
     attendance = db.query(Attendance).filter(Attendance.id == attendance_id).first()
     if not attendance:
         raise HTTPException(status_code=404, detail="Attendance record not found")
     
+    # Serve from the blob store when the selfie has been moved there
+    if attendance.selfie_blob_key:
+        content = await upload_queue.read(attendance.selfie_blob_key)
+        if content is not None:
+            return Response(
+                content=content,
+                media_type=attendance.selfie_content_type or "image/jpeg"
+            )
+    
     # Check if selfie data exists in database
     if attendance.selfie_data:
         return Response(
@@ -105,10 +107,13 @@ async def mark_attendance(
     location_lat: float = Form(...),
     location_lon: float = Form(...),
     selfie: UploadFile = File(...),
-    session: Session = Depends(get_db)
+    qr_token: Optional[str] = Form(None),
+    session_token: Optional[str] = Form(None),
+    session: AsyncSession = Depends(get_async_db)
 ):
-    logger.info(f"\n=== Starting attendance marking process for session {session_id} ===")
-    logger.info(f"Raw coordinates received: lat={location_lat} ({type(location_lat)}), lon={location_lon} ({type(location_lon)})")
+    # FastAPI has already received and parsed the multipart body
+    observe_stage_since_request_start("parse")
+    logger.debug("Marking attendance for session %s, raw coordinates lat=%r lon=%r", session_id, location_lat, location_lon)
 
     try:
         # Validate file size
@@ -144,62 +149,115 @@ async def mark_attendance(
         location_lat = round(float(location_lat), 7)
         location_lon = round(float(location_lon), 7)
         
-        logger.info(f"Processed coordinates: lat={location_lat}, lon={location_lon}")
-
-        # OPTIMIZATION: Use a single query with joins to get session and venue data
-        from sqlalchemy.orm import joinedload
-        
-        qr_session = session.query(QRSession).options(
-            joinedload(QRSession.venue)
-        ).filter_by(session_id=session_id).first()
+        logger.debug("Processed coordinates: lat=%s, lon=%s", location_lat, location_lon)
+
+        # Token checks, revocation list and the session lookup itself
+        with mark_stage("session_lookup"):
+            # A rotating QR token is checked from its signature alone, so forged or
+            # stale tokens are rejected before any session lookup
+            if qr_token is not None and not verify_rotating_token(session_id, qr_token):
+                logger.warning("Invalid or stale QR token for session %s", session_id)
+                await log_failed_attempt(session, {
+                    "session_id": session_id, "roll_no": roll_no,
+                    "reason": "Invalid QR Token", "details": "QR token is forged or from an old rotation"
+                })
+                raise InvalidQRTokenException()
+
+            # OPTIMIZATION: A signed session token carries the session's expiry and
+            # venue (geometry from the venue cache), so no session lookup is needed
+            # unless the session is on the revocation list
+            qr_session = None
+            revoked = await revoked_sessions.contains(session_id)
+            if session_token is not None:
+                claims = read_session_token(session_token, session_id)
+                if claims is None:
+                    logger.warning("Invalid session token for session %s", session_id)
+                    await log_failed_attempt(session, {
+                        "session_id": session_id, "roll_no": roll_no,
+                        "reason": "Invalid Session Token", "details": "Session token is forged or malformed"
+                    })
+                    raise InvalidSessionException("Invalid session token")
+                if not revoked:
+                    qr_session = await session_from_claims(session, session_id, claims)
+
+            if qr_session is None or revoked:
+                if revoked:
+                    session_cache.invalidate(session_id)
+                # Served from the in-process session cache; on a miss a single
+                # query with joins loads the session and venue data
+                qr_session = await get_cached_session_async(session, session_id)
         
         if not qr_session:
-            logger.error(f"Session not found in database: {session_id}")
-            log_failed_attempt({
+            logger.warning("Session not found: %s", session_id)
+            await log_failed_attempt(session, {
                 "session_id": session_id, "roll_no": roll_no,
                 "reason": "Session Not Found", "details": "Session ID not found in database"
             })
             raise SessionNotFoundException(session_id)
         
-        logger.info(f"Session found: {qr_session}")
-        logger.info(f"Session expiry: {qr_session.expires_at}")
+        logger.debug("Session found: %s", qr_session)
         
         if qr_session.is_expired():
-            logger.error(f"Session expired: {session_id}")
-            log_failed_attempt({
+            logger.warning("Session expired: %s", session_id)
+            await log_failed_attempt(session, {
                 "session_id": session_id, "roll_no": roll_no,
                 "reason": "Expired Session",
                 "details": f"Attempted to use expired session. Expired at: {qr_session.expires_at}"
             })
             raise SessionExpiredException(str(qr_session.expires_at))
 
-        # OPTIMIZATION: Use EXISTS for faster duplicate check
-        existing = session.query(Attendance).filter(
-            Attendance.session_id == session_id,
-            Attendance.roll_no == roll_no
-        ).first()
-        
-        if existing:
-            logger.error(f"Duplicate attendance for roll no {roll_no} in session {session_id}")
-            log_failed_attempt({
+        if qr_session.revoked_at is not None:
+            logger.warning("Session revoked: %s", session_id)
+            await log_failed_attempt(session, {
                 "session_id": session_id, "roll_no": roll_no,
-                "reason": "Duplicate Attendance",
-                "details": f"Attempted to mark attendance again. Original timestamp: {existing.timestamp}"
+                "reason": "Revoked Session",
+                "details": f"Attempted to use session revoked at: {qr_session.revoked_at}"
             })
-            raise DuplicateAttendanceException(
-                roll_no=roll_no,
-                session_id=session_id,
-                timestamp=str(existing.timestamp)
-            )
+            raise InvalidSessionException("Session has been revoked")
+
+        if qr_session.rotation_seconds and qr_token is None:
+            logger.warning("Missing QR token for rotating session %s", session_id)
+            await log_failed_attempt(session, {
+                "session_id": session_id, "roll_no": roll_no,
+                "reason": "Invalid QR Token", "details": "Rotating session scanned without a QR token"
+            })
+            raise InvalidQRTokenException()
+
+        # OPTIMIZATION: Use EXISTS for faster duplicate check.
+        # Skipped in single-statement and batched modes, where the unique index
+        # on (session_id, roll_no) rejects duplicates at insert time.
+        if not (settings.ATTENDANCE_INSERT_ON_CONFLICT or settings.ATTENDANCE_BATCH_ENABLED):
+            with mark_stage("duplicate_check"):
+                result = await session.execute(
+                    select(Attendance.id, Attendance.timestamp).where(
+                        Attendance.session_id == session_id,
+                        Attendance.roll_no == roll_no
+                    ).limit(1)
+                )
+                existing = result.first()
+            
+            if existing:
+                logger.warning("Duplicate attendance for roll no %s in session %s", roll_no, session_id)
+                await log_failed_attempt(session, {
+                    "session_id": session_id, "roll_no": roll_no,
+                    "reason": "Duplicate Attendance",
+                    "details": f"Attempted to mark attendance again. Original timestamp: {existing.timestamp}"
+                })
+                raise DuplicateAttendanceException(
+                    roll_no=roll_no,
+                    session_id=session_id,
+                    timestamp=str(existing.timestamp)
+                )
 
         # Step 3: Get venue for location validation (already loaded with session)
         venue = qr_session.venue
-        logger.info(f"Using venue for validation: {venue.name if venue else 'None'}")
+        logger.debug("Using venue for validation: %s", venue.name if venue else None)
         
         # Step 4: Validate location
-        geo_validator = GeoValidator(venue)
-        is_valid, distance = geo_validator.is_location_valid(location_lat, location_lon)
-        logger.info(f"Location validation result: valid={is_valid}, distance={distance:.2f}m")
+        with mark_stage("geofence"):
+            geo_validator = GeoValidator(venue)
+            is_valid, distance = geo_validator.is_location_valid(location_lat, location_lon)
+        logger.debug("Location validation result: valid=%s, distance=%.2fm", is_valid, distance)
         
         if not is_valid:
             venue_name = venue.name if venue else "campus"
@@ -221,7 +279,7 @@ async def mark_attendance(
             }
 
             # 2. Log the failure using the robust, independent logger
-            log_failed_attempt({
+            await log_failed_attempt(session, {
                 "session_id": session_id,
                 "roll_no": roll_no,
                 "reason": "Location Out of Range",
@@ -252,13 +310,27 @@ async def mark_attendance(
         # Step 7: Process attendance
         attendance_handler = AttendanceHandler(session)
         try:
+            if settings.ATTENDANCE_BATCH_ENABLED:
+                # Committed together with concurrent scans; returns once durable
+                await attendance_handler.insert_attendance_batched(attendance_data, selfie)
+                return {"success": True, "message": "Attendance recorded successfully"}
+
+            if settings.ATTENDANCE_INSERT_ON_CONFLICT:
+                # Session and location are already validated above, so this is
+                # a single INSERT ... ON CONFLICT DO NOTHING RETURNING round trip
+                await attendance_handler.insert_attendance(attendance_data, selfie)
+                return {"success": True, "message": "Attendance recorded successfully"}
+
+            # The session and location were validated above; don't repeat either
             success, message = await attendance_handler.process_attendance(
                 attendance_data,
-                selfie
+                selfie,
+                session=qr_session,
+                location_check=(is_valid, distance)
             )
             
             if not success:
-                logger.error(f"Attendance processing failed: {message}")
+                logger.error("Attendance processing failed: %s", message)
                 raise HTTPException(
                     status_code=400, 
                     detail={
@@ -270,16 +342,24 @@ async def mark_attendance(
             return {"success": True, "message": message}
             
         except InvalidLocationException as le:
-            logger.error(f"Location validation failed: {str(le)}")
+            logger.warning("Location validation failed: %s", le)
             raise HTTPException(
                 status_code=400,
                 detail=le.to_dict()
             )
+        except DuplicateAttendanceException as de:
+            logger.warning("Duplicate attendance for roll no %s in session %s", roll_no, session_id)
+            await log_failed_attempt(session, {
+                "session_id": session_id, "roll_no": roll_no,
+                "reason": "Duplicate Attendance",
+                "details": de.detail["message"]
+            })
+            raise de
         except AttendanceException as ae:
-            logger.error(f"Attendance error: {str(ae)}")
+            logger.warning("Attendance error: %s", ae)
             raise ae
         except Exception as e:
-            logger.error(f"Attendance processing error: {str(e)}")
+            logger.exception("Attendance processing error")
             raise HTTPException(
                 status_code=400,
                 detail={
@@ -291,14 +371,14 @@ async def mark_attendance(
     except (SessionNotFoundException, SessionExpiredException, 
             DuplicateAttendanceException, InvalidCoordinateException,
             CoordinatePrecisionException, FileSizeTooLargeException,
-            FileTypeNotAllowedException) as e:
+            FileTypeNotAllowedException, InvalidQRTokenException,
+            InvalidSessionException) as e:
         # These exceptions already have the right format
         raise e
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Unexpected error in attendance marking: {str(e)}")
-        logger.error(traceback.format_exc())
+        logger.exception("Unexpected error in attendance marking")
         raise HTTPException(
             status_code=500,
             detail={
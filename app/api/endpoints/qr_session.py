@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, UTC
@@ -12,7 +12,7 @@ import traceback
 
 # Import models and schemas
 from app.db.base import get_db
-from app.schemas.qr_session import QRSessionCreate, QRSessionResponse, QRSessionRequest
+from app.schemas.qr_session import QRSessionCreate, QRSessionResponse, QRSessionRequest, QRSessionToken
 from app.schemas.attendance import AttendanceCreate, AttendanceResponse
 from app.models.qr_session import QRSession
 from app.models.attendance import Attendance
@@ -20,6 +20,7 @@ from app.models.venue import Venue
 from app.models.flagged_log import FlaggedLog  # Add this import
 from app.models.institution import Institution  # Import Institution model
 from app.core.config import settings
+from app.core.dependencies import get_current_user
 from app.services.geo_validation import GeoValidator, InvalidLocationException
 
 
@@ -35,6 +36,14 @@ from app.db.base import get_db
 from app.schemas.qr_session import QRSessionCreate, QRSessionResponse
 from app.schemas.attendance import AttendanceCreate, AttendanceResponse
 from app.services.qr_generator import QRGenerator
+from app.services.session_cache import session_cache, get_cached_session, revoked_sessions
+from app.services.qr_renderer import new_session_id, qr_renderer
+from app.services.qr_tokens import make_rotating_token, seconds_left_in_slot
+from app.services.session_cache import get_cached_session_async
+from app.db.base import get_async_db
+from app.utils.qr_render import QR_FORMATS
+from sqlalchemy.ext.asyncio import AsyncSession
+import hashlib
 from app.models.qr_session import QRSession
 import uuid
 import qrcode
@@ -62,16 +71,85 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def qr_image_url(request: Request, session_id: str) -> str:
+    """Absolute URL of a session's QR image"""
+    base_url = settings.PUBLIC_BASE_URL or str(request.base_url)
+    return f"{base_url.rstrip('/')}{settings.API_V1_STR}/qr-session/{session_id}/image"
+
+@router.get("/{session_id}/image")
+async def get_qr_image(
+    session_id: str,
+    request: Request,
+    format: str = Query("png", pattern="^(png|svg)$"),
+    size: int = Query(10, ge=1, le=40, description="Pixels per QR module"),
+    border: int = Query(4, ge=0, le=16, description="Quiet zone in modules"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    QR code image for a session as PNG or SVG.
+    A session's image never changes, so it is served with a strong ETag and
+    long-lived Cache-Control for browsers and CDNs. Rotating sessions get the
+    image for the current token, cacheable until the next rotation.
+    """
+    qr_session = await get_cached_session_async(db, session_id)
+    if qr_session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    token = None
+    if qr_session.rotation_seconds:
+        token = make_rotating_token(session_id, qr_session.rotation_seconds)
+        cache_control = f"public, max-age={seconds_left_in_slot(qr_session.rotation_seconds)}"
+    else:
+        cache_control = f"public, max-age={settings.QR_IMAGE_CACHE_SECONDS}, immutable"
+    data = QRGenerator.create_qr_data(
+        session_id, qr_session.expires_at, qr_session.venue, qr_session.rotation_seconds, token
+    )
+
+    etag = '"' + hashlib.sha256(f"{data}|{format}|{size}|{border}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    image = await qr_renderer.render_async(data, format, size, border)
+    return Response(content=image, media_type=QR_FORMATS[format], headers=headers)
+
+@router.get("/{session_id}/token", response_model=QRSessionToken)
+async def get_qr_token(session_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Current token of a rotating session, for screens that draw the QR code
+    themselves. Poll again after expires_in seconds.
+    """
+    qr_session = await get_cached_session_async(db, session_id)
+    if qr_session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not qr_session.rotation_seconds:
+        raise HTTPException(status_code=400, detail="Session does not use rotating QR codes")
+
+    token = make_rotating_token(session_id, qr_session.rotation_seconds)
+    return QRSessionToken(
+        session_id=session_id,
+        token=token,
+        url=QRGenerator.create_qr_data(
+            session_id, qr_session.expires_at, qr_session.venue, qr_session.rotation_seconds, token
+        ),
+        expires_in=seconds_left_in_slot(qr_session.rotation_seconds)
+    )
+
 @router.post("/generate", response_model=QRSessionResponse)
 def generate_qr_code(
+    request: Request,
     duration_minutes: int = Query(..., gt=0, le=1440),
     venue_id: Optional[int] = Query(None),
+    rotation_seconds: Optional[int] = Query(None, ge=5, le=3600),
     db: Session = Depends(get_db)
 ):
     """
     Generate QR code for attendance session
     - duration_minutes must be > 0 and <= 1440 (24 hours)
     - venue_id is optional, defaults to institution in settings if not provided
+    - rotation_seconds makes the QR code change every N seconds, so shared
+      screenshots stop working
     """
     try:
         # Validate duration
@@ -102,45 +180,31 @@ def generate_qr_code(
             institution = db.query(Institution).filter(Institution.id == settings.DEFAULT_INSTITUTION_ID).first()
             venue_name = f"{institution.name} (Institution-wide)" if institution else "Institution-wide"
         
-        # Generate session ID and expiry time
-        session_id = str(uuid.uuid4())
+        # Pooled session ID, with its QR code pre-rendered when that is possible
+        session_id = new_session_id(rotation_seconds)
         expires_at = datetime.now(UTC) + timedelta(minutes=duration_minutes)
         
-        # Generate attendance URL
-        attendance_url = f"{settings.FRONTEND_URL}/mark-attendance/{session_id}"
-        
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(attendance_url)
-        qr.make(fit=True)
-
-        # Create QR image
-        qr_image = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        qr_image.save(buffered, format="PNG")
-        qr_image_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Create QR session with explicit created_at
+        # Create QR session with explicit created_at; the image is served
+        # by GET /{session_id}/image instead of being stored
         db_session = QRSession(
             session_id=session_id,
             expires_at=expires_at,
-            qr_image=f"data:image/png;base64,{qr_image_base64}",
             created_at=datetime.now(UTC),
-            venue_id=venue_id if venue_id else None
+            venue_id=venue_id if venue_id else None,
+            rotation_seconds=rotation_seconds
         )
         
         db.add(db_session)
         db.commit()
         db.refresh(db_session)
         
-        # Add venue_name to response
+        # Warm the session cache so the first scans don't hit the database
+        session_cache.put(db_session, venue)
+        
+        # Add venue_name and the image URL to response
         response_data = db_session.__dict__.copy()
         response_data["venue_name"] = venue_name
+        response_data["qr_image"] = qr_image_url(request, session_id)
         
         return response_data
     except Exception as e:
@@ -174,8 +238,8 @@ def validate_session(session_data: AttendanceCreate, db: Session = Depends(get_d
         location_lat = round(float(session_data.location_lat), 7)
         location_lon = round(float(session_data.location_lon), 7)
 
-        # Get the session
-        session = db.query(QRSession).filter_by(session_id=session_data.session_id).first()
+        # Get the session (and its venue) through the session cache
+        session = get_cached_session(db, session_data.session_id)
         if not session:
             # Log the invalid session
             flagged_log = FlaggedLog(
@@ -204,9 +268,7 @@ def validate_session(session_data: AttendanceCreate, db: Session = Depends(get_d
             raise SessionExpiredException(str(session.expires_at))
 
         # Get venue if available
-        venue = None
-        if session.venue_id:
-            venue = db.query(Venue).filter_by(id=session.venue_id).first()
+        venue = session.venue
 
         # Validate location using GeoValidator with venue if available
         geo_validator = GeoValidator(venue)
@@ -349,6 +411,7 @@ def test_validate_session_invalid_data(client: TestClient):
 def generate_session_for_venue(
     venue_id: int,
     request_body: QRSessionRequest,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
@@ -367,65 +430,71 @@ def generate_session_for_venue(
         # Use the duration from the request body
         duration_minutes = request_body.duration
 
-        # Generate a unique session ID
-        session_id = str(uuid.uuid4())
+        # Pooled session ID, with its QR code pre-rendered when that is possible
+        session_id = new_session_id(request_body.rotation_seconds)
         
         # Calculate the expiration time
         expires_at = datetime.now(UTC) + timedelta(minutes=duration_minutes)
         
-        # Generate the attendance URL for the frontend
-        attendance_url = f"{settings.FRONTEND_URL}/mark-attendance/{session_id}"
-        
-        # Generate the QR code image
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(attendance_url)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        qr_image_base64 = base64.b64encode(buffered.getvalue()).decode()
-        
         # Create the QR session in the database
         db_session = QRSession(
             session_id=session_id,
             expires_at=expires_at,
-            qr_image=f"data:image/png;base64,{qr_image_base64}",
-            venue_id=venue_id
+            venue_id=venue_id,
+            rotation_seconds=request_body.rotation_seconds
         )
         db.add(db_session)
         db.commit()
         db.refresh(db_session)
         
+        # Warm the session cache so the first scans don't hit the database
+        session_cache.put(db_session, venue)
+        
         # Prepare and return the response
         return QRSessionResponse(
             session_id=db_session.session_id,
             created_at=db_session.created_at,
             expires_at=db_session.expires_at,
-            qr_image=db_session.qr_image,
+            qr_image=qr_image_url(request, db_session.session_id),
             venue_id=db_session.venue_id,
-            venue_name=venue.name
+            venue_name=venue.name,
+            rotation_seconds=db_session.rotation_seconds
         )
     except Exception as e:
         logger.error(f"Error generating QR session for venue {venue_id}: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{session_id}/revoke", response_model=QRSessionResponse)
+def revoke_session(
+    session_id: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Withdraw a session before it expires. Admins only: the session ID is in
+    the QR code every student scans. QR codes carry signed session
+    tokens that are accepted without a lookup, so the session is also put on
+    the revocation list every worker reloads before trusting a token.
+    """
+    db_session = db.query(QRSession).filter(QRSession.session_id == session_id).first()
+    if not db_session:
+        raise HTTPException(status_code=404, detail="Session not found")
 
-
-
-
-
-
-
-
-
-
-
-
-
-
+    if db_session.revoked_at is None:
+        db_session.revoked_at = datetime.now(UTC)
+        db.commit()
+        db.refresh(db_session)
+    session_cache.invalidate(session_id)
+    revoked_sessions.add(session_id)
+    logger.info(f"Revoked QR session {session_id}")
+
+    return QRSessionResponse(
+        session_id=db_session.session_id,
+        created_at=db_session.created_at,
+        expires_at=db_session.expires_at,
+        qr_image=qr_image_url(request, db_session.session_id),
+        venue_id=db_session.venue_id,
+        rotation_seconds=db_session.rotation_seconds,
+        revoked_at=db_session.revoked_at
+    )
@@ -0,0 +1,109 @@
+import asyncio
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised instead of admitting a request; retry_after is in seconds"""
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a short queue, for one worker process.
+
+    At most max_concurrency requests run at once; up to max_queue more wait
+    for a slot. A request is shed when the queue is full, or when it has
+    waited max_queue_wait seconds, with a Retry-After estimated from how
+    long the requests ahead of it take. Overload then gets an immediate,
+    explicit answer instead of a pool timeout a minute later.
+    """
+
+    # Weight of the newest sample in the moving average of service times
+    SERVICE_TIME_ALPHA = 0.2
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int = 200,
+        max_queue_wait: float = 3.0,
+        max_retry_after: int = 30,
+        jitter: Callable[[], float] = random.random
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.max_retry_after = max_retry_after
+        self._jitter = jitter
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_queue_time = 0.0
+        self.service_time: Optional[float] = None
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a retry is likely to be admitted: the time to drain the
+        queue at the current service rate, spread by up to 50% so rejected
+        clients don't all come back at once.
+        """
+        service_time = self.service_time or 1.0
+        drain = service_time * (self.queued + 1) / self.max_concurrency
+        spread = drain * (1 + 0.5 * self._jitter())
+        return min(max(math.ceil(spread), 1), self.max_retry_after)
+
+    @asynccontextmanager
+    async def admit(self):
+        if self._semaphore.locked():
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                raise AdmissionRejected(self.retry_after(), "queue full")
+            self.queued += 1
+            start = time.monotonic()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_queue_wait)
+            except asyncio.TimeoutError:
+                self.shed_timeout += 1
+                raise AdmissionRejected(self.retry_after(), "queue wait exceeded")
+            finally:
+                self.queued -= 1
+            self.max_queue_time = max(self.max_queue_time, time.monotonic() - start)
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            elapsed = time.monotonic() - started
+            if self.service_time is None:
+                self.service_time = elapsed
+            else:
+                self.service_time += self.SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "max_queue_time_ms": round(self.max_queue_time * 1000, 2),
+            "service_time_ms": round((self.service_time or 0.0) * 1000, 2)
+        }
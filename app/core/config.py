@@ -9,6 +9,16 @@ class Settings(BaseSettings):
     
     # Database settings
     DATABASE_URL: str
+    # Global cap on connections from all workers, divided across the workers
+    # (DB_WORKERS, else WEB_CONCURRENCY) and each worker's sync/async engines.
+    # Keep it below the server's max_connections minus reserved slots.
+    DB_CONNECTION_BUDGET: int = 80
+    DB_WORKERS: Optional[int] = None
+    DB_ASYNC_POOL_SHARE: float = 0.75
+    DB_POOL_TIMEOUT_SECONDS: float = 60.0
+    # Connecting through PgBouncer in transaction pooling mode: no prepared
+    # statements are cached, so statements can land on any server connection
+    DB_PGBOUNCER_MODE: bool = False
     
     # Security settings
     SECRET_KEY: str
@@ -25,6 +35,104 @@ class Settings(BaseSettings):
     SELFIE_DIR: str = "static/selfies"
     MAX_SELFIE_SIZE: int = 5_242_880  # 5MB in bytes
     
+    # Blob storage settings ("local", "cloudinary" or "memory"; auto-detected when unset)
+    BLOB_STORAGE_BACKEND: Optional[str] = None
+    BLOB_STORAGE_DIR: str = "static/blobs"
+    
+    # Selfie upload pipeline ("background" commits attendance first and uploads
+    # from a worker pool via the upload_outbox table, "inline" uploads in the request)
+    SELFIE_UPLOAD_MODE: str = "background"
+    UPLOAD_STAGING_DIR: str = "upload_staging"
+    UPLOAD_WORKERS: int = 4
+    UPLOAD_QUEUE_SIZE: int = 1000
+    UPLOAD_MAX_ATTEMPTS: int = 5
+    UPLOAD_SWEEP_INTERVAL_SECONDS: float = 15.0
+    
+    # Attendance write path
+    # Record attendance with a single INSERT ... ON CONFLICT DO NOTHING instead of
+    # check-then-insert. Requires the unique idx_attendance_session_roll index.
+    ATTENDANCE_INSERT_ON_CONFLICT: bool = False
+    # Write-behind batching: validated rows are committed together as one
+    # multi-row INSERT ... ON CONFLICT every ATTENDANCE_BATCH_MAX_DELAY_MS or
+    # ATTENDANCE_BATCH_MAX_ROWS rows. Also requires idx_attendance_session_roll.
+    ATTENDANCE_BATCH_ENABLED: bool = False
+    ATTENDANCE_BATCH_MAX_ROWS: int = 200
+    ATTENDANCE_BATCH_MAX_DELAY_MS: float = 5.0
+    
+    # QR session cache (per worker process)
+    SESSION_CACHE_ENABLED: bool = True
+    SESSION_CACHE_MAX_ENTRIES: int = 10000
+    # Venues referenced by session tokens (per worker process)
+    VENUE_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Admin dashboard statistics cache (seconds, 0 disables). Not invalidated
+    # on writes, so the summary can lag new attendance by up to this long.
+    STATISTICS_CACHE_TTL_SECONDS: float = 10.0
+    
+    # Daily attendance rollup (daily_attendance_stats)
+    STATS_TIMEZONE: str = "Asia/Kolkata"
+    DAILY_STATS_ROLLUP_INTERVAL_SECONDS: float = 60.0  # 0 disables the background job
+    DAILY_STATS_LAG_SECONDS: float = 120.0  # only fold rows older than this
+    
+    # Rate limiting (sliding-window counter per client). The backend is shared
+    # across workers: "sqlite" for all workers on one host, "redis" across
+    # instances, "memory" for a single process only.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_REQUESTS: int = 5000  # per window and client; sized for a campus NAT address
+    RATE_LIMIT_WINDOW_SECONDS: float = 60.0
+    RATE_LIMIT_BACKEND: str = "sqlite"
+    RATE_LIMIT_SQLITE_PATH: str = "rate_limit.sqlite3"
+    REDIS_URL: Optional[str] = None
+    
+    # Admission control for /attendance/mark (per worker). Concurrency
+    # defaults to the worker's async pool capacity minus MARK_POOL_RESERVE
+    # connections kept for its other users (by default the upload workers and
+    # sweeper, the batch writer and the revocation list refresh); requests
+    # beyond it wait in a short queue and are shed with 503 + Retry-After when
+    # it is full or they have waited too long.
+    MARK_ADMISSION_ENABLED: bool = True
+    MARK_MAX_CONCURRENCY: Optional[int] = None
+    MARK_POOL_RESERVE: Optional[int] = None
+    MARK_MAX_QUEUE: int = 200
+    MARK_MAX_QUEUE_WAIT_SECONDS: float = 3.0
+    MARK_MAX_RETRY_AFTER_SECONDS: int = 30
+    
+    # Per-institution venue spatial index (per worker process, seconds)
+    VENUE_INDEX_TTL_SECONDS: float = 300.0
+    
+    # QR rendering (process pool, 0 renders in the request thread) and the
+    # pool of pre-generated session IDs with their QR images
+    QR_RENDER_PROCESSES: int = 2
+    QR_RENDER_CACHE_SIZE: int = 256
+    QR_SESSION_POOL_SIZE: int = 50
+    QR_IMAGE_CACHE_SECONDS: int = 86400
+    # Rotating QR tokens: accepted while their time slot is within this many
+    # seconds of the server clock
+    QR_TOKEN_CLOCK_SKEW_SECONDS: float = 10.0
+    # Embed a signed session token (expiry, venue and its geofence version) in
+    # QR URLs so attendance marking can validate the session without a lookup
+    QR_SESSION_TOKENS_ENABLED: bool = True
+    # How often each worker reloads the list of revoked sessions
+    SESSION_REVOCATION_REFRESH_SECONDS: float = 5.0
+    # Public base URL of this API, used for absolute QR image URLs
+    # (defaults to the request's base URL)
+    PUBLIC_BASE_URL: Optional[str] = None
+    
+    # Logging: "json" or "text" lines on stdout, written by a background
+    # thread. LOG_LEVELS sets per-logger levels ("app.services=DEBUG,...");
+    # debug/info lines of the attendance marking path are kept at
+    # LOG_HOT_PATH_SAMPLE_RATE.
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_LEVELS: str = ""
+    LOG_HOT_PATH_SAMPLE_RATE: float = 1.0
+    
+    # Prometheus metrics at /metrics. With several uvicorn workers set
+    # PROMETHEUS_MULTIPROC_DIR to a directory that is emptied before they
+    # start, so the exposition sums all of them.
+    METRICS_ENABLED: bool = True
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = None
+    
     # Frontend URL configuration
     FRONTEND_URL: str = "https://new-attendance-form.vercel.app"  # Update with your actual Render URL
 
@@ -30,6 +30,10 @@ class SessionNotFoundException(AttendanceException):
             code="session_not_found"
         )
 
+class InvalidQRTokenException(AttendanceException):
+    def __init__(self, message: str = "This QR code has expired. Please scan the code currently on screen."):
+        super().__init__(detail=message, code="invalid_qr_token")
+
 class DuplicateAttendanceException(AttendanceException):
     def __init__(self, roll_no: str, session_id: str, timestamp: str):
         super().__init__(
@@ -0,0 +1,158 @@
+"""
+Logging setup: records are handed to a QueueListener thread through a
+QueueHandler, so formatting and stdout I/O never run on the event loop.
+
+Records keep their message and args unformatted until the listener writes
+them, and carry the request ID of the request that logged them. Hot-path
+loggers can be sampled below WARNING, and levels can be set per logger.
+"""
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterable, Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Loggers on the attendance marking path, whose debug/info lines are sampled
+HOT_PATH_LOGGERS = (
+    "app.api.endpoints.attendance",
+    "app.services.attendance_handler",
+    "app.services.geo_validation",
+)
+
+# Attributes every LogRecord has; anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id"}
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the current request ID on records, on the thread that logged them"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate: float, rng=random.random):
+        super().__init__()
+        self.rate = rate
+        self._rng = rng
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or self._rng() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener. The stock prepare()
+    formats the message on the calling thread; with an in-process queue the
+    record can travel as is.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request ID and any extra= fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """'app.services=DEBUG,sqlalchemy.engine=WARNING' -> {logger: level}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = "INFO",
+    fmt: str = "json",
+    levels: Optional[Dict[str, str]] = None,
+    hot_path_sample_rate: float = 1.0,
+    hot_path_loggers: Iterable[str] = HOT_PATH_LOGGERS
+) -> QueueListener:
+    """Route the root logger through a queue to a stdout writer thread"""
+    global _listener
+    stop_logging()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = DeferredQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level)
+    for name in hot_path_loggers:
+        hot_logger = logging.getLogger(name)
+        for existing in [f for f in hot_logger.filters if isinstance(f, SamplingFilter)]:
+            hot_logger.removeFilter(existing)
+        if hot_path_sample_rate < 1:
+            hot_logger.addFilter(SamplingFilter(hot_path_sample_rate))
+
+    # uvicorn configures its own handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,181 @@
+"""
+Prometheus metrics, exposed at /metrics.
+
+With PROMETHEUS_MULTIPROC_DIR set, every worker process writes its samples
+to files in that directory and /metrics sums them, so counters and
+histograms cover all uvicorn workers instead of whichever one answered the
+scrape. The directory must be emptied once before the workers start (see
+render.yaml), not by the workers themselves.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Tuple
+
+from app.core.config import settings
+
+# prometheus_client picks its value storage when it is imported
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.PROMETHEUS_MULTIPROC_DIR)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from sqlalchemy import event  # noqa: E402
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP requests served, by route template",
+    ["method", "route", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from routing to the end of the response",
+    ["method", "route"], buckets=REQUEST_BUCKETS
+)
+REJECTED_REQUESTS = Counter(
+    "http_requests_rejected_total", "Requests turned away by rate limiting or admission control",
+    ["reason"]
+)
+MARK_STAGE_LATENCY = Histogram(
+    "attendance_mark_stage_seconds", "Time spent in each stage of attendance marking",
+    ["stage"], buckets=STAGE_BUCKETS
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Duration of single database statements",
+    ["engine"], buckets=STAGE_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Database statements executed while serving a request",
+    ["route"], buckets=(0, 1, 2, 3, 4, 6, 8, 12, 20, 50)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Total database statement time while serving a request",
+    ["route"], buckets=STAGE_BUCKETS
+)
+UPLOAD_LATENCY = Histogram(
+    "selfie_upload_seconds", "Selfie writes: staging (local disk), inline or background (blob store)",
+    ["kind", "outcome"], buckets=REQUEST_BUCKETS
+)
+UPLOADS_MISSING_STAGED = Counter(
+    "selfie_uploads_missing_staged_total",
+    "Outbox uploads whose staged bytes were gone and whose blob was not in storage"
+)
+# Hit ratio: sum(rate(cache_requests_total{result="hit"}[5m])) by (cache)
+#          / sum(rate(cache_requests_total[5m])) by (cache)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "In-process cache lookups",
+    ["cache", "result"]
+)
+
+
+class RequestMetrics:
+    """Per-request accumulator, shared with the SQLAlchemy event handlers through a ContextVar"""
+    __slots__ = ("started", "queries", "query_seconds")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+request_metrics_var: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def mark_stage(stage: str):
+    """Time a stage of attendance marking, including stages that raise"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        MARK_STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def observe_stage_since_request_start(stage: str) -> None:
+    """
+    Observe the time since MetricsMiddleware saw the request as a stage.
+    At the top of an endpoint this is the time FastAPI took to receive and
+    parse the body.
+    """
+    request_metrics = request_metrics_var.get()
+    if request_metrics is not None:
+        MARK_STAGE_LATENCY.labels(stage).observe(time.perf_counter() - request_metrics.started)
+
+
+@contextmanager
+def time_upload(kind: str):
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPLOAD_LATENCY.labels(kind, outcome).observe(time.perf_counter() - start)
+
+
+class CacheCounter:
+    """Pre-bound hit/miss counters for one named cache"""
+
+    def __init__(self, cache: str):
+        self._hit = CACHE_REQUESTS.labels(cache, "hit")
+        self._miss = CACHE_REQUESTS.labels(cache, "miss")
+
+    def hit(self) -> None:
+        self._hit.inc()
+
+    def miss(self) -> None:
+        self._miss.inc()
+
+
+def instrument_queries(engine, name: str) -> None:
+    """
+    Time every statement on the engine (engine.sync_engine for async engines)
+    and add it to the current request's totals. SQLAlchemy runs async
+    statements in a greenlet that shares the caller's context, so the
+    request's ContextVar is visible here for both engines.
+    """
+    latency = DB_QUERY_LATENCY.labels(name)
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        latency.observe(elapsed)
+        request_metrics = request_metrics_var.get()
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.query_seconds += elapsed
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def multiprocess_dir() -> Optional[str]:
+    return os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Exposition of all workers' metrics in multiprocess mode, else of this process"""
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Drop this worker's live gauge files on shutdown; its counters keep counting in the sum"""
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(os.getpid())
@@ -1,41 +1,205 @@
-from fastapi import FastAPI, Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime, timedelta
-from collections import defaultdict
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Collection, Optional
+import logging
 import time
+import uuid
+
+from app.core.admission import AdmissionController, AdmissionRejected
+from app.core.logging_config import request_id_var
+from app.core.metrics import (
+    DB_QUERIES_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    REJECTED_REQUESTS,
+    REQUEST_LATENCY,
+    REQUESTS,
+    RequestMetrics,
+    request_metrics_var
+)
+from app.core.rate_limit import RateLimiter, get_rate_limiter
+from app.core.security import verify_token
+
+logger = logging.getLogger(__name__)
+
+
+def rate_limit_key(scope: Scope) -> str:
+    """
+    Identify the client a request is counted against.
+
+    Students on campus Wi-Fi all reach us through one NAT address, so a pure
+    per-IP limit makes the whole campus share a single budget. Authenticated
+    (admin) requests are therefore counted per user, and the per-IP budget
+    (RATE_LIMIT_REQUESTS) has to be sized for a campus's peak, not for a
+    single device.
+
+    Only a bearer token with a valid signature and expiry earns its own
+    bucket, keyed by its subject; otherwise a client could send a new
+    made-up token with every request and never be limited. Unverified
+    tokens count against the client IP.
+    """
+    authorization = Headers(scope=scope).get("authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        payload = verify_token(authorization[7:])
+        subject = payload.get("sub") if payload else None
+        if subject:
+            return f"user:{subject}"
+    client = scope.get("client")
+    client_ip = client[0] if client else "unknown"
+    return f"ip:{client_ip}"
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI rate limiter. Unlike BaseHTTPMiddleware it doesn't wrap the
+    request and response bodies in extra tasks and streams, so multipart
+    uploads pass through untouched.
+    """
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(
-        self, 
-        app: FastAPI, 
+        self,
+        app: ASGIApp,
         requests_limit: int = 100,  # requests per window
-        window_seconds: int = 60     # window size in seconds
+        window_seconds: int = 60,    # window size in seconds
+        limiter: Optional[RateLimiter] = None
     ):
-        super().__init__(app)
+        self.app = app
         self.requests_limit = requests_limit
         self.window_seconds = window_seconds
-        self.requests = defaultdict(list)  # ip: [timestamp1, timestamp2, ...]
-
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Remove old requests outside the window
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if now - req_time <= self.window_seconds
-        ]
-        
+        # Sliding-window counter in a backend shared by all workers
+        self.limiter = limiter if limiter is not None else get_rate_limiter(requests_limit, window_seconds)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        result = await self.limiter.hit(rate_limit_key(scope))
+
         # Check if limit is exceeded
-        if len(self.requests[client_ip]) >= self.requests_limit:
-            raise HTTPException(
+        if not result.allowed:
+            REJECTED_REQUESTS.labels("rate_limited").inc()
+            response = JSONResponse(
+                {"detail": "Too many requests. Please try again later."},
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                headers={
+                    "Retry-After": str(result.retry_after),
+                    "X-RateLimit-Limit": str(result.limit),
+                    "X-RateLimit-Remaining": "0"
+                }
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(result.limit)
+                headers["X-RateLimit-Remaining"] = str(result.remaining)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class AdmissionMiddleware:
+    """
+    Admission control for a few expensive routes. Runs before the request
+    body is read, so shed requests cost neither the upload nor a database
+    connection.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController, paths: Collection[str]):
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with self.controller.admit():
+                await self.app(scope, receive, send)
+        except AdmissionRejected as e:
+            logger.warning(f"Shedding {scope['path']}: {e.reason}, retry after {e.retry_after}s")
+            REJECTED_REQUESTS.labels(e.reason.replace(" ", "_")).inc()
+            response = JSONResponse(
+                {
+                    "error": "server_busy",
+                    "message": "Too many students are marking attendance right now. Please try again shortly.",
+                    "retry_after": e.retry_after
+                },
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)}
             )
-        
-        # Add current request
-        self.requests[client_ip].append(now)
-        
-        response = await call_next(request)
-        return response
+            await response(scope, receive, send)
+
+
+class RequestContextMiddleware:
+    """
+    Gives every request an ID (the client's X-Request-ID, or a new one) that
+    is attached to its log records and returned in the response headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get("x-request-id") or uuid.uuid4().hex
+        token = request_id_var.set(request_id[:64])
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id_var.get()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Request counts and latency per route template, with the database
+    statements each request ran. Added innermost, so the clock starts once
+    rate limiting and admission control have let the request through;
+    rejected requests are counted in http_requests_rejected_total instead.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_metrics = RequestMetrics(time.perf_counter())
+        token = request_metrics_var.set(request_metrics)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
 
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_metrics_var.reset(token)
+            # The router stores the matched route in the scope; templates
+            # keep the label set small, unlike raw paths with IDs in them
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUESTS.labels(method, route_path, str(status)).inc()
+            REQUEST_LATENCY.labels(method, route_path).observe(time.perf_counter() - request_metrics.started)
+            DB_QUERIES_PER_REQUEST.labels(route_path).observe(request_metrics.queries)
+            DB_TIME_PER_REQUEST.labels(route_path).observe(request_metrics.query_seconds)
@@ -0,0 +1,232 @@
+import math
+import time
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult:
+    __slots__ = ("allowed", "limit", "remaining", "retry_after")
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, retry_after: int):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+
+
+def evaluate_window(previous: int, current: int, elapsed: float, limit: int, window: float) -> RateLimitResult:
+    """
+    Sliding-window-counter decision for one request.
+
+    previous and current are the request counts of the last and the current
+    fixed window, elapsed is how far into the current window we are. The
+    previous window is weighted by how much of it still overlaps the sliding
+    window, which approximates a true sliding log in O(1) space per key.
+    """
+    weight = (window - elapsed) / window
+    estimate = previous * weight + current
+    if estimate + 1 <= limit:
+        return RateLimitResult(True, limit, max(int(limit - estimate - 1), 0), 0)
+
+    if current + 1 > limit or previous == 0:
+        # Even with the previous window fully aged out we're over the limit
+        retry_after = window - elapsed
+    else:
+        # Time until the previous window's weight drops enough to admit one more
+        retry_after = (window - (limit - current - 1) * window / previous) - elapsed
+    return RateLimitResult(False, limit, 0, max(math.ceil(retry_after), 1))
+
+
+def _advance(state: Optional[Tuple[int, int, int]], window_index: int) -> Tuple[int, int]:
+    """(previous, current) counts for window_index given the stored state"""
+    if state is None:
+        return 0, 0
+    stored_index, previous, current = state
+    if stored_index == window_index:
+        return previous, current
+    if stored_index == window_index - 1:
+        return current, 0
+    return 0, 0
+
+
+class RateLimiter(ABC):
+    """Counts requests per key and decides whether the next one is allowed"""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window_seconds = window_seconds
+
+    def _window(self, now: float) -> Tuple[int, float]:
+        window_index = int(now // self.window_seconds)
+        return window_index, now - window_index * self.window_seconds
+
+    @abstractmethod
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        """Record a request for key if it is allowed"""
+
+
+class MemoryRateLimiter(RateLimiter):
+    """
+    Per-process limiter. Only suitable for a single worker; with several
+    workers each one enforces the limit separately.
+    """
+
+    def __init__(self, limit: int, window_seconds: float):
+        super().__init__(limit, window_seconds)
+        self._counters: Dict[str, Tuple[int, int, int]] = {}
+        self._lock = Lock()
+        self._next_eviction = 0.0
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window_index, elapsed = self._window(now)
+        with self._lock:
+            if now >= self._next_eviction:
+                self._evict(window_index)
+                self._next_eviction = now + self.window_seconds
+            previous, current = _advance(self._counters.get(key), window_index)
+            result = evaluate_window(previous, current, elapsed, self.limit, self.window_seconds)
+            if result.allowed:
+                current += 1
+            self._counters[key] = (window_index, previous, current)
+        return result
+
+    def _evict(self, window_index: int) -> None:
+        # Keys untouched for two windows carry no weight any more
+        idle = [key for key, state in self._counters.items() if state[0] < window_index - 1]
+        for key in idle:
+            del self._counters[key]
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """
+    Limiter backed by a SQLite file, shared by all worker processes on one
+    host. Each hit is a single short IMMEDIATE transaction.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, path: str):
+        super().__init__(limit, window_seconds)
+        self.path = path
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._next_eviction = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Counters are disposable, no need to fsync them
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    window_index INTEGER NOT NULL,
+                    previous INTEGER NOT NULL,
+                    current INTEGER NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _hit(self, key: str, now: float) -> RateLimitResult:
+        window_index, elapsed = self._window(now)
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if now >= self._next_eviction:
+                    conn.execute("DELETE FROM rate_limits WHERE window_index < ?", (window_index - 1,))
+                    self._next_eviction = now + self.window_seconds
+                state = conn.execute(
+                    "SELECT window_index, previous, current FROM rate_limits WHERE key = ?", (key,)
+                ).fetchone()
+                previous, current = _advance(state, window_index)
+                result = evaluate_window(previous, current, elapsed, self.limit, self.window_seconds)
+                if result.allowed:
+                    current += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, window_index, previous, current) VALUES (?, ?, ?, ?)",
+                    (key, window_index, previous, current)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        return await run_in_threadpool(self._hit, key, time.time() if now is None else now)
+
+
+class RedisRateLimiter(RateLimiter):
+    """
+    Limiter backed by Redis (or any server speaking its protocol), shared by
+    every worker and instance. Counters are per-window keys that expire on
+    their own, so idle clients need no explicit eviction.
+    """
+
+    # Same decision as evaluate_window, made atomically on the server
+    SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+        local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+        local limit = tonumber(ARGV[1])
+        local window = tonumber(ARGV[2])
+        local elapsed = tonumber(ARGV[3])
+        if previous * (window - elapsed) / window + current + 1 > limit then
+            return {0, previous, current}
+        end
+        redis.call('INCR', KEYS[1])
+        redis.call('EXPIRE', KEYS[1], math.ceil(window * 2))
+        return {1, previous, current}
+    """
+
+    def __init__(self, limit: int, window_seconds: float, url: str, prefix: str = "ratelimit"):
+        super().__init__(limit, window_seconds)
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def hit(self, key: str, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        window_index, elapsed = self._window(now)
+        try:
+            _, previous, current = await self._script(
+                keys=[f"{self.prefix}:{key}:{window_index}", f"{self.prefix}:{key}:{window_index - 1}"],
+                args=[self.limit, self.window_seconds, elapsed]
+            )
+        except Exception as e:
+            # Fail open: an unavailable limiter shouldn't take attendance down
+            logger.warning(f"Rate limiter backend unavailable, allowing request: {e}")
+            return RateLimitResult(True, self.limit, self.limit, 0)
+        return evaluate_window(int(previous), int(current), elapsed, self.limit, self.window_seconds)
+
+
+def get_rate_limiter(limit: int, window_seconds: float, backend: Optional[str] = None) -> RateLimiter:
+    """Build the limiter configured by RATE_LIMIT_BACKEND"""
+    backend = backend or settings.RATE_LIMIT_BACKEND
+    if backend == "redis":
+        if not settings.REDIS_URL:
+            raise ValueError("RATE_LIMIT_BACKEND=redis requires REDIS_URL")
+        limiter = RedisRateLimiter(limit, window_seconds, settings.REDIS_URL)
+    elif backend == "sqlite":
+        limiter = SQLiteRateLimiter(limit, window_seconds, settings.RATE_LIMIT_SQLITE_PATH)
+    elif backend == "memory":
+        limiter = MemoryRateLimiter(limit, window_seconds)
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+    logger.info(f"Rate limiting {limit} requests per {window_seconds}s per client using {backend} backend")
+    return limiter
@@ -1,10 +1,16 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 import os
 
 # Import Base from base_class instead of defining it here
+from app.core.config import settings
+from app.core.metrics import instrument_queries
 from app.db.base_class import Base
+from app.db.budget import detect_workers, pgbouncer_connect_args, plan_connection_budget
+from app.db.pool_metrics import PoolMetrics
 
 load_dotenv()
 
@@ -17,21 +23,76 @@ if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://")
 
 # Determine if we're running on Render
 is_render = os.getenv("RENDER") == "true"
+use_ssl = is_render or "dpg-" in SQLALCHEMY_DATABASE_URL
+
+# Per-worker pool limits derived from the global connection budget
+connection_budget = plan_connection_budget(
+    settings.DB_CONNECTION_BUDGET,
+    detect_workers(settings.DB_WORKERS),
+    settings.DB_ASYNC_POOL_SHARE
+)
+
+# Checkout waits, in-use/idle/overflow counts and connection ages per engine
+pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
 
 # Create engine with appropriate settings
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_size=50,           # Increased from 5 to 50
-    max_overflow=100,       # Increased from 10 to 100
-    pool_timeout=60,        # Increased from 30 to 60 seconds
+    poolclass=pool_metrics.pool_class(QueuePool),
+    pool_size=connection_budget.sync.pool_size,
+    max_overflow=connection_budget.sync.max_overflow,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
     pool_recycle=600,
     pool_pre_ping=True,     # Added connection health check
     # Add SSL requirement for Render's PostgreSQL
-    connect_args={"sslmode": "require"} if is_render or "dpg-" in SQLALCHEMY_DATABASE_URL else {}
+    connect_args={"sslmode": "require"} if use_ssl else {}
 )
 
+pool_metrics.attach(engine)
+if settings.METRICS_ENABLED:
+    instrument_queries(engine, "sync")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the high-concurrency request paths (attendance marking).
+# Uses the asyncpg driver so queries don't block the event loop.
+def get_async_database_url(url: str) -> str:
+    if url.startswith("postgresql+asyncpg://"):
+        return url
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return url.replace(prefix, "postgresql+asyncpg://", 1)
+    return url
+
+ASYNC_SQLALCHEMY_DATABASE_URL = get_async_database_url(SQLALCHEMY_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    poolclass=async_pool_metrics.pool_class(AsyncAdaptedQueuePool),
+    pool_size=connection_budget.async_.pool_size,
+    max_overflow=connection_budget.async_.max_overflow,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=600,
+    pool_pre_ping=True,
+    # asyncpg takes "ssl" rather than libpq's "sslmode"
+    connect_args={
+        **({"ssl": "require"} if use_ssl else {}),
+        **(pgbouncer_connect_args() if settings.DB_PGBOUNCER_MODE else {})
+    }
+)
+
+async_pool_metrics.attach(async_engine.sync_engine)
+if settings.METRICS_ENABLED:
+    instrument_queries(async_engine.sync_engine, "async")
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Move table creation to a separate function
 def init_db():
     try:
@@ -42,6 +103,9 @@ def init_db():
         from app.models.flagged_log import FlaggedLog
         from app.models.venue import Venue
         from app.models.institution import Institution
+        from app.models.upload_outbox import UploadOutbox
+        from app.models.daily_attendance_stats import DailyAttendanceStats
+        from app.models.rollup_state import RollupState
         
         Base.metadata.create_all(bind=engine)
         print("Database tables created successfully")
@@ -50,16 +114,18 @@ def init_db():
         raise
 
 def get_db():
+    # The session checks out a connection on its first query only (where
+    # pool_pre_ping validates it), so endpoints that never query cost nothing
     db = SessionLocal()
     try:
-        # Test the connection
-        db.execute(text("SELECT 1"))
         yield db
-    except Exception as e:
-        print(f"DATABASE ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
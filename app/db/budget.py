@@ -0,0 +1,100 @@
+"""
+Connection budgeting across uvicorn workers.
+
+Every worker process creates its own sync and async engine, so per-engine
+pool limits multiply by the number of workers. The budget is a global cap on
+connections to the database (or to PgBouncer); it is divided across the
+detected workers and then between the two engines of each worker.
+"""
+import math
+import os
+import uuid
+from typing import NamedTuple, Optional
+
+
+class PoolLimits(NamedTuple):
+    pool_size: int
+    max_overflow: int
+
+    @property
+    def connections(self) -> int:
+        return self.pool_size + self.max_overflow
+
+
+class ConnectionBudget(NamedTuple):
+    total: int
+    workers: int
+    sync: PoolLimits
+    async_: PoolLimits
+
+    @property
+    def per_worker(self) -> int:
+        return self.sync.connections + self.async_.connections
+
+    def describe(self) -> str:
+        return (
+            f"{self.workers} workers x {self.per_worker} connections "
+            f"(async pool {self.async_.pool_size}+{self.async_.max_overflow}, "
+            f"sync pool {self.sync.pool_size}+{self.sync.max_overflow}) "
+            f"= {self.workers * self.per_worker} of a {self.total} connection budget"
+        )
+
+
+def detect_workers(configured: Optional[int] = None) -> int:
+    """
+    Worker processes sharing the budget: the configured value, else
+    WEB_CONCURRENCY (which uvicorn and gunicorn also read), else 1.
+    """
+    if configured:
+        return configured
+    try:
+        return max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+    except ValueError:
+        return 1
+
+
+def _split_pool(connections: int) -> PoolLimits:
+    # Half kept open, half opened on demand and closed again when returned
+    pool_size = max(math.ceil(connections / 2), 1)
+    return PoolLimits(pool_size=pool_size, max_overflow=max(connections - pool_size, 0))
+
+
+def plan_connection_budget(total: int, workers: int, async_share: float = 0.75) -> ConnectionBudget:
+    """
+    Divide a global connection budget across workers and each worker's
+    engines. The async engine serves attendance marking, so it gets
+    async_share of a worker's connections; each engine keeps at least one.
+    """
+    per_worker = max(total // workers, 2)
+    async_connections = min(max(round(per_worker * async_share), 1), per_worker - 1)
+    return ConnectionBudget(
+        total=total,
+        workers=workers,
+        sync=_split_pool(per_worker - async_connections),
+        async_=_split_pool(async_connections)
+    )
+
+
+def mark_concurrency(async_pool: PoolLimits, reserved: int) -> int:
+    """
+    Attendance marks admitted at once per worker. Each admitted request holds
+    one async connection for its whole duration, so the pool's other users
+    (background workers, and requests that briefly need a second connection)
+    get reserved connections the admitted requests can't take. Otherwise a
+    burst at full admission exhausts the pool and everything waits for the
+    pool timeout. At least one.
+    """
+    return max(async_pool.connections - reserved, 1)
+
+
+def pgbouncer_connect_args() -> dict:
+    """
+    asyncpg arguments for PgBouncer transaction pooling: consecutive
+    statements may run on different server connections, so no prepared
+    statement may be cached or reused by name.
+    """
+    return {
+        "statement_cache_size": 0,
+        "prepared_statement_cache_size": 0,
+        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__"
+    }
@@ -0,0 +1,120 @@
+"""
+Connection pool instrumentation.
+
+Pool events track checkouts, connections opened and closed, and connection
+ages; the pool class is wrapped so the time spent waiting for a connection
+(including the pre-ping) is measured too. snapshot() combines these with the
+pool's own in-use/idle/overflow counts, to show pool exhaustion during bursts.
+"""
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Type
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+# Checkout waits kept for the percentiles in snapshot()
+RECENT_WAITS = 1000
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = Lock()
+        self._recent_waits: deque = deque(maxlen=RECENT_WAITS)
+        self._connected_at: Dict[int, float] = {}
+        self._engine = None
+        self.checkouts = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        self.peak_in_use = 0
+        self.connections_opened = 0
+        self.connections_closed = 0
+
+    def pool_class(self, base: Type[Pool]) -> Type[Pool]:
+        """Subclass of base whose connect() records how long the checkout took"""
+        metrics = self
+
+        def connect(pool):
+            start = time.perf_counter()
+            try:
+                connection = base.connect(pool)
+            except PoolTimeoutError:
+                with metrics._lock:
+                    metrics.timeouts += 1
+                raise
+            metrics._record_wait(time.perf_counter() - start)
+            return connection
+
+        return type(f"Instrumented{base.__name__}", (base,), {"connect": connect})
+
+    def attach(self, engine) -> None:
+        """Listen to the engine's pool events (engine.sync_engine for async engines)"""
+        # engine.pool is replaced on dispose(), so it is looked up when needed
+        self._engine = engine
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "close", self._on_close)
+        event.listen(engine, "close_detached", self._on_close)
+        event.listen(engine, "checkout", self._on_checkout)
+
+    def _record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._recent_waits.append(seconds)
+            self.max_wait = max(self.max_wait, seconds)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        with self._lock:
+            self._connected_at[id(dbapi_connection)] = time.monotonic()
+            self.connections_opened += 1
+
+    def _on_close(self, dbapi_connection, *args) -> None:
+        with self._lock:
+            if self._connected_at.pop(id(dbapi_connection), None) is not None:
+                self.connections_closed += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        pool = self._engine.pool
+        with self._lock:
+            self.checkouts += 1
+            if pool is not None and hasattr(pool, "checkedout"):
+                self.peak_in_use = max(self.peak_in_use, pool.checkedout())
+
+    def snapshot(self) -> dict:
+        pool = self._engine.pool if self._engine is not None else None
+        now = time.monotonic()
+        with self._lock:
+            waits = list(self._recent_waits)
+            ages = [now - connected_at for connected_at in self._connected_at.values()]
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "checkout_wait_ms": {
+                    "p50": round(_percentile(waits, 0.5) * 1000, 2),
+                    "p95": round(_percentile(waits, 0.95) * 1000, 2),
+                    "max": round(self.max_wait * 1000, 2)
+                },
+                "peak_in_use": self.peak_in_use,
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "connection_age_seconds": {
+                    "oldest": round(max(ages), 1) if ages else 0.0,
+                    "mean": round(sum(ages) / len(ages), 1) if ages else 0.0
+                }
+            }
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats.update({
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0)
+            })
+        return stats
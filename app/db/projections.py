@@ -0,0 +1,28 @@
+"""
+Column projections for read-heavy listing endpoints.
+
+Listing endpoints only need the fields of their response schema, so they
+select exactly those columns instead of full ORM objects. The resulting rows
+support attribute access and feed the Pydantic models (from_attributes)
+directly, without identity-map overhead or large columns like selfie bytes.
+"""
+from typing import List, Type
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.models.attendance import Attendance
+from app.schemas.attendance import AttendanceResponse
+
+
+def columns_for(model, schema: Type[BaseModel]) -> List:
+    """Model columns matching the fields of a response schema"""
+    return [getattr(model, field) for field in schema.model_fields if hasattr(model, field)]
+
+
+ATTENDANCE_RESPONSE_COLUMNS = columns_for(Attendance, AttendanceResponse)
+
+
+def attendance_response_query(db: Session):
+    """Query selecting only the columns serialized by AttendanceResponse"""
+    return db.query(*ATTENDANCE_RESPONSE_COLUMNS)
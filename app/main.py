@@ -1,4 +1,4 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
@@ -9,11 +9,25 @@ from sqlalchemy.sql import text
 
 from app.core.config import settings
 from app.api.api import api_router
-from app.core.middleware import RateLimitMiddleware
-from app.db.base import init_db, get_db
+from app.core.admission import AdmissionController
+from app.core.logging_config import parse_levels, setup_logging
+from app.core.metrics import mark_process_dead, render_metrics
+from app.core.middleware import AdmissionMiddleware, MetricsMiddleware, RateLimitMiddleware, RequestContextMiddleware
+from app.db.base import init_db, SessionLocal, pool_metrics, async_pool_metrics, connection_budget
+from app.db.budget import mark_concurrency
+from app.services.upload_queue import upload_queue
+from app.services.attendance_batcher import attendance_batcher
+from app.services.rollup import rollup_job
+from app.services.qr_renderer import qr_renderer, qr_session_pool
+from app.utils.blob_storage import get_blob_storage
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging: records go through a queue to a writer thread
+setup_logging(
+    level=settings.LOG_LEVEL,
+    fmt=settings.LOG_FORMAT,
+    levels=parse_levels(settings.LOG_LEVELS),
+    hot_path_sample_rate=settings.LOG_HOT_PATH_SAMPLE_RATE
+)
 logger = logging.getLogger(__name__)
 
 # Create required directories
@@ -36,19 +50,75 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/admin/login")
 async def startup_event():
     try:
         logger.info("Starting application...")
+        logger.info(f"Database connection budget: {connection_budget.describe()}")
+        if connection_budget.workers * connection_budget.per_worker > connection_budget.total:
+            logger.warning("DB_CONNECTION_BUDGET is below 2 connections per worker; each engine still needs one")
+        if settings.DB_PGBOUNCER_MODE:
+            logger.info("PgBouncer transaction pooling mode: prepared statement caching disabled")
         init_db()
         logger.info("Database initialized successfully")
+        # Fails here rather than on the first selfie if no durable backend is set up
+        get_blob_storage()
+        await upload_queue.start()
+        if settings.ATTENDANCE_BATCH_ENABLED:
+            await attendance_batcher.start()
+        await rollup_job.start()
+        qr_renderer.start()
+        # Pre-rendered images are only usable when QR codes carry no session token
+        if not settings.QR_SESSION_TOKENS_ENABLED:
+            qr_session_pool.refill()
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
         logger.error(traceback.format_exc())
         raise
 
-# Add Rate Limiting
-app.add_middleware(
-    RateLimitMiddleware,
-    requests_limit=5000,    # Increased from 100 to 5000 requests per window
-    window_seconds=60       # 1 minute window
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush queued attendance before the upload queue goes away
+    await attendance_batcher.stop()
+    await upload_queue.stop()
+    await rollup_job.stop()
+    qr_renderer.stop()
+    mark_process_dead()
+
+# Per-route request metrics; added first so it is innermost and times only
+# requests that got past rate limiting and admission control
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def mark_pool_reserve() -> int:
+    """Async pool connections kept free of admitted mark requests"""
+    if settings.MARK_POOL_RESERVE is not None:
+        return settings.MARK_POOL_RESERVE
+    reserve = 1  # revocation list refresh, a second connection for one request
+    if settings.SELFIE_UPLOAD_MODE == "background":
+        reserve += settings.UPLOAD_WORKERS + 1  # upload workers and the outbox sweeper
+    if settings.ATTENDANCE_BATCH_ENABLED:
+        reserve += 1  # batch writer, which admitted requests wait on
+    return reserve
+
+# Bounded concurrency and load shedding for attendance marking; added first
+# so it runs after rate limiting
+mark_admission = AdmissionController(
+    max_concurrency=settings.MARK_MAX_CONCURRENCY or mark_concurrency(connection_budget.async_, mark_pool_reserve()),
+    max_queue=settings.MARK_MAX_QUEUE,
+    max_queue_wait=settings.MARK_MAX_QUEUE_WAIT_SECONDS,
+    max_retry_after=settings.MARK_MAX_RETRY_AFTER_SECONDS
 )
+if settings.MARK_ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=mark_admission,
+        paths=[f"{settings.API_V1_STR}/attendance/mark"]
+    )
+
+# Add Rate Limiting
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_limit=settings.RATE_LIMIT_REQUESTS,
+        window_seconds=settings.RATE_LIMIT_WINDOW_SECONDS
+    )
 
 # Configure CORS
 app.add_middleware(
@@ -63,9 +133,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["*"],
+    # "*" is ignored by browsers on credentialed requests, so list them
+    expose_headers=[
+        "X-Next-Cursor",
+        "X-Request-ID",
+        "X-RateLimit-Limit",
+        "X-RateLimit-Remaining",
+        "Retry-After",
+        "Content-Disposition"
+    ],
 )
 
+# Request IDs for log records and the X-Request-ID header; outermost
+app.add_middleware(RequestContextMiddleware)
+
 # Mount static files directory
 app.mount("/static", StaticFiles(directory=settings.STATIC_FILES_DIR), name="static")
 
@@ -79,13 +160,40 @@ def read_root():
         "version": settings.VERSION
     }
 
+@app.get("/internal/db-pool", include_in_schema=False)
+def db_pool_stats():
+    """Connection pool instrumentation for both engines, for diagnosing pool exhaustion"""
+    return {
+        "budget": {
+            "total": connection_budget.total,
+            "workers": connection_budget.workers,
+            "per_worker": connection_budget.per_worker,
+            "pgbouncer_mode": settings.DB_PGBOUNCER_MODE
+        },
+        "sync": pool_metrics.snapshot(),
+        "async": async_pool_metrics.snapshot()
+    }
+
+@app.get("/internal/admission", include_in_schema=False)
+def admission_stats():
+    """Queued, admitted and shed counts of the attendance marking admission controller"""
+    return mark_admission.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus exposition, summed over all workers in multiprocess mode"""
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
+
 @app.get("/health")
 def health_check():
     """Health check endpoint to verify the API is running"""
     try:
         # Test database connection
-        db = next(get_db())
-        db.execute(text("SELECT 1"))
+        with SessionLocal() as db:
+            db.execute(text("SELECT 1"))
         return {
             "status": "healthy",
             "database": "connected",
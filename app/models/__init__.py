@@ -6,4 +6,7 @@ from app.models.qr_session import QRSession
 from app.models.attendance import Attendance
 from app.models.admin_user import AdminUser
 from app.models.flagged_log import FlaggedLog
+from app.models.upload_outbox import UploadOutbox
+from app.models.daily_attendance_stats import DailyAttendanceStats
+from app.models.rollup_state import RollupState
 
@@ -1,5 +1,5 @@
 from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, LargeBinary, Index
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime, timezone, UTC
 
 # Import Base from base_class instead of base
@@ -19,11 +19,15 @@ class Attendance(Base):
     location_lon = Column(Float, nullable=False)
     is_valid_location = Column(Boolean, default=False)
     session_id = Column(String, ForeignKey("qr_sessions.session_id"), nullable=False, index=True)  # Added index for session lookups
-    created_at = Column(DateTime(timezone=True), default=datetime.now(UTC), index=True)  # Added index for time-based queries
-    timestamp = Column(DateTime(timezone=True), default=datetime.now(UTC))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC), index=True)  # Added index for time-based queries
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     selfie_path = Column(String, nullable=True)
-    selfie_data = Column(LargeBinary)
+    # Legacy inline bytes, superseded by selfie_blob_key. Deferred so that
+    # loading attendance rows never pulls the image unless it is accessed.
+    selfie_data = deferred(Column(LargeBinary))
     selfie_content_type = Column(String)
+    # SHA-256 content address of the selfie in the blob store
+    selfie_blob_key = Column(String(64), nullable=True)
 
     # Add venue_id column
     venue_id = Column(Integer, ForeignKey("venues.id"), nullable=True, index=True)  # Added index for venue lookups
@@ -33,12 +37,15 @@ class Attendance(Base):
     
     # Add composite indexes for common query patterns
     __table_args__ = (
-        # Composite index for session + roll_no (most common query)
-        Index('idx_attendance_session_roll', 'session_id', 'roll_no'),
+        # Unique index for session + roll_no (most common query). Also enforces
+        # one attendance per student per session and backs ON CONFLICT inserts.
+        Index('idx_attendance_session_roll', 'session_id', 'roll_no', unique=True),
         # Composite index for venue + timestamp (venue-based queries)
         Index('idx_attendance_venue_time', 'venue_id', 'timestamp'),
         # Composite index for branch + section (department queries)
         Index('idx_attendance_branch_section', 'branch', 'section'),
+        # Keyset pagination over attendance listings (timestamp, id)
+        Index('idx_attendance_timestamp_id', 'timestamp', 'id'),
     )
     
     def __repr__(self):
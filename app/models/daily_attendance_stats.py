@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, func
+
+from app.db.base_class import Base
+
+class DailyAttendanceStats(Base):
+    """
+    Attendance counters rolled up per day, venue, branch and section.
+
+    Maintained incrementally from the attendances table (see
+    app/services/rollup.py) so statistics endpoints don't scan history.
+    Days are calendar days in settings.STATS_TIMEZONE.
+    """
+    __tablename__ = "daily_attendance_stats"
+
+    day = Column(Date, primary_key=True)
+    venue_id = Column(Integer, primary_key=True, default=0)  # 0 = no venue (institution-wide)
+    branch = Column(String, primary_key=True)
+    section = Column(String, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    valid = Column(Integer, nullable=False, default=0)
+    invalid = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<DailyAttendanceStats(day={self.day}, venue_id={self.venue_id}, total={self.total})>"
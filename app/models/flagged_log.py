@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, UTC
 
@@ -11,9 +11,14 @@ class FlaggedLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, index=True)
     roll_no = Column(String, index=True)  # Added roll_no column
-    timestamp = Column(DateTime(timezone=True), default=datetime.now(UTC))
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     reason = Column(String)
     details = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # Keyset pagination over flagged log listings (timestamp, id)
+        Index('idx_flagged_logs_timestamp_id', 'timestamp', 'id'),
+    )
     
     def __repr__(self):
         return f"<FlaggedLog(session_id={self.session_id}, roll_no={self.roll_no})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, UTC
 
@@ -11,7 +11,11 @@ class QRSession(Base):
     session_id = Column(String, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     expires_at = Column(DateTime(timezone=True))
-    qr_image = Column(String, nullable=False)
+    qr_image = Column(String, nullable=True)  # Legacy base64 data URI; images are rendered on request now
+    # When set, QR codes carry a signed token that changes every rotation_seconds
+    rotation_seconds = Column(Integer, nullable=True)
+    # Set when a session is withdrawn before it expires
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
     
     # Add venue relationship
     venue_id = Column(Integer, ForeignKey("venues.id"), nullable=True)
@@ -20,6 +24,13 @@ class QRSession(Base):
     # Add relationship to Attendance
     attendances = relationship("Attendance", back_populates="session")
 
+    __table_args__ = (
+        # Keyset pagination over recent sessions (created_at, id)
+        Index('idx_qr_sessions_created_id', 'created_at', 'id'),
+        # Revocation list refreshes only scan revoked sessions
+        Index('idx_qr_sessions_revoked', 'revoked_at', postgresql_where=revoked_at.isnot(None)),
+    )
+
     def is_expired(self) -> bool:
         """Check if the session is expired"""
         return datetime.now(UTC) > self.expires_at
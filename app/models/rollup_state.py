@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime, func
+
+from app.db.base_class import Base
+
+class RollupState(Base):
+    """High-water mark of the attendance rows already folded into a rollup table"""
+    __tablename__ = "rollup_state"
+
+    name = Column(String, primary_key=True)
+    last_attendance_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<RollupState(name={self.name}, last_attendance_id={self.last_attendance_id})>"
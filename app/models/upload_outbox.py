@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, func
+
+from app.db.base_class import Base
+
+class UploadOutbox(Base):
+    """
+    Durable record of a selfie that still has to be uploaded to blob storage.
+
+    Written in the same transaction as the attendance row, so an upload is
+    never lost even if the process restarts before the background worker
+    gets to it. The bytes themselves wait in the local staging store.
+    """
+    __tablename__ = "upload_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    blob_key = Column(String(64), nullable=False, index=True)
+    content_type = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Sweeper query: pending rows that are due
+        Index('idx_upload_outbox_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"<UploadOutbox(blob_key={self.blob_key}, status={self.status})>"
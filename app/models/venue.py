@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, JSON
 from sqlalchemy.orm import relationship
 from app.db.base_class import Base
 
@@ -11,6 +11,8 @@ class Venue(Base):
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
     radius_meters = Column(Float, nullable=False)
+    # Optional list of circle/polygon zones; when set it replaces the circle above
+    geofence_zones = Column(JSON, nullable=True)
 
     institution = relationship("Institution", back_populates="venues")
     qr_sessions = relationship("QRSession", back_populates="venue")
@@ -58,9 +58,10 @@ class AttendanceResponse(AttendanceBase):
 class AttendanceList(BaseModel):
     """Schema for listing multiple attendance records"""
     items: list[AttendanceResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # Only counted on the first cursor page, on request
+    page: Optional[int] = None  # Not known when paging by cursor
     size: int
+    next_cursor: Optional[str] = None  # Pass back as `cursor` for the next page
 
     model_config = ConfigDict(from_attributes=True)
 
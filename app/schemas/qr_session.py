@@ -4,22 +4,31 @@ from typing import Optional, List
 
 class QRSessionBase(BaseModel):
     session_id: str
-    qr_image: str
+    qr_image: Optional[str] = None
     expires_at: datetime
 
+class QRSessionToken(BaseModel):
+    session_id: str
+    token: str
+    url: str
+    expires_in: int  # seconds until the next rotation
+
 class QRSessionCreate(BaseModel):
     venue_id: Optional[int] = None
 
 class QRSessionRequest(BaseModel):
     duration: int = Field(..., gt=0, le=1440, description="Duration in minutes")
+    rotation_seconds: Optional[int] = Field(None, ge=5, le=3600, description="Rotate the QR code every N seconds")
 
 class QRSessionResponse(BaseModel):
     session_id: str
     created_at: datetime
     expires_at: Optional[datetime] = None
-    qr_image: str
+    qr_image: str  # URL of GET /qr-session/{session_id}/image
     venue_id: Optional[int] = None
     venue_name: Optional[str] = None
+    rotation_seconds: Optional[int] = None
+    revoked_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True  # new pydantic v2 syntax (previously orm_mode)
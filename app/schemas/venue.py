@@ -1,5 +1,21 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, Tuple
+
+class GeofenceZone(BaseModel):
+    """A circle (latitude, longitude, radius_meters) or a polygon of (lat, lon) points"""
+    type: Literal["circle", "polygon"]
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_meters: Optional[float] = Field(None, gt=0)
+    points: Optional[List[Tuple[float, float]]] = None
+
+    @model_validator(mode="after")
+    def check_shape(self):
+        if self.type == "circle" and None in (self.latitude, self.longitude, self.radius_meters):
+            raise ValueError("A circle zone needs latitude, longitude and radius_meters")
+        if self.type == "polygon" and (not self.points or len(self.points) < 3):
+            raise ValueError("A polygon zone needs at least 3 points")
+        return self
 
 class VenueBase(BaseModel):
     name: str
@@ -7,6 +23,7 @@ class VenueBase(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     radius_meters: Optional[float] = None
+    geofence_zones: Optional[List[GeofenceZone]] = None
 
 class VenueCreate(VenueBase):
     pass
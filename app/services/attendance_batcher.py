@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.models.attendance import Attendance
+from app.models.upload_outbox import UploadOutbox
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRow:
+    __slots__ = ("values", "outbox", "future")
+
+    def __init__(self, values: dict, outbox: Optional[dict], future: asyncio.Future):
+        self.values = values
+        self.outbox = outbox
+        self.future = future
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.values["session_id"], self.values["roll_no"]
+
+
+async def write_attendance_batch(rows: List[_PendingRow]) -> Dict[Tuple[str, str], int]:
+    """
+    Insert a batch of attendance rows (and their upload outbox rows) in one
+    transaction: a single multi-row INSERT ... ON CONFLICT DO NOTHING
+    RETURNING. Returns the new ids by (session_id, roll_no); rows missing
+    from the result were duplicates.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(
+                pg_insert(Attendance)
+                .values([row.values for row in rows])
+                .on_conflict_do_nothing(index_elements=[Attendance.session_id, Attendance.roll_no])
+                .returning(Attendance.id, Attendance.session_id, Attendance.roll_no)
+            )
+            inserted = {(session_id, roll_no): attendance_id for attendance_id, session_id, roll_no in result.all()}
+            outbox = [row.outbox for row in rows if row.outbox is not None and row.key in inserted]
+            if outbox:
+                await db.execute(insert(UploadOutbox), outbox)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+    return inserted
+
+
+class AttendanceBatcher:
+    """
+    Write-behind batching of attendance inserts.
+
+    Validated rows are queued in-process and a flusher task writes them in
+    one transaction as soon as max_rows are waiting or max_delay_ms has
+    passed since the first one. Each caller awaits a future that resolves
+    once its row is committed, so a request still only succeeds after its
+    attendance is durable, but a burst of scans costs a handful of commits
+    instead of one per student.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = 200,
+        max_delay_ms: float = 5.0,
+        queue_size: int = 10000,
+        write: Callable[[List[_PendingRow]], Awaitable[Dict[Tuple[str, str], int]]] = write_attendance_batch
+    ):
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self._queue_size = queue_size
+        self._write = write
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._task = asyncio.create_task(self._flusher())
+        logger.info(f"Attendance batcher started (max {self.max_rows} rows, {self.max_delay * 1000:g} ms)")
+
+    async def stop(self) -> None:
+        """Flush everything already queued, then stop"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self._queue = None
+        logger.info("Attendance batcher stopped")
+
+    async def submit(self, values: dict, outbox: Optional[dict] = None) -> Optional[int]:
+        """
+        Queue an attendance row and wait until it is committed. Returns the new
+        attendance id, or None if (session_id, roll_no) already existed.
+        """
+        row = _PendingRow(values, outbox, asyncio.get_running_loop().create_future())
+        if not self.running:
+            # Not started (e.g. scripts): write it on its own
+            await self._flush([row])
+        else:
+            await self._queue.put(row)
+        return await row.future
+
+    async def _flusher(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is None:
+                break
+            batch = [row]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_rows:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if row is None:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[_PendingRow]) -> None:
+        # The same student twice in one batch: only the first row is written
+        unique: Dict[Tuple[str, str], _PendingRow] = {}
+        for row in batch:
+            if row.key in unique:
+                _resolve(row, None)
+            else:
+                unique[row.key] = row
+        rows = list(unique.values())
+
+        try:
+            inserted = await self._write(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                _fail(rows[0], e)
+                return
+            # Retry one by one so a single bad row doesn't fail the whole batch
+            logger.warning(f"Attendance batch of {len(rows)} rows failed, retrying rows individually: {e}")
+            for row in rows:
+                await self._flush([row])
+            return
+
+        self.batches += 1
+        self.rows += len(rows)
+        self.largest_batch = max(self.largest_batch, len(rows))
+        for row in rows:
+            _resolve(row, inserted.get(row.key))
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "rows_per_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch
+        }
+
+
+def _resolve(row: _PendingRow, attendance_id: Optional[int]) -> None:
+    # The request may have been cancelled (client went away) while queued
+    if not row.future.done():
+        row.future.set_result(attendance_id)
+
+
+def _fail(row: _PendingRow, error: Exception) -> None:
+    if not row.future.done():
+        row.future.set_exception(error)
+
+
+attendance_batcher = AttendanceBatcher(
+    max_rows=settings.ATTENDANCE_BATCH_MAX_ROWS,
+    max_delay_ms=settings.ATTENDANCE_BATCH_MAX_DELAY_MS
+)
@@ -0,0 +1,110 @@
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional
+
+from app.db.base import SessionLocal
+from app.db.projections import ATTENDANCE_RESPONSE_COLUMNS
+from app.models.attendance import Attendance
+from app.models.qr_session import QRSession
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson"
+}
+
+# Rows fetched from the server-side cursor per round trip; also the number of
+# rows encoded into each chunk written to the response
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FIELDS = [column.key for column in ATTENDANCE_RESPONSE_COLUMNS]
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def iter_attendance_rows(
+    session_id: Optional[str] = None,
+    venue_id: Optional[int] = None,
+    branch: Optional[str] = None,
+    section: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[dict]:
+    """
+    Yield matching attendance rows as dicts, oldest first.
+
+    The rows are read through a server-side cursor, so only one batch is held
+    in memory at a time. The generator owns its database session because it
+    outlives the request handler that creates it.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(*ATTENDANCE_RESPONSE_COLUMNS)
+        if session_id:
+            query = query.filter(Attendance.session_id == session_id)
+        if venue_id is not None:
+            venue_session_ids = db.query(QRSession.session_id).filter(QRSession.venue_id == venue_id)
+            query = query.filter(Attendance.session_id.in_(venue_session_ids.scalar_subquery()))
+        if branch:
+            query = query.filter(Attendance.branch == branch)
+        if section:
+            query = query.filter(Attendance.section == section)
+        # Range bounds on the raw column so the timestamp indexes can be used
+        if start_date:
+            query = query.filter(Attendance.timestamp >= datetime.combine(start_date, datetime.min.time()))
+        if end_date:
+            query = query.filter(Attendance.timestamp < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+
+        rows = query.order_by(Attendance.timestamp, Attendance.id)\
+            .execution_options(stream_results=True)\
+            .yield_per(batch_size)
+        for row in rows:
+            yield {field: _serialize(getattr(row, field)) for field in EXPORT_FIELDS}
+    finally:
+        db.close()
+
+
+def _chunked(rows: Iterator[dict], make_encoder, batch_size: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    encode = make_encoder(buffer)
+    pending = 0
+    for row in rows:
+        encode(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue()
+
+
+def iter_csv(rows: Iterator[dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Encode rows as CSV with a header line, one chunk per batch"""
+    header = io.StringIO()
+    csv.writer(header).writerow(EXPORT_FIELDS)
+    yield header.getvalue()
+
+    def make_encoder(buffer):
+        writer = csv.writer(buffer)
+        return lambda row: writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+    yield from _chunked(rows, make_encoder, batch_size)
+
+
+def iter_ndjson(rows: Iterator[dict], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Encode rows as newline-delimited JSON, one chunk per batch"""
+    def make_encoder(buffer):
+        return lambda row: buffer.write(json.dumps(row) + "\n")
+
+    yield from _chunked(rows, make_encoder, batch_size)
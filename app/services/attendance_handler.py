@@ -1,6 +1,9 @@
 from datetime import datetime, timezone, UTC
 from typing import Optional, Tuple
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import UploadFile
 import logging
 
@@ -10,91 +13,98 @@ from app.models.flagged_log import FlaggedLog
 from app.models.venue import Venue
 from app.schemas.attendance import AttendanceCreate
 from app.services.geo_validation import GeoValidator
+from app.services.session_cache import CachedSession, get_cached_session_async
 from app.utils.image_saver import ImageSaver
 from app.utils.cloud_storage import CloudStorage
-from app.core.exceptions import InvalidLocationException
+from app.utils.blob_storage import get_blob_storage
+from app.services.upload_queue import upload_queue
+from app.services.attendance_batcher import attendance_batcher
+from app.core.config import settings
+from app.core.metrics import mark_stage, time_upload
+from app.core.exceptions import InvalidLocationException, DuplicateAttendanceException
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 class AttendanceHandler:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self.image_saver = ImageSaver()
+        # Blob keys staged for background upload, handed off after commit
+        self._staged_uploads = []
 
-    def validate_session(self, session_id: str) -> Optional[QRSession]:
-        session = self.db.query(QRSession).filter(
-            QRSession.session_id == session_id
-        ).first()
+    async def validate_session(self, session_id: str) -> Optional[CachedSession]:
+        session = await get_cached_session_async(self.db, session_id)
         
-        if not session or session.expires_at < datetime.now(UTC):
+        if not session or session.is_expired():
             return None
         return session
 
     async def process_attendance(
         self, 
         attendance_data: AttendanceCreate, 
-        selfie: UploadFile
+        selfie: UploadFile,
+        session: Optional[CachedSession] = None,
+        location_check: Optional[Tuple[bool, float]] = None
     ) -> Tuple[bool, str]:
+        """
+        Record attendance with check-then-insert. A caller that has already
+        validated the session and checked the location (the mark endpoint)
+        passes them in as session and location_check = (is_valid, distance),
+        so neither the lookup nor the geofence runs twice.
+        """
         try:
             # Validate session
-            session = self.validate_session(attendance_data.session_id)
-            if not session:
-                logger.error(f"Invalid or expired session: {attendance_data.session_id}")
-                return False, "Invalid or expired session"
+            if session is None:
+                with mark_stage("session_lookup"):
+                    session = await self.validate_session(attendance_data.session_id)
+                if not session:
+                    logger.warning("Invalid or expired session: %s", attendance_data.session_id)
+                    return False, "Invalid or expired session"
 
-            # Get venue if available
-            venue = None
-            if session.venue_id:
-                venue = self.db.query(Venue).filter_by(id=session.venue_id).first()
-                logger.info(f"Using venue for validation: {venue.name if venue else 'None'}")
+            if location_check is None:
+                # Get venue if available (loaded together with the session)
+                venue = session.venue
 
-            # Create GeoValidator with venue if available
-            geo_validator = GeoValidator(venue)
+                # Create GeoValidator with venue if available
+                geo_validator = GeoValidator(venue)
 
-            # Add debug logging
-            logger.info(f"Received coordinates - Lat: {attendance_data.location_lat}, Lon: {attendance_data.location_lon}")
-            logger.info(f"Venue/Campus coordinates - Lat: {geo_validator.venue_lat}, Lon: {geo_validator.venue_lon}")
-
-            # Validate location and reject if invalid
-            try:
-                is_valid_location, distance = geo_validator.is_location_valid(
-                    attendance_data.location_lat,
-                    attendance_data.location_lon
+                logger.debug(
+                    "Checking %s,%s against venue %s at %s,%s",
+                    attendance_data.location_lat, attendance_data.location_lon,
+                    venue.name if venue else None, geo_validator.venue_lat, geo_validator.venue_lon
                 )
-                logger.info(f"Calculated distance: {distance} meters")
-            except InvalidLocationException as e:
-                logger.error(f"Invalid location: {str(e)}")
-                return False, str(e)
-
-            logger.info(f"Location validation result: valid={is_valid_location}, distance={distance:.2f}m")
-
-            # Save selfie to Cloudinary or local storage
-            selfie_path = await CloudStorage.upload_selfie(
-                selfie,
-                attendance_data.roll_no,
-                attendance_data.session_id
-            )
-            
-            logger.info(f"Selfie saved at: {selfie_path}")
-            
-            # Also store the selfie data in the database
-            await selfie.seek(0)  # Reset file position
-            selfie_content = await selfie.read()
+
+                # Validate location and reject if invalid
+                try:
+                    with mark_stage("geofence"):
+                        location_check = geo_validator.is_location_valid(
+                            attendance_data.location_lat,
+                            attendance_data.location_lon
+                        )
+                except InvalidLocationException as e:
+                    logger.warning("Invalid location: %s", e)
+                    return False, str(e)
+            is_valid_location, distance = location_check
+
+            logger.debug("Location validation result: valid=%s, distance=%.2fm", is_valid_location, distance)
+
+            # Save selfie to the blob store; the row only keeps its key
+            selfie_key, selfie_path = await self.store_selfie(selfie)
+            logger.debug("Selfie saved with key %s", selfie_key)
 
             # Create attendance record
             attendance_dict = attendance_data.model_dump()  # Fixed: use model_dump() instead of dict()
             attendance = Attendance(
                 **attendance_dict,
                 selfie_path=selfie_path,  # Keep storing the path
-                selfie_data=selfie_content,  # Also store the binary data
+                selfie_blob_key=selfie_key,
                 selfie_content_type=selfie.content_type,
                 is_valid_location=is_valid_location,
                 timestamp=datetime.now(UTC)
             )
             
             self.db.add(attendance)
-            logger.info("Added attendance record to session")
 
             # Log if location is invalid
             if not is_valid_location:
@@ -105,35 +115,181 @@ class AttendanceHandler:
                     details=f"Distance from institution: {distance:.2f} km"
                 )
                 self.db.add(flagged_log)
-                logger.warning(f"Invalid location flagged for roll_no: {attendance_data.roll_no}")
+                logger.warning("Invalid location flagged for roll_no %s", attendance_data.roll_no)
 
             try:
-                logger.info(f"Attempting to commit attendance record for roll_no: {attendance_data.roll_no}")
-                self.db.commit()
-                self.db.refresh(attendance)
-                
-                # Verify the record was actually saved
-                verification = self.db.query(Attendance).filter(
-                    Attendance.session_id == attendance_data.session_id,
-                    Attendance.roll_no == attendance_data.roll_no
-                ).first()
+                with mark_stage("commit"):
+                    await self.db.commit()
+                    self._notify_uploads()
+                    await self.db.refresh(attendance)
+                    
+                    # Verify the record was actually saved
+                    result = await self.db.execute(
+                        select(Attendance.id).where(
+                            Attendance.session_id == attendance_data.session_id,
+                            Attendance.roll_no == attendance_data.roll_no
+                        )
+                    )
+                    verification = result.first()
                 
                 if verification:
-                    logger.info(f"Successfully verified attendance for roll_no: {attendance_data.roll_no}")
+                    logger.debug("Verified attendance for roll_no %s", attendance_data.roll_no)
                     return True, "Attendance recorded successfully"
                 else:
-                    logger.error(f"Attendance record not found after commit for roll_no: {attendance_data.roll_no}")
+                    logger.error("Attendance record not found after commit for roll_no %s", attendance_data.roll_no)
                     return False, "Failed to record attendance: Database verification failed"
                 
+            except IntegrityError:
+                # Lost a race with a concurrent submission for the same roll_no
+                await self.db.rollback()
+                self._staged_uploads.clear()
+                raise await self._duplicate_exception(attendance_data)
             except Exception as e:
-                self.db.rollback()
-                logger.error(f"Database error while saving attendance: {str(e)}")
+                await self.db.rollback()
+                self._staged_uploads.clear()
+                logger.exception("Database error while saving attendance")
                 return False, f"Failed to record attendance: {str(e)}"
 
+        except DuplicateAttendanceException:
+            raise
         except Exception as e:
-            logger.error(f"Error in process_attendance: {str(e)}")
+            logger.exception("Error in process_attendance")
             return False, str(e)
 
+    async def insert_attendance(
+        self,
+        attendance_data: AttendanceCreate,
+        selfie: UploadFile,
+        is_valid_location: bool = True
+    ) -> int:
+        """
+        Record attendance with a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+        The caller has already validated the session and location. Relies on the
+        unique idx_attendance_session_roll index, so duplicates are detected by the
+        database instead of a separate SELECT. Returns the new attendance id or
+        raises DuplicateAttendanceException.
+        """
+        selfie_key, selfie_path = await self.store_selfie(selfie)
+
+        now = datetime.now(UTC)
+        stmt = (
+            pg_insert(Attendance)
+            .values(
+                **attendance_data.model_dump(),
+                selfie_path=selfie_path,
+                selfie_blob_key=selfie_key,
+                selfie_content_type=selfie.content_type,
+                is_valid_location=is_valid_location,
+                timestamp=now,
+                created_at=now
+            )
+            .on_conflict_do_nothing(index_elements=[Attendance.session_id, Attendance.roll_no])
+            .returning(Attendance.id)
+        )
+
+        try:
+            with mark_stage("commit"):
+                attendance_id = (await self.db.execute(stmt)).scalar()
+                if attendance_id is not None:
+                    await self.db.commit()
+            if attendance_id is None:
+                # Conflict: drop the staged upload along with the transaction
+                await self.db.rollback()
+                self._staged_uploads.clear()
+                raise await self._duplicate_exception(attendance_data)
+        except DuplicateAttendanceException:
+            raise
+        except Exception:
+            await self.db.rollback()
+            self._staged_uploads.clear()
+            raise
+
+        self._notify_uploads()
+        return attendance_id
+
+    async def insert_attendance_batched(
+        self,
+        attendance_data: AttendanceCreate,
+        selfie: UploadFile,
+        is_valid_location: bool = True
+    ) -> int:
+        """
+        Record attendance through the write-behind batcher.
+
+        Same contract as insert_attendance, but the row (and its upload outbox
+        row) is committed together with other concurrent submissions. Returns
+        once the row is durable, with its id, or raises DuplicateAttendanceException.
+        """
+        with mark_stage("selfie_upload"):
+            await selfie.seek(0)
+            content = await selfie.read()
+            content_type = selfie.content_type or "image/jpeg"
+            storage = get_blob_storage()
+            outbox = None
+            if settings.SELFIE_UPLOAD_MODE == "background":
+                key = await upload_queue.stage(None, content, content_type)
+                outbox = upload_queue.outbox_values(key, content_type)
+            else:
+                with time_upload("inline"):
+                    key = await storage.put(content, content_type)
+
+        now = datetime.now(UTC)
+        with mark_stage("commit"):
+            attendance_id = await attendance_batcher.submit(
+                {
+                    **attendance_data.model_dump(),
+                    "selfie_path": storage.url(key),
+                    "selfie_blob_key": key,
+                    "selfie_content_type": selfie.content_type,
+                    "is_valid_location": is_valid_location,
+                    "timestamp": now,
+                    "created_at": now
+                },
+                outbox
+            )
+        if attendance_id is None:
+            raise await self._duplicate_exception(attendance_data)
+
+        if outbox is not None:
+            upload_queue.notify(key)
+        return attendance_id
+
+    async def store_selfie(self, selfie: UploadFile) -> Tuple[str, Optional[str]]:
+        """Save the selfie to the blob store and return (blob key, public path)"""
+        with mark_stage("selfie_upload"):
+            await selfie.seek(0)  # Reset file position
+            content = await selfie.read()
+            content_type = selfie.content_type or "image/jpeg"
+            storage = get_blob_storage()
+            if settings.SELFIE_UPLOAD_MODE == "background":
+                # Only a local write here; the remote upload happens after commit
+                key = await upload_queue.stage(self.db, content, content_type)
+                self._staged_uploads.append(key)
+            else:
+                with time_upload("inline"):
+                    key = await storage.put(content, content_type)
+        return key, storage.url(key)
+
+    def _notify_uploads(self) -> None:
+        for key in self._staged_uploads:
+            upload_queue.notify(key)
+        self._staged_uploads.clear()
+
+    async def _duplicate_exception(self, attendance_data: AttendanceCreate) -> DuplicateAttendanceException:
+        """Build the duplicate error, looking up the original timestamp (error path only)"""
+        result = await self.db.execute(
+            select(Attendance.timestamp).where(
+                Attendance.session_id == attendance_data.session_id,
+                Attendance.roll_no == attendance_data.roll_no
+            )
+        )
+        return DuplicateAttendanceException(
+            roll_no=attendance_data.roll_no,
+            session_id=attendance_data.session_id,
+            timestamp=str(result.scalar())
+        )
+
 
 
 
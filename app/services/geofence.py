@@ -0,0 +1,242 @@
+"""
+Precompiled geofences for the attendance hot path.
+
+A venue is either a circle (center and radius) or a set of zones, each a
+circle or a polygon. A venue's geofence is compiled once into a small object holding everything
+that only depends on the venue (radians, scale factors, bounding box), so a
+check is a handful of float operations. Points clearly inside or outside are
+decided with an equirectangular approximation; only points close to the
+boundary pay for the exact haversine distance.
+"""
+import hashlib
+import json
+from functools import lru_cache
+from math import radians, sin, cos, asin, sqrt
+from typing import Sequence, Tuple
+
+EARTH_RADIUS_M = 6371000.0
+
+# Metres per degree of latitude (and of longitude at the equator)
+METERS_PER_DEGREE = EARTH_RADIUS_M * radians(1)
+
+# Relative error band around the radius in which the exact distance is used.
+# The equirectangular estimate is far more accurate than this for geofence
+# sized distances, so the fast decision never disagrees with haversine.
+BOUNDARY_TOLERANCE = 0.01
+
+# Beyond this radius the flat-earth approximation isn't trusted at all
+MAX_FAST_RADIUS_M = 50_000.0
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in meters"""
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * asin(min(1.0, sqrt(a)))
+
+
+def _circle_bbox(lat: float, lon: float, radius_meters: float) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle, slightly padded"""
+    dlat = radius_meters * (1 + BOUNDARY_TOLERANCE) / METERS_PER_DEGREE
+    # Longitude degrees shrink towards the poles; use the widest latitude in the circle
+    edge_cos = cos(radians(min(89.0, abs(lat) + dlat)))
+    dlon = min(180.0, dlat / edge_cos)
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+def _in_bbox(bbox: Tuple[float, float, float, float], lat: float, lon: float) -> bool:
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+
+class CircleGeofence:
+    """A center and radius with the per-venue constants precomputed"""
+
+    __slots__ = (
+        "latitude", "longitude", "radius_meters", "bbox",
+        "_max_dlat", "_inner", "_outer", "_fast"
+    )
+
+    def __init__(self, latitude: float, longitude: float, radius_meters: float):
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.radius_meters = float(radius_meters)
+        # No point further than this many degrees of latitude away can be inside
+        self._max_dlat = self.radius_meters * (1 + BOUNDARY_TOLERANCE) / METERS_PER_DEGREE
+        self._inner = self.radius_meters * (1 - BOUNDARY_TOLERANCE)
+        self._outer = self.radius_meters * (1 + BOUNDARY_TOLERANCE)
+        self._fast = self.radius_meters <= MAX_FAST_RADIUS_M
+        self.bbox = _circle_bbox(self.latitude, self.longitude, self.radius_meters)
+
+    def approximate_distance_m(self, lat: float, lon: float) -> float:
+        """Equirectangular distance from the center, accurate near the venue"""
+        dlat = lat - self.latitude
+        dlon = (lon - self.longitude + 180.0) % 360.0 - 180.0
+        x = dlon * cos(radians((lat + self.latitude) / 2))
+        return METERS_PER_DEGREE * sqrt(x * x + dlat * dlat)
+
+    def distance_m(self, lat: float, lon: float) -> float:
+        """Exact distance from the center in meters"""
+        return haversine_m(self.latitude, self.longitude, lat, lon)
+
+    def contains(self, lat: float, lon: float) -> bool:
+        """Whether a point is inside, without computing its exact distance"""
+        if not self._fast:
+            return self.distance_m(lat, lon) <= self.radius_meters
+        if abs(lat - self.latitude) > self._max_dlat:
+            # Cheap reject without any trigonometry
+            return False
+        distance = self.approximate_distance_m(lat, lon)
+        if distance <= self._inner:
+            return True
+        if distance > self._outer:
+            return False
+        return self.distance_m(lat, lon) <= self.radius_meters
+
+    def check(self, lat: float, lon: float) -> Tuple[bool, float]:
+        """
+        Return (inside, distance_meters) for a point.
+        The distance is exact near the boundary and far away, and the
+        equirectangular estimate (well within BOUNDARY_TOLERANCE) otherwise.
+        """
+        if not self._fast or abs(lat - self.latitude) > MAX_FAST_RADIUS_M / METERS_PER_DEGREE:
+            distance = self.distance_m(lat, lon)
+            return distance <= self.radius_meters, distance
+
+        distance = self.approximate_distance_m(lat, lon)
+        if distance <= self._inner:
+            return True, distance
+        if self._outer < distance <= MAX_FAST_RADIUS_M:
+            return False, distance
+        distance = self.distance_m(lat, lon)
+        return distance <= self.radius_meters, distance
+
+
+class PolygonGeofence:
+    """
+    A polygon given as (lat, lon) vertices. Points are projected onto a local
+    plane around the first vertex, which is exact enough for campus-sized
+    shapes, and tested with a bounding box first and ray casting after.
+    """
+
+    __slots__ = ("points", "bbox", "_origin", "_scale_x", "_vertices")
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        if len(points) < 3:
+            raise ValueError("A polygon needs at least 3 points")
+        self.points = [(float(lat), float(lon)) for lat, lon in points]
+        lats = [lat for lat, _ in self.points]
+        lons = [lon for _, lon in self.points]
+        self.bbox = (min(lats), min(lons), max(lats), max(lons))
+        self._origin = self.points[0]
+        self._scale_x = METERS_PER_DEGREE * cos(radians(self._origin[0]))
+        self._vertices = [self._project(lat, lon) for lat, lon in self.points]
+
+    def _project(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (lon - self._origin[1]) * self._scale_x, (lat - self._origin[0]) * METERS_PER_DEGREE
+
+    def _contains_projected(self, x: float, y: float) -> bool:
+        inside = False
+        vertices = self._vertices
+        x1, y1 = vertices[-1]
+        for x2, y2 in vertices:
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+            x1, y1 = x2, y2
+        return inside
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if not _in_bbox(self.bbox, lat, lon):
+            return False
+        return self._contains_projected(*self._project(lat, lon))
+
+    def check(self, lat: float, lon: float) -> Tuple[bool, float]:
+        """Return (inside, distance_meters); the distance is 0 inside and to the nearest edge outside"""
+        if self.contains(lat, lon):
+            return True, 0.0
+        x, y = self._project(lat, lon)
+        best = float("inf")
+        vertices = self._vertices
+        x1, y1 = vertices[-1]
+        for x2, y2 in vertices:
+            dx, dy = x2 - x1, y2 - y1
+            length = dx * dx + dy * dy
+            t = 0.0 if length == 0 else max(0.0, min(1.0, ((x - x1) * dx + (y - y1) * dy) / length))
+            px, py = x1 + t * dx - x, y1 + t * dy - y
+            best = min(best, px * px + py * py)
+            x1, y1 = x2, y2
+        return False, sqrt(best)
+
+
+class MultiZoneGeofence:
+    """A venue made of several circles and/or polygons; inside any zone counts"""
+
+    __slots__ = ("zones", "bbox")
+
+    def __init__(self, zones: Sequence):
+        if not zones:
+            raise ValueError("A multi-zone geofence needs at least one zone")
+        self.zones = list(zones)
+        self.bbox = (
+            min(zone.bbox[0] for zone in self.zones),
+            min(zone.bbox[1] for zone in self.zones),
+            max(zone.bbox[2] for zone in self.zones),
+            max(zone.bbox[3] for zone in self.zones)
+        )
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return any(zone.contains(lat, lon) for zone in self.zones if _in_bbox(zone.bbox, lat, lon))
+
+    def check(self, lat: float, lon: float) -> Tuple[bool, float]:
+        """Return (inside, distance_meters) to the nearest zone"""
+        best = float("inf")
+        for zone in self.zones:
+            inside, distance = zone.check(lat, lon)
+            if inside:
+                return True, distance
+            best = min(best, distance)
+        return False, best
+
+
+def _compile_zone(zone: dict):
+    zone_type = zone.get("type")
+    if zone_type == "circle":
+        return compile_circle(float(zone["latitude"]), float(zone["longitude"]), float(zone["radius_meters"]))
+    if zone_type == "polygon":
+        return PolygonGeofence([tuple(point) for point in zone["points"]])
+    raise ValueError(f"Unknown geofence zone type: {zone_type}")
+
+
+@lru_cache(maxsize=4096)
+def _compile_zones(zones_json: str) -> MultiZoneGeofence:
+    return MultiZoneGeofence([_compile_zone(zone) for zone in json.loads(zones_json)])
+
+
+def compile_venue(venue):
+    """
+    Compiled geofence for a venue (model or cached copy). Venues with
+    geofence_zones use those; others use their center and radius.
+    """
+    zones = getattr(venue, "geofence_zones", None)
+    if zones:
+        return _compile_zones(json.dumps(zones, sort_keys=True))
+    return compile_circle(venue.latitude, venue.longitude, venue.radius_meters)
+
+
+def geometry_version(venue) -> str:
+    """
+    Short fingerprint of a venue's geofence. Anything holding a venue's
+    geometry by reference (session tokens) compares it to tell whether its
+    copy of the venue is still current.
+    """
+    geometry = [
+        venue.latitude, venue.longitude, venue.radius_meters,
+        getattr(venue, "geofence_zones", None) or None
+    ]
+    return hashlib.sha256(json.dumps(geometry, sort_keys=True).encode()).hexdigest()[:12]
+
+
+@lru_cache(maxsize=4096)
+def compile_circle(latitude: float, longitude: float, radius_meters: float) -> CircleGeofence:
+    """Compiled geofence for a circle, shared by every check against that venue"""
+    return CircleGeofence(latitude, longitude, radius_meters)
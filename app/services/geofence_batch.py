@@ -0,0 +1,43 @@
+"""
+Vectorized geofence checks with NumPy, for bulk re-validation and imports.
+
+The request path uses the scalar engine in app.services.geofence; these
+functions evaluate whole arrays of coordinates at once.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from app.services.geofence import EARTH_RADIUS_M
+
+
+def haversine_m(lats, lons, venue_lats, venue_lons) -> np.ndarray:
+    """Element-wise great-circle distance in meters; inputs broadcast together"""
+    lat1 = np.radians(np.asarray(venue_lats, dtype=np.float64))
+    lon1 = np.radians(np.asarray(venue_lons, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def check_points(lats, lons, venue_lats, venue_lons, radii) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Validate points against their venues.
+
+    Venue arguments are scalars (every point against one venue) or arrays
+    with one entry per point. Returns (inside, distance_meters) arrays.
+    """
+    distances = haversine_m(lats, lons, venue_lats, venue_lons)
+    return distances <= np.asarray(radii, dtype=np.float64), distances
+
+
+def venue_membership(lats, lons, venue_lats, venue_lons, radii) -> np.ndarray:
+    """
+    Boolean matrix of shape (points, venues): whether each point lies inside
+    each venue's geofence.
+    """
+    lats = np.asarray(lats, dtype=np.float64)[:, np.newaxis]
+    lons = np.asarray(lons, dtype=np.float64)[:, np.newaxis]
+    distances = haversine_m(lats, lons, np.asarray(venue_lats)[np.newaxis, :], np.asarray(venue_lons)[np.newaxis, :])
+    return distances <= np.asarray(radii, dtype=np.float64)[np.newaxis, :]
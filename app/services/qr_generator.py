@@ -1,11 +1,11 @@
 from datetime import datetime, timedelta, UTC
 import uuid
 import json
-import qrcode
-from io import BytesIO
 import base64
-from typing import Tuple
+from typing import Optional, Tuple
 from app.core.config import settings
+from app.services.qr_renderer import attendance_url, qr_renderer
+from app.services.qr_tokens import make_session_token
 
 class QRGenerator:
     @staticmethod
@@ -13,27 +13,24 @@ class QRGenerator:
         return str(uuid.uuid4())
 
     @staticmethod
-    def create_qr_data(session_id: str, expires_at: datetime) -> str:
-        # Use settings.FRONTEND_URL
-        return f"{settings.FRONTEND_URL}/mark-attendance/{session_id}"
+    def create_qr_data(
+        session_id: str,
+        expires_at: datetime,
+        venue=None,
+        rotation_seconds: Optional[int] = None,
+        token: Optional[str] = None
+    ) -> str:
+        # Use settings.FRONTEND_URL, with a signed session token so marking
+        # attendance can validate the session without looking it up
+        session_token = None
+        if settings.QR_SESSION_TOKENS_ENABLED:
+            session_token = make_session_token(session_id, expires_at, venue, rotation_seconds)
+        return attendance_url(session_id, token, session_token)
 
     @staticmethod
     def generate_qr_code(data: str) -> str:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        # Add the URL directly, no JSON encoding needed
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        # Rendered in the shared QR process pool
+        img_str = base64.b64encode(qr_renderer.render(data)).decode()
         
         return f"data:image/png;base64,{img_str}"
 
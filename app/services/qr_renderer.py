@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import multiprocessing
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CacheCounter
+from app.utils.qr_render import render_qr
+
+logger = logging.getLogger(__name__)
+
+
+def attendance_url(session_id: str, token: Optional[str] = None, session_token: Optional[str] = None) -> str:
+    """URL a QR code points students to, with the session and rotating tokens if any"""
+    url = f"{settings.FRONTEND_URL}/mark-attendance/{session_id}"
+    params = [f"s={session_token}"] if session_token else []
+    if token:
+        params.append(f"t={token}")
+    return f"{url}?{'&'.join(params)}" if params else url
+
+
+class QRRenderer:
+    """
+    Renders QR codes in a process pool so the CPU work never runs on the
+    event loop or holds the GIL of a request thread. Recently rendered
+    images are kept in a small LRU cache.
+    """
+
+    def __init__(self, processes: int = 2, cache_size: int = 256):
+        self.processes = processes
+        self.cache_size = cache_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = Lock()
+        self._counter = CacheCounter("qr_image")
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None and self.processes > 0:
+                # spawn, not fork: the parent runs an event loop and DB pools
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                logger.info(f"QR renderer started with {self.processes} processes")
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def submit(self, data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> Future:
+        """Render in the pool (or inline when it isn't running) and return a future of the bytes"""
+        executor = self._executor
+        if executor is not None:
+            try:
+                return executor.submit(render_qr, data, fmt, box_size, border)
+            except BrokenProcessPool:
+                # A worker died; replace the pool and render this one inline
+                logger.error("QR render pool broke, restarting it")
+                self.stop()
+                self.start()
+        future = Future()
+        try:
+            future.set_result(render_qr(data, fmt, box_size, border))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _cached(self, key: tuple) -> Optional[bytes]:
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+                self._counter.hit()
+            else:
+                self._counter.miss()
+            return image
+
+    def prime(self, data: str, image: bytes, fmt: str = "png", box_size: int = 10, border: int = 4) -> None:
+        """Seed the cache with an image rendered elsewhere (e.g. by the session pool)"""
+        self._remember((data, fmt, box_size, border), image)
+
+    def _remember(self, key: tuple, image: bytes) -> None:
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def render(self, data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> bytes:
+        """Render from a sync (threadpool) endpoint; blocks only the calling thread"""
+        key = (data, fmt, box_size, border)
+        image = self._cached(key)
+        if image is None:
+            image = self.submit(data, fmt, box_size, border).result()
+            self._remember(key, image)
+        return image
+
+    async def render_async(self, data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> bytes:
+        key = (data, fmt, box_size, border)
+        image = self._cached(key)
+        if image is None:
+            image = await asyncio.wrap_future(self.submit(data, fmt, box_size, border))
+            self._remember(key, image)
+        return image
+
+
+class QRSessionPool:
+    """
+    Session IDs with their QR images rendered ahead of time.
+
+    Without session tokens or rotation a QR code only encodes the attendance
+    URL for its session ID; the venue and expiry live in the database row.
+    So one pool serves every venue, and generating a session takes a ready ID
+    and image instead of rendering. Each take triggers a background refill in
+    the renderer's process pool. Only used while QR_SESSION_TOKENS_ENABLED is
+    off, see new_session_id().
+    """
+
+    def __init__(self, renderer: QRRenderer, size: int = 50):
+        self.renderer = renderer
+        self.size = size
+        self._ready: deque = deque()
+        self._pending = 0
+        self._lock = Lock()
+
+    def take(self) -> Optional[Tuple[str, bytes]]:
+        """A pre-generated (session_id, png) pair, or None if the pool is empty"""
+        try:
+            item = self._ready.popleft()
+        except IndexError:
+            item = None
+        self.refill()
+        return item
+
+    def refill(self) -> None:
+        with self._lock:
+            missing = self.size - len(self._ready) - self._pending
+            if missing <= 0:
+                return
+            self._pending += missing
+        for _ in range(missing):
+            session_id = str(uuid.uuid4())
+            future = self.renderer.submit(attendance_url(session_id))
+            future.add_done_callback(lambda f, sid=session_id: self._filled(sid, f))
+
+    def _filled(self, session_id: str, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logger.warning(f"Pre-rendering QR code failed: {future.exception()}")
+            return
+        self._ready.append((session_id, future.result()))
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+
+qr_renderer = QRRenderer(processes=settings.QR_RENDER_PROCESSES, cache_size=settings.QR_RENDER_CACHE_SIZE)
+qr_session_pool = QRSessionPool(qr_renderer, size=settings.QR_SESSION_POOL_SIZE)
+
+
+def new_session_qr() -> Tuple[str, bytes]:
+    """A fresh session ID and its PNG QR code, from the pool when possible"""
+    pregenerated = qr_session_pool.take()
+    if pregenerated is not None:
+        # The image endpoint serves the first fetch from the cache
+        qr_renderer.prime(attendance_url(pregenerated[0]), pregenerated[1])
+        return pregenerated
+    session_id = str(uuid.uuid4())
+    return session_id, qr_renderer.render(attendance_url(session_id))
+
+
+def new_session_id(rotation_seconds: Optional[int] = None) -> str:
+    """
+    A fresh session ID. When the QR code encodes nothing but the ID it comes
+    from the pre-rendered pool, and its image is primed for the image
+    endpoint. A session token or rotating token makes the URL depend on the
+    session itself, so nothing can be rendered ahead of time; the image
+    endpoint renders it on first fetch.
+    """
+    if settings.QR_SESSION_TOKENS_ENABLED or rotation_seconds:
+        return str(uuid.uuid4())
+    session_id, _ = new_session_qr()
+    return session_id
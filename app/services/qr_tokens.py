@@ -0,0 +1,171 @@
+"""
+Signed tokens carried in QR code URLs.
+
+Session tokens carry what attendance marking needs to know about a session:
+its expiry, rotation and venue, with the version of the venue's geofence the
+token was issued for. The geometry itself stays server-side in the venue
+cache, which keeps the token (and so the QR code) small. Rotating tokens bind
+a session to a time slot: the lecturer's screen shows a new QR code every
+rotation_seconds, and a screenshot stops working once its slot (plus the
+allowed clock skew) has passed. Both are HMAC-signed with keys derived from
+SECRET_KEY, so they are verified without any database reads.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime, UTC
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.services.geofence import geometry_version
+from app.services.session_cache import CachedSession, get_cached_venue_async
+
+# Truncated HMAC-SHA256; 128 bits is plenty for tokens that live for minutes
+SIGNATURE_BYTES = 16
+
+
+def _signing_key(purpose: str) -> bytes:
+    # Separate keys per token type, so one kind can never be replayed as another
+    return hashlib.sha256(f"{purpose}:{settings.SECRET_KEY}".encode()).digest()
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(purpose: str, message: str) -> str:
+    digest = hmac.new(_signing_key(purpose), message.encode(), hashlib.sha256).digest()
+    return _b64encode(digest[:SIGNATURE_BYTES])
+
+
+def _signature_matches(signature: str, purpose: str, message: str) -> bool:
+    # Compared as bytes: compare_digest raises TypeError for non-ASCII str,
+    # and the signature comes straight from the client
+    return hmac.compare_digest(signature.encode(), _sign(purpose, message).encode())
+
+
+def current_slot(rotation_seconds: int, now: Optional[float] = None) -> int:
+    return int((time.time() if now is None else now) // rotation_seconds)
+
+
+def seconds_left_in_slot(rotation_seconds: int, now: Optional[float] = None) -> int:
+    now = time.time() if now is None else now
+    return max(int((current_slot(rotation_seconds, now) + 1) * rotation_seconds - now), 1)
+
+
+def make_rotating_token(session_id: str, rotation_seconds: int, now: Optional[float] = None) -> str:
+    """Token for the current time slot of a rotating session: <rotation>.<slot>.<signature>"""
+    slot = current_slot(rotation_seconds, now)
+    signature = _sign("qr-rotation", f"{session_id}.{rotation_seconds}.{slot}")
+    return f"{rotation_seconds}.{slot}.{signature}"
+
+
+def verify_rotating_token(
+    session_id: str,
+    token: Optional[str],
+    now: Optional[float] = None,
+    skew_seconds: Optional[float] = None
+) -> bool:
+    """
+    Check a rotating token statelessly. It is accepted while its slot
+    overlaps [now - skew, now + skew], so devices with slightly wrong clocks
+    and scans right at a rotation still work.
+    """
+    if not token:
+        return False
+    try:
+        rotation, slot, signature = token.split(".")
+        rotation_seconds, slot = int(rotation), int(slot)
+    except ValueError:
+        return False
+    if rotation_seconds <= 0:
+        return False
+
+    if not _signature_matches(signature, "qr-rotation", f"{session_id}.{rotation_seconds}.{slot}"):
+        return False
+
+    now = time.time() if now is None else now
+    skew = settings.QR_TOKEN_CLOCK_SKEW_SECONDS if skew_seconds is None else skew_seconds
+    slot_start = slot * rotation_seconds
+    return slot_start - skew <= now < slot_start + rotation_seconds + skew
+
+
+class SessionClaims(NamedTuple):
+    expires_at: datetime
+    venue_id: Optional[int]
+    geometry_version: Optional[str]
+    rotation_seconds: Optional[int]
+
+
+def make_session_token(
+    session_id: str,
+    expires_at: datetime,
+    venue=None,
+    rotation_seconds: Optional[int] = None
+) -> str:
+    """
+    Signed token with a session's expiry, venue and rotation:
+    <base64url JSON claims>.<signature>. The session ID is already in the
+    URL path, so it is bound through the signature rather than repeated in
+    the claims. Sessions without a venue use the institution geofence from
+    settings when the token is read.
+    """
+    claims = {"exp": int(expires_at.timestamp())}
+    if venue is not None:
+        claims["vid"] = venue.id
+        claims["gv"] = geometry_version(venue)
+    if rotation_seconds:
+        claims["rot"] = rotation_seconds
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign('qr-session', f'{session_id}.{payload}')}"
+
+
+def read_session_token(token: str, session_id: str) -> Optional[SessionClaims]:
+    """
+    The claims of a session token, or None if the token is forged, malformed
+    or issued for another session. Expiry is left to the caller, as for
+    sessions loaded from the database.
+    """
+    try:
+        payload, signature = token.split(".")
+    except ValueError:
+        return None
+    if not _signature_matches(signature, "qr-session", f"{session_id}.{payload}"):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+        expires_at = datetime.fromtimestamp(claims["exp"], UTC)
+    except (ValueError, KeyError, TypeError):
+        return None
+    return SessionClaims(expires_at, claims.get("vid"), claims.get("gv"), claims.get("rot"))
+
+
+async def session_from_claims(db: AsyncSession, session_id: str, claims: SessionClaims) -> Optional[CachedSession]:
+    """
+    The session described by a session token. Its venue comes from the
+    per-worker venue cache, reloaded when the cached geofence is not the
+    version the token was issued for. None if the venue no longer exists.
+    """
+    venue = None
+    if claims.venue_id is not None:
+        venue = await get_cached_venue_async(db, claims.venue_id, claims.geometry_version)
+        if venue is None:
+            return None
+    session = SimpleNamespace(
+        session_id=session_id,
+        created_at=None,
+        expires_at=claims.expires_at,
+        venue_id=claims.venue_id,
+        rotation_seconds=claims.rotation_seconds,
+        revoked_at=None
+    )
+    return CachedSession(session, venue)
@@ -0,0 +1,261 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Optional, Sequence
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = "daily_attendance_stats"
+
+# When an attendance row was recorded. Older rows may lack a timestamp; they
+# fall back to created_at, and rows with neither have no day and are skipped.
+RECORDED_AT_EXPR = "COALESCE(timestamp, created_at)"
+
+# Calendar day of an attendance row in the statistics timezone
+DAY_EXPR = f"DATE(timezone(:tz, {RECORDED_AT_EXPR}))"
+
+
+def get_watermark(db: Session) -> int:
+    """Id of the last attendance row folded into the rollup"""
+    value = db.execute(
+        text("SELECT last_attendance_id FROM rollup_state WHERE name = :name"),
+        {"name": ROLLUP_NAME}
+    ).scalar()
+    return value or 0
+
+
+def _lock_watermark(db: Session) -> int:
+    """The rollup's watermark, with its state row locked until the transaction ends"""
+    db.execute(
+        text("""
+            INSERT INTO rollup_state (name, last_attendance_id)
+            VALUES (:name, 0)
+            ON CONFLICT (name) DO NOTHING
+        """),
+        {"name": ROLLUP_NAME}
+    )
+    return db.execute(
+        text("SELECT last_attendance_id FROM rollup_state WHERE name = :name FOR UPDATE"),
+        {"name": ROLLUP_NAME}
+    ).scalar()
+
+
+def _fold(db: Session, where: str, params: dict, sign: int = 1) -> None:
+    """Add (sign=1) or take back (sign=-1) the attendance rows matching where"""
+    statement = text(f"""
+        INSERT INTO daily_attendance_stats (day, venue_id, branch, section, total, valid, invalid)
+        SELECT
+            {DAY_EXPR},
+            COALESCE(venue_id, 0),
+            branch,
+            section,
+            :sign * COUNT(*),
+            :sign * COUNT(*) FILTER (WHERE is_valid_location = TRUE),
+            :sign * COUNT(*) FILTER (WHERE is_valid_location = FALSE)
+        FROM attendances
+        WHERE {where}
+          -- day is part of the key; a row without one would fail the whole batch
+          AND {RECORDED_AT_EXPR} IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (day, venue_id, branch, section) DO UPDATE SET
+            total = daily_attendance_stats.total + EXCLUDED.total,
+            valid = daily_attendance_stats.valid + EXCLUDED.valid,
+            invalid = daily_attendance_stats.invalid + EXCLUDED.invalid,
+            updated_at = now()
+    """)
+    if "ids" in params:
+        statement = statement.bindparams(bindparam("ids", expanding=True))
+    db.execute(statement, {"tz": settings.STATS_TIMEZONE, "sign": sign, **params})
+
+
+def roll_up_daily_stats(db: Session, batch_size: int = 10000, lag_seconds: Optional[float] = None) -> int:
+    """
+    Fold attendance rows written since the last run into daily_attendance_stats.
+
+    Rows are taken in id order past the stored watermark. Only rows older than
+    lag_seconds are considered, so a transaction that took a lower id but
+    commits late is not skipped. The state row is locked for the duration, so
+    concurrent runs from several workers never count a row twice.
+    Returns the number of attendance rows folded in.
+    """
+    if lag_seconds is None:
+        lag_seconds = settings.DAILY_STATS_LAG_SECONDS
+
+    watermark = _lock_watermark(db)
+
+    batch = db.execute(
+        text(f"""
+            SELECT MAX(id) AS last_id, COUNT(*) AS row_count
+            FROM (
+                SELECT id FROM attendances
+                WHERE id > :watermark
+                  AND {RECORDED_AT_EXPR} < now() - make_interval(secs => :lag)
+                ORDER BY id
+                LIMIT :batch_size
+            ) AS batch
+        """),
+        {"watermark": watermark, "lag": lag_seconds, "batch_size": batch_size}
+    ).one()
+
+    if not batch.row_count:
+        db.commit()
+        return 0
+
+    _fold(db, "id > :watermark AND id <= :last_id", {"watermark": watermark, "last_id": batch.last_id})
+    db.execute(
+        text("""
+            UPDATE rollup_state
+            SET last_attendance_id = :last_id, updated_at = now()
+            WHERE name = :name
+        """),
+        {"last_id": batch.last_id, "name": ROLLUP_NAME}
+    )
+    db.commit()
+    return batch.row_count
+
+
+@contextmanager
+def refolding(db: Session, attendance_ids: Sequence[int]):
+    """
+    Keep daily_attendance_stats in step with attendance rows that are changed
+    inside the block (e.g. is_valid_location, branch). Rows already folded in
+    are taken back out before the block and folded in again after it; later
+    rows are picked up by the next rollup run as usual. The rollup state stays
+    locked until the caller commits, so no run can fold the rows in between.
+    """
+    watermark = _lock_watermark(db)
+    params = {"ids": list(attendance_ids), "watermark": watermark}
+    if params["ids"]:
+        _fold(db, "id IN :ids AND id <= :watermark", params, sign=-1)
+    yield
+    if params["ids"]:
+        _fold(db, "id IN :ids AND id <= :watermark", params)
+
+
+def backfill_daily_stats(db: Session, batch_size: int = 50000) -> int:
+    """Rebuild daily_attendance_stats from the full attendances history"""
+    db.execute(text("DELETE FROM daily_attendance_stats"))
+    db.execute(
+        text("""
+            INSERT INTO rollup_state (name, last_attendance_id)
+            VALUES (:name, 0)
+            ON CONFLICT (name) DO UPDATE SET last_attendance_id = 0, updated_at = now()
+        """),
+        {"name": ROLLUP_NAME}
+    )
+    db.commit()
+
+    total = 0
+    while True:
+        folded = roll_up_daily_stats(db, batch_size=batch_size)
+        if not folded:
+            break
+        total += folded
+        logger.info(f"Backfilled {total} attendance rows into {ROLLUP_NAME}")
+    return total
+
+
+def daily_counts(db: Session, start_day: date, end_day: date, venue_id: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Attendance totals per day between start_day and end_day (inclusive).
+
+    Reads the rollup and adds the few rows written since the last rollup run,
+    so results are current while the cost stays independent of history size.
+    """
+    params = {
+        "tz": settings.STATS_TIMEZONE,
+        "start_day": start_day,
+        "end_day": end_day,
+        "venue_id": venue_id,
+        "name": ROLLUP_NAME
+    }
+    venue_filter = "AND venue_id = :venue_id" if venue_id is not None else ""
+    tail_venue_filter = "AND COALESCE(venue_id, 0) = :venue_id" if venue_id is not None else ""
+
+    rows = db.execute(
+        text(f"""
+            SELECT day, SUM(total) AS total, SUM(valid) AS valid, SUM(invalid) AS invalid
+            FROM (
+                SELECT day, total, valid, invalid
+                FROM daily_attendance_stats
+                WHERE day BETWEEN :start_day AND :end_day {venue_filter}
+                UNION ALL
+                SELECT
+                    {DAY_EXPR} AS day,
+                    1,
+                    CASE WHEN is_valid_location = TRUE THEN 1 ELSE 0 END,
+                    CASE WHEN is_valid_location = FALSE THEN 1 ELSE 0 END
+                FROM attendances
+                WHERE id > (
+                    -- Read in the same statement so the rollup and the tail
+                    -- come from one snapshot and no row is counted twice
+                    SELECT COALESCE(MAX(last_attendance_id), 0)
+                    FROM rollup_state WHERE name = :name
+                ) {tail_venue_filter}
+            ) AS combined
+            WHERE day BETWEEN :start_day AND :end_day
+            GROUP BY day
+            ORDER BY day
+        """),
+        params
+    ).fetchall()
+
+    return {
+        row.day.strftime("%Y-%m-%d"): {
+            "total": int(row.total or 0),
+            "valid": int(row.valid or 0),
+            "invalid": int(row.invalid or 0)
+        }
+        for row in rows
+    }
+
+
+class DailyStatsRollupJob:
+    """Runs roll_up_daily_stats periodically in the background"""
+
+    def __init__(self, interval_seconds: float = 60.0):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Daily stats rollup job started (every {self.interval_seconds}s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await run_in_threadpool(self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Daily stats rollup failed: {e}")
+
+    @staticmethod
+    def run_once() -> int:
+        db = SessionLocal()
+        try:
+            return roll_up_daily_stats(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+rollup_job = DailyStatsRollupJob(interval_seconds=settings.DAILY_STATS_ROLLUP_INTERVAL_SECONDS)
@@ -0,0 +1,295 @@
+from collections import OrderedDict
+from datetime import datetime, UTC
+from threading import Lock
+from typing import Optional, Set, Union
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import CacheCounter
+from app.db.base import AsyncSessionLocal
+from app.models.qr_session import QRSession
+from app.models.venue import Venue
+from app.services.geofence import geometry_version
+
+logger = logging.getLogger(__name__)
+
+
+class CachedVenue:
+    """Detached, read-only copy of the venue fields used for validation"""
+    __slots__ = (
+        "id", "institution_id", "name", "latitude", "longitude", "radius_meters", "geofence_zones", "version"
+    )
+
+    def __init__(self, venue: Venue):
+        self.id = venue.id
+        self.institution_id = venue.institution_id
+        self.name = venue.name
+        self.latitude = venue.latitude
+        self.longitude = venue.longitude
+        self.radius_meters = venue.radius_meters
+        self.geofence_zones = venue.geofence_zones
+        self.version = geometry_version(venue)
+
+    def __repr__(self):
+        return f"<CachedVenue(name={self.name}, institution_id={self.institution_id})>"
+
+
+class CachedSession:
+    """Detached, read-only copy of a QRSession and its venue"""
+    __slots__ = ("session_id", "created_at", "expires_at", "venue_id", "rotation_seconds", "revoked_at", "venue")
+
+    def __init__(self, qr_session: QRSession, venue: Optional[Union[Venue, CachedVenue]] = None):
+        self.session_id = qr_session.session_id
+        self.created_at = qr_session.created_at
+        self.expires_at = _as_utc(qr_session.expires_at)
+        self.venue_id = qr_session.venue_id
+        self.rotation_seconds = getattr(qr_session, "rotation_seconds", None)
+        self.revoked_at = getattr(qr_session, "revoked_at", None)
+        if venue is not None and not isinstance(venue, CachedVenue):
+            venue = CachedVenue(venue)
+        self.venue = venue
+
+    def is_expired(self) -> bool:
+        """Check if the session is expired"""
+        return datetime.now(UTC) > self.expires_at
+
+    def __repr__(self):
+        return f"<CachedSession(session_id={self.session_id}, expires_at={self.expires_at})>"
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
+class SessionCache:
+    """
+    In-process LRU cache of QR sessions keyed by session_id.
+
+    Each entry expires at the session's own expires_at, so a cached session is
+    never served after it stops being valid. Safe to use from both async
+    endpoints and sync endpoints running in the threadpool.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedSession]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self._counter = CacheCounter("session")
+
+    def get(self, session_id: str) -> Optional[CachedSession]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                self._counter.miss()
+                return None
+            if entry.is_expired():
+                del self._entries[session_id]
+                self.misses += 1
+                self._counter.miss()
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            self._counter.hit()
+            return entry
+
+    def put(self, qr_session: QRSession, venue: Optional[Venue] = None) -> CachedSession:
+        entry = CachedSession(qr_session, venue_cache.put(venue) if venue is not None else None)
+        if entry.expires_at is None or entry.is_expired():
+            # Nothing to gain from caching a session that can't be used
+            return entry
+        with self._lock:
+            self._entries[entry.session_id] = entry
+            self._entries.move_to_end(entry.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class VenueCache:
+    """
+    In-process LRU cache of venues keyed by id, for sessions that are
+    validated from a signed token. The token names its venue and geometry
+    version; the geometry itself is looked up here.
+    """
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedVenue]" = OrderedDict()
+        self._lock = Lock()
+        self._counter = CacheCounter("venue")
+
+    def get(self, venue_id: int, version: Optional[str] = None) -> Optional[CachedVenue]:
+        """The cached venue, or None if it is missing or not at the given geometry version"""
+        with self._lock:
+            entry = self._entries.get(venue_id)
+            if entry is None or (version is not None and entry.version != version):
+                self._counter.miss()
+                return None
+            self._entries.move_to_end(venue_id)
+            self._counter.hit()
+            return entry
+
+    def put(self, venue: Venue) -> CachedVenue:
+        entry = venue if isinstance(venue, CachedVenue) else CachedVenue(venue)
+        with self._lock:
+            self._entries[entry.id] = entry
+            self._entries.move_to_end(entry.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, venue_id: int) -> None:
+        with self._lock:
+            self._entries.pop(venue_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+session_cache = SessionCache(max_entries=settings.SESSION_CACHE_MAX_ENTRIES)
+venue_cache = VenueCache(max_entries=settings.VENUE_CACHE_MAX_ENTRIES)
+
+
+def _session_query(session_id: str):
+    return (
+        select(QRSession)
+        .options(joinedload(QRSession.venue))
+        .where(QRSession.session_id == session_id)
+    )
+
+
+def get_cached_session(db: Session, session_id: str) -> Optional[CachedSession]:
+    """Look up a session through the cache, loading it (with its venue) on a miss"""
+    if settings.SESSION_CACHE_ENABLED:
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            return cached
+
+    qr_session = db.execute(_session_query(session_id)).scalars().first()
+    if qr_session is None:
+        return None
+    if settings.SESSION_CACHE_ENABLED:
+        return session_cache.put(qr_session, qr_session.venue)
+    return CachedSession(qr_session, qr_session.venue)
+
+
+async def get_cached_session_async(db: AsyncSession, session_id: str) -> Optional[CachedSession]:
+    """Async variant of get_cached_session for the attendance marking path"""
+    if settings.SESSION_CACHE_ENABLED:
+        cached = session_cache.get(session_id)
+        if cached is not None:
+            return cached
+
+    result = await db.execute(_session_query(session_id))
+    qr_session = result.scalars().first()
+    if qr_session is None:
+        return None
+    if settings.SESSION_CACHE_ENABLED:
+        return session_cache.put(qr_session, qr_session.venue)
+    return CachedSession(qr_session, qr_session.venue)
+
+
+async def get_cached_venue_async(
+    db: AsyncSession,
+    venue_id: int,
+    version: Optional[str] = None
+) -> Optional[CachedVenue]:
+    """
+    Look up a venue through the cache. On a miss, or when the cached geometry
+    is not the requested version, the venue is reloaded by primary key; the
+    current geometry is returned even if it has changed since that version.
+    None if the venue no longer exists.
+    """
+    cached = venue_cache.get(venue_id, version)
+    if cached is not None:
+        return cached
+
+    result = await db.execute(
+        select(Venue).where(Venue.id == venue_id).execution_options(populate_existing=True)
+    )
+    venue = result.scalars().first()
+    if venue is None:
+        venue_cache.invalidate(venue_id)
+        return None
+    return venue_cache.put(venue)
+
+
+class RevokedSessions:
+    """
+    Per-worker list of revoked, not yet expired sessions.
+
+    Signed session tokens are validated without reading the session, so this
+    list is what lets a revocation take effect: it is reloaded with one small
+    query at most every refresh_seconds, and sessions on it go through the
+    database. Revocations made in this worker apply immediately.
+    """
+
+    def __init__(self, refresh_seconds: float = 5.0):
+        self.refresh_seconds = refresh_seconds
+        self._session_ids: Set[str] = set()
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def add(self, session_id: str) -> None:
+        self._session_ids.add(session_id)
+
+    async def refresh(self) -> None:
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(QRSession.session_id).where(
+                    QRSession.revoked_at.isnot(None),
+                    QRSession.expires_at > now
+                )
+            )
+            self._session_ids = set(result.scalars().all())
+        self._loaded_at = time.monotonic()
+
+    async def contains(self, session_id: str) -> bool:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            async with self._lock:
+                # Another request may have refreshed while we waited
+                if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                    try:
+                        await self.refresh()
+                    except Exception as e:
+                        # Keep the last known list; retry on the next interval
+                        logger.error(f"Refreshing revoked sessions failed: {e}")
+                        self._loaded_at = time.monotonic()
+        return session_id in self._session_ids
+
+
+revoked_sessions = RevokedSessions(refresh_seconds=settings.SESSION_REVOCATION_REFRESH_SECONDS)
@@ -0,0 +1,107 @@
+import time
+import logging
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import CacheCounter
+from app.models.attendance import Attendance
+from app.models.flagged_log import FlaggedLog
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Small thread-safe cache whose entries expire after a fixed number of seconds.
+
+    Every invalidate bumps a generation counter; a value computed under an
+    older generation is not stored, so a slow compute that started before an
+    invalidate can't put its stale result back.
+    """
+
+    def __init__(self, ttl_seconds: float, name: str = "ttl"):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, tuple] = {}
+        self._lock = Lock()
+        self._generation = 0
+        self._counter = CacheCounter(name)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counter.miss()
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._counter.miss()
+                return None
+            self._counter.hit()
+            return value
+
+    def set(self, key: str, value: Any, generation: Optional[int] = None) -> None:
+        """Store a value; with a generation, only if nothing was invalidated since"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            generation = self._generation
+            value = compute()
+            self.set(key, value, generation)
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+# Not invalidated on writes: during a scan burst that would keep it cold, and
+# it would only clear this worker's copy. The summary lags by at most the TTL.
+statistics_cache = TTLCache(ttl_seconds=settings.STATISTICS_CACHE_TTL_SECONDS, name="statistics")
+
+
+def _compute_summary(db: Session) -> Dict[str, int]:
+    today_start = datetime.combine(datetime.now().date(), datetime.min.time())
+    flagged_count = select(func.count(FlaggedLog.id)).scalar_subquery()
+
+    # One scan of attendances with FILTER clauses instead of six COUNT queries
+    row = db.execute(
+        select(
+            func.count(Attendance.id).label("total_attendance"),
+            func.count(Attendance.id).filter(Attendance.is_valid_location == True).label("valid_locations"),
+            func.count(Attendance.id).filter(Attendance.is_valid_location == False).label("invalid_locations"),
+            func.count(func.distinct(Attendance.roll_no)).label("unique_students"),
+            func.count(Attendance.id).filter(Attendance.timestamp >= today_start).label("today_attendance"),
+            flagged_count.label("flagged_logs")
+        )
+    ).one()
+
+    return {
+        "total_attendance": row.total_attendance,
+        "valid_locations": row.valid_locations,
+        "invalid_locations": row.invalid_locations,
+        "unique_students": row.unique_students,
+        "today_attendance": row.today_attendance,
+        "flagged_logs": row.flagged_logs
+    }
+
+
+def get_statistics_summary(db: Session) -> Dict[str, int]:
+    """Summary statistics for the admin dashboard, cached for a short TTL"""
+    return statistics_cache.get_or_compute("summary", lambda: _compute_summary(db))
@@ -0,0 +1,226 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import UPLOADS_MISSING_STAGED, time_upload
+from app.db.base import AsyncSessionLocal
+from app.models.upload_outbox import UploadOutbox
+from app.utils.blob_storage import BlobStorage, LocalBlobStorage, get_blob_storage
+
+logger = logging.getLogger(__name__)
+
+# How long a fresh outbox row is left to the in-process worker before the
+# sweeper treats it as abandoned (e.g. the process restarted) and claims it
+CLAIM_GRACE_SECONDS = 60
+
+
+class SelfieUploadQueue:
+    """
+    Uploads selfies to blob storage in the background.
+
+    The request stages the bytes on local disk and adds an UploadOutbox row in
+    the same transaction as the attendance record. After commit the key is
+    handed to a bounded pool of asyncio workers. A periodic sweeper re-claims
+    rows that are due (retries with backoff, or rows left behind by a restart)
+    using FOR UPDATE SKIP LOCKED, so several uvicorn workers can share the table.
+    """
+
+    def __init__(
+        self,
+        target: Optional[BlobStorage] = None,
+        staging: Optional[LocalBlobStorage] = None,
+        workers: int = 4,
+        queue_size: int = 1000,
+        max_attempts: int = 5,
+        sweep_interval: float = 15.0,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal
+    ):
+        self._target = target
+        self.staging = staging or LocalBlobStorage(root_dir=settings.UPLOAD_STAGING_DIR)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.sweep_interval = sweep_interval
+        self._session_factory = session_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._queue_size = queue_size
+        self._tasks = []
+
+    @property
+    def target(self) -> BlobStorage:
+        if self._target is None:
+            self._target = get_blob_storage()
+        return self._target
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+        logger.info(f"Selfie upload queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Selfie upload queue stopped")
+
+    async def stage(self, db: Optional[AsyncSession], data: bytes, content_type: str) -> str:
+        """
+        Stage the bytes locally and add an outbox row to the caller's transaction.
+        Returns the blob key; call notify() once the transaction has committed.
+        With db=None only the bytes are staged and the caller writes
+        outbox_values() itself.
+        """
+        with time_upload("staging"):
+            key = await self.staging.put(data, content_type)
+        if db is not None:
+            db.add(UploadOutbox(**self.outbox_values(key, content_type)))
+        return key
+
+    @staticmethod
+    def outbox_values(key: str, content_type: str) -> dict:
+        return {
+            "blob_key": key,
+            "content_type": content_type,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": datetime.now(UTC) + timedelta(seconds=CLAIM_GRACE_SECONDS)
+        }
+
+    def notify(self, key: str) -> None:
+        """Hand a committed upload to the worker pool"""
+        if self._queue is None:
+            # Not started (e.g. scripts); the sweeper of a running app picks it up
+            return
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            logger.warning(f"Upload queue full, leaving {key} for the sweeper")
+
+    async def read(self, key: str) -> Optional[bytes]:
+        """Read a blob, serving it from staging while the upload is pending"""
+        content = await self.staging.get(key)
+        if content is not None:
+            return content
+        return await self.target.get(key)
+
+    async def _worker(self, worker_id: int) -> None:
+        while True:
+            key = await self._queue.get()
+            try:
+                await self.upload(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Upload worker {worker_id} failed on {key}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def upload(self, key: str) -> bool:
+        """Upload one staged blob and record the outcome in the outbox"""
+        data = await self.staging.get(key)
+        if data is None:
+            # Either another worker already uploaded and cleaned it up, or the
+            # bytes never were on this disk (a redeploy wiped staging, or the
+            # row was claimed by another instance). Only the first is done.
+            if await self.target.exists(key):
+                await self._mark_done(key)
+                return True
+            UPLOADS_MISSING_STAGED.inc()
+            logger.error(f"Staged bytes for {key} are missing and the blob is not in storage")
+            await self._mark_failed(key, "staged bytes missing on this instance")
+            return False
+
+        try:
+            with time_upload("background"):
+                await self.target.put(data)
+        except Exception as e:
+            logger.warning(f"Upload of {key} failed: {e}")
+            await self._mark_failed(key, str(e))
+            return False
+
+        await self._mark_done(key)
+        if not isinstance(self.target, LocalBlobStorage) or self.target.root_dir != self.staging.root_dir:
+            await self.staging.delete(key)
+        return True
+
+    async def _mark_done(self, key: str) -> None:
+        async with self._session_factory() as db:
+            await db.execute(
+                update(UploadOutbox)
+                .where(UploadOutbox.blob_key == key, UploadOutbox.status == "pending")
+                .values(status="done", last_error=None)
+            )
+            await db.commit()
+
+    async def _mark_failed(self, key: str, error: str) -> None:
+        async with self._session_factory() as db:
+            rows = (await db.execute(
+                select(UploadOutbox)
+                .where(UploadOutbox.blob_key == key, UploadOutbox.status == "pending")
+                .with_for_update()
+            )).scalars().all()
+            for row in rows:
+                row.attempts += 1
+                row.last_error = error[:1000]
+                if row.attempts >= self.max_attempts:
+                    row.status = "failed"
+                    logger.error(f"Giving up on upload of {key} after {row.attempts} attempts")
+                else:
+                    # Exponential backoff, picked up again by the sweeper
+                    delay = min(2 ** row.attempts * 5, 600)
+                    row.next_attempt_at = datetime.now(UTC) + timedelta(seconds=delay)
+            await db.commit()
+
+    async def _sweeper(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                for key in await self.claim_due(limit=self._queue_size // 2 or 1):
+                    self.notify(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Upload sweeper failed: {e}")
+
+    async def claim_due(self, limit: int) -> list:
+        """Claim pending rows that are due, leasing them so other workers skip them"""
+        async with self._session_factory() as db:
+            due = (
+                select(UploadOutbox.id)
+                .where(
+                    UploadOutbox.status == "pending",
+                    UploadOutbox.next_attempt_at <= datetime.now(UTC)
+                )
+                .order_by(UploadOutbox.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            result = await db.execute(
+                update(UploadOutbox)
+                .where(UploadOutbox.id.in_(due.scalar_subquery()))
+                .values(next_attempt_at=datetime.now(UTC) + timedelta(seconds=CLAIM_GRACE_SECONDS))
+                .returning(UploadOutbox.blob_key)
+            )
+            keys = sorted(set(result.scalars().all()))
+            await db.commit()
+        return keys
+
+
+upload_queue = SelfieUploadQueue(
+    workers=settings.UPLOAD_WORKERS,
+    queue_size=settings.UPLOAD_QUEUE_SIZE,
+    max_attempts=settings.UPLOAD_MAX_ATTEMPTS,
+    sweep_interval=settings.UPLOAD_SWEEP_INTERVAL_SECONDS
+)
@@ -0,0 +1,83 @@
+import logging
+from collections import defaultdict
+from math import floor
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.venue import Venue
+from app.services.geofence import compile_venue
+from app.services.statistics import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# A venue whose bounding box spans more cells than this is kept in a short
+# list checked for every lookup instead of being copied into every cell
+MAX_CELLS_PER_VENUE = 4096
+
+
+class VenueIndex:
+    """
+    Uniform grid over venue bounding boxes for "which venue is this point in".
+
+    Each venue is registered in every grid cell its bounding box touches, so a
+    lookup only tests the few venues sharing the point's cell, however many
+    venues the institution has.
+    """
+
+    def __init__(self, cell_degrees: float = 0.01):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], List] = defaultdict(list)
+        self._oversized: List = []
+        self.size = 0
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return floor(lat / self.cell_degrees), floor(lon / self.cell_degrees)
+
+    def add(self, venue_id: int, geofence) -> None:
+        min_lat, min_lon, max_lat, max_lon = geofence.bbox
+        lat_lo, lon_lo = self._cell(min_lat, min_lon)
+        lat_hi, lon_hi = self._cell(max_lat, max_lon)
+        entry = (venue_id, geofence)
+        if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > MAX_CELLS_PER_VENUE:
+            self._oversized.append(entry)
+        else:
+            for i in range(lat_lo, lat_hi + 1):
+                for j in range(lon_lo, lon_hi + 1):
+                    self._cells[(i, j)].append(entry)
+        self.size += 1
+
+    @classmethod
+    def build(cls, venues: Iterable, cell_degrees: float = 0.01) -> "VenueIndex":
+        index = cls(cell_degrees)
+        for venue in venues:
+            index.add(venue.id, compile_venue(venue))
+        return index
+
+    def locate(self, lat: float, lon: float) -> List[int]:
+        """Ids of the venues whose geofence contains the point"""
+        candidates = self._cells.get(self._cell(lat, lon), [])
+        return [
+            venue_id
+            for venue_id, geofence in (*candidates, *self._oversized)
+            if geofence.contains(lat, lon)
+        ]
+
+
+venue_index_cache = TTLCache(ttl_seconds=settings.VENUE_INDEX_TTL_SECONDS, name="venue_index")
+
+
+def get_venue_index(db: Session, institution_id: int) -> VenueIndex:
+    """Spatial index over an institution's venues, rebuilt when it expires"""
+    def build() -> VenueIndex:
+        venues = db.query(Venue).filter(Venue.institution_id == institution_id).all()
+        index = VenueIndex.build(venues)
+        logger.info(f"Built venue index for institution {institution_id} with {index.size} venues")
+        return index
+
+    return venue_index_cache.get_or_compute(str(institution_id), build)
+
+
+def invalidate_venue_index(institution_id: int) -> None:
+    venue_index_cache.invalidate(str(institution_id))
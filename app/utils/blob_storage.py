@@ -0,0 +1,171 @@
+import os
+import hashlib
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import aiofiles
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+
+def compute_blob_key(data: bytes) -> str:
+    """Content address of a blob: the hex SHA-256 digest of its bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStorage(ABC):
+    """
+    Content-addressed storage for binary objects such as selfies.
+
+    Blobs are identified by the SHA-256 of their content, so identical uploads
+    are stored once and a key can be computed before the upload happens.
+    """
+
+    @abstractmethod
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        """Store the bytes and return their key"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Return the bytes for a key, or None if the blob doesn't exist"""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Check whether a blob is stored under this key"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a blob; missing keys are ignored"""
+
+    def url(self, key: str) -> Optional[str]:
+        """Public URL or static path for a key, if the backend has one"""
+        return None
+
+
+class LocalBlobStorage(BlobStorage):
+    """
+    Stores blobs on the local filesystem under sharded directories:
+    <root>/ab/cd/abcdef... so no directory grows past 65536 entries.
+    """
+
+    def __init__(self, root_dir: str = None):
+        self.root_dir = Path(root_dir or settings.BLOB_STORAGE_DIR)
+
+    def path_for(self, key: str) -> Path:
+        if len(key) < 4 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return self.root_dir / key[:2] / key[2:4] / key
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        key = compute_blob_key(data)
+        path = self.path_for(key)
+        if not path.exists():
+            await run_in_threadpool(self._write, path, data)
+        return key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        path = self.path_for(key)
+        if not path.exists():
+            return None
+        async with aiofiles.open(path, "rb") as f:
+            return await f.read()
+
+    async def exists(self, key: str) -> bool:
+        return self.path_for(key).exists()
+
+    async def delete(self, key: str) -> None:
+        path = self.path_for(key)
+        if path.exists():
+            path.unlink()
+
+    def url(self, key: str) -> Optional[str]:
+        # Only blobs kept under the static directory are directly servable
+        try:
+            relative = self.path_for(key).relative_to(settings.STATIC_FILES_DIR)
+        except ValueError:
+            return None
+        return f"static/{relative.as_posix()}"
+
+
+class InMemoryBlobStorage(BlobStorage):
+    """Process-local stand-in backend for tests and local development"""
+
+    def __init__(self):
+        self.blobs = {}
+
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        key = compute_blob_key(data)
+        self.blobs[key] = data
+        return key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.blobs.get(key)
+
+    async def exists(self, key: str) -> bool:
+        return key in self.blobs
+
+    async def delete(self, key: str) -> None:
+        self.blobs.pop(key, None)
+
+
+_blob_storage: Optional[BlobStorage] = None
+
+
+def get_blob_storage() -> BlobStorage:
+    """
+    Return the configured blob storage backend.
+    Uses Cloudinary when it is configured, otherwise the local filesystem.
+
+    On Render the instance disk is wiped on every deploy, so falling back to
+    it there would lose selfies: without Cloudinary this raises instead,
+    unless BLOB_STORAGE_BACKEND=local is set explicitly (a persistent disk
+    mounted at BLOB_STORAGE_DIR).
+    """
+    global _blob_storage
+    if _blob_storage is None:
+        backend = settings.BLOB_STORAGE_BACKEND
+        on_render = os.getenv("RENDER") == "true"
+        if backend is None:
+            if os.getenv("CLOUDINARY_CLOUD_NAME"):
+                backend = "cloudinary"
+            elif on_render:
+                raise RuntimeError(
+                    "No durable blob storage on Render: set the CLOUDINARY_* variables, "
+                    "or BLOB_STORAGE_BACKEND=local with a persistent disk at BLOB_STORAGE_DIR"
+                )
+            else:
+                backend = "local"
+        if on_render and backend == "memory":
+            raise RuntimeError("The memory blob storage backend loses every selfie on restart")
+
+        if backend == "cloudinary":
+            from app.utils.cloud_storage import CloudStorage
+            _blob_storage = CloudStorage()
+        elif backend == "local":
+            _blob_storage = LocalBlobStorage()
+        elif backend == "memory":
+            _blob_storage = InMemoryBlobStorage()
+        else:
+            raise ValueError(f"Unknown blob storage backend: {backend}")
+        logger.info(f"Using {backend} blob storage")
+    return _blob_storage
@@ -1,11 +1,18 @@
 import os
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
+import httpx
 from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 import logging
 import aiofiles
 from pathlib import Path
+from typing import Optional
+
+from app.utils.blob_storage import BlobStorage, compute_blob_key
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -17,7 +24,49 @@ cloudinary.config(
     api_secret=os.getenv("CLOUDINARY_API_SECRET", "")
 )
 
-class CloudStorage:
+BLOB_FOLDER = "qr_attendance_selfies/blobs"
+
+class CloudStorage(BlobStorage):
+    """Cloudinary-backed storage; blobs are stored under their content hash"""
+
+    @staticmethod
+    def _public_id(key: str) -> str:
+        return f"{BLOB_FOLDER}/{key}"
+
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        key = compute_blob_key(data)
+        # overwrite=False makes re-uploading identical content a cheap no-op
+        await run_in_threadpool(
+            cloudinary.uploader.upload,
+            data,
+            public_id=self._public_id(key),
+            resource_type="image",
+            overwrite=False
+        )
+        return key
+
+    async def get(self, key: str) -> Optional[bytes]:
+        async with httpx.AsyncClient() as client:
+            response = await client.get(self.url(key))
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await run_in_threadpool(cloudinary.api.resource, self._public_id(key))
+            return True
+        except cloudinary.exceptions.NotFound:
+            return False
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(cloudinary.uploader.destroy, self._public_id(key))
+
+    def url(self, key: str) -> Optional[str]:
+        url, _ = cloudinary.utils.cloudinary_url(self._public_id(key), secure=True, resource_type="image")
+        return url
+
     @staticmethod
     async def upload_selfie(file: UploadFile, roll_no: str, session_id: str) -> str:
         """
@@ -36,8 +85,9 @@ class CloudStorage:
             # Read file content
             contents = await file.read()
             
-            # Upload to Cloudinary
-            result = cloudinary.uploader.upload(
+            # Upload to Cloudinary (the SDK is blocking, so run it off the event loop)
+            result = await run_in_threadpool(
+                cloudinary.uploader.upload,
                 contents,
                 public_id=filename,
                 folder="qr_attendance_selfies",
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: int) -> str:
+    """
+    Opaque keyset cursor for the row (sort_value, row_id).
+    The id breaks ties between rows with the same timestamp; a row without
+    a timestamp gets a null sort value.
+    """
+    payload = json.dumps(
+        [sort_value.isoformat() if sort_value is not None else None, row_id],
+        separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Optional[datetime], int]]:
+    """Decode a cursor from encode_cursor; raises a 400 if it was tampered with"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if type(row_id) is not int:
+            raise ValueError("cursor id must be an integer")
+        return (datetime.fromisoformat(sort_value) if sort_value is not None else None), row_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+def keyset_page(query, sort_column, id_column, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """
+    Fetch one page of query, newest first, starting after cursor.
+
+    Seeks with (sort_column, id_column) < cursor on a composite index instead
+    of OFFSET, so every page costs the same however deep it is. Rows with a
+    NULL sort_column come first, as in a backward scan of that index, and
+    are paged by id alone. Returns the rows and the cursor for the next page
+    (None on the last page).
+    """
+    after = decode_cursor(cursor)
+    if after:
+        sort_value, row_id = after
+        if sort_value is None:
+            # Still among the NULLs: the rest of them, then every dated row
+            query = query.filter(or_(
+                and_(sort_column.is_(None), id_column < row_id),
+                sort_column.isnot(None)
+            ))
+        else:
+            # NULLs sorted before the cursor, and fail the comparison anyway
+            query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    # One extra row tells us whether another page exists
+    rows = query.order_by(sort_column.desc().nulls_first(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
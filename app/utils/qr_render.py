@@ -0,0 +1,36 @@
+"""
+QR code rendering. Kept free of app imports so process pool workers can load
+it quickly without pulling in settings or the database layer.
+"""
+from io import BytesIO
+
+import qrcode
+import qrcode.image.svg
+
+QR_FORMATS = {
+    "png": "image/png",
+    "svg": "image/svg+xml"
+}
+
+
+def render_qr(data: str, fmt: str = "png", box_size: int = 10, border: int = 4) -> bytes:
+    """Render data as a QR code image (PNG or SVG) and return its bytes"""
+    if fmt not in QR_FORMATS:
+        raise ValueError(f"Unsupported QR format: {fmt}")
+
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffered = BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffered)
+    else:
+        # Black on white renders as a 1-bit image; optimize squeezes the PNG further
+        qr.make_image(fill_color="black", back_color="white").save(buffered, format="PNG", optimize=True)
+    return buffered.getvalue()
@@ -0,0 +1,32 @@
+"""
+Rebuild the daily_attendance_stats rollup from the attendances table.
+
+Run once after the rollup migration, or any time the rollup needs to be
+recomputed. Safe to run while the app is serving traffic: the background
+rollup job waits on the same state row lock.
+
+Usage:
+    python scripts/backfill_daily_stats.py [--batch-size 50000]
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.db.base import SessionLocal
+from app.services.rollup import backfill_daily_stats, get_watermark
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill daily attendance statistics")
+    parser.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = backfill_daily_stats(db, batch_size=args.batch_size)
+        print(f"Backfilled {total} attendance rows (watermark: {get_watermark(db)})")
+    finally:
+        db.close()
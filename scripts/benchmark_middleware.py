@@ -0,0 +1,119 @@
+"""
+Measure the per-request overhead of the rate limiting middleware.
+
+Runs an in-process app with a /health route and a multipart
+/attendance/mark route (same shape as the real endpoint, without the
+database) under three stacks:
+
+    none       no middleware
+    base_http  the previous BaseHTTPMiddleware implementation
+    asgi       the current pure ASGI RateLimitMiddleware
+
+and prints requests/sec for each. All stacks use the in-memory limiter so the
+numbers isolate middleware overhead from the limiter backend.
+
+Usage:
+    python scripts/benchmark_middleware.py [--requests 3000] [--concurrency 50] [--selfie-kb 200]
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import httpx
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.middleware import RateLimitMiddleware, rate_limit_key
+from app.core.rate_limit import MemoryRateLimiter
+
+LIMIT = 10_000_000
+WINDOW = 60
+
+
+class BaseHTTPRateLimitMiddleware(BaseHTTPMiddleware):
+    """The previous implementation, kept here as the baseline"""
+
+    def __init__(self, app, limiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        result = await self.limiter.hit(rate_limit_key(request.scope))
+        if not result.allowed:
+            raise HTTPException(status_code=429, detail="Too many requests. Please try again later.")
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+        return response
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    @app.post("/attendance/mark")
+    async def mark(
+        session_id: str = Form(...),
+        roll_no: str = Form(...),
+        selfie: UploadFile = File(...)
+    ):
+        content = await selfie.read()
+        return {"session_id": session_id, "roll_no": roll_no, "size": len(content)}
+
+    if stack == "base_http":
+        app.add_middleware(BaseHTTPRateLimitMiddleware, limiter=MemoryRateLimiter(LIMIT, WINDOW))
+    elif stack == "asgi":
+        app.add_middleware(RateLimitMiddleware, limiter=MemoryRateLimiter(LIMIT, WINDOW))
+    return app
+
+
+async def run(app: FastAPI, path: str, total: int, concurrency: int, selfie: bytes) -> float:
+    transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            if path == "/health":
+                response = await client.get(path)
+            else:
+                response = await client.post(
+                    path,
+                    data={"session_id": "bench", "roll_no": "21B01A0123"},
+                    files={"selfie": ("selfie.jpg", selfie, "image/jpeg")}
+                )
+            response.raise_for_status()
+
+        async def worker(count):
+            for _ in range(count):
+                await one()
+
+        # Warm up
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+        per_worker = total // concurrency
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return per_worker * concurrency / elapsed
+
+
+async def main(args):
+    selfie = b"\xff\xd8" + bytes(args.selfie_kb * 1024)
+    print(f"{'path':<18}{'stack':<12}{'req/s':>10}")
+    for path in ("/health", "/attendance/mark"):
+        for stack in ("none", "base_http", "asgi"):
+            rate = await run(build_app(stack), path, args.requests, args.concurrency, selfie)
+            print(f"{path:<18}{stack:<12}{rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark middleware overhead")
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--selfie-kb", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
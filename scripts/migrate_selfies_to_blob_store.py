@@ -0,0 +1,71 @@
+"""
+Move selfie bytes out of attendances.selfie_data into the blob store.
+
+Rows are processed in small batches using keyset pagination on id, so only
+one batch of images is held in memory at a time. Each batch writes the
+blobs, records their keys and clears selfie_data in one transaction, which
+makes the script safe to stop and re-run.
+
+Usage:
+    python scripts/migrate_selfies_to_blob_store.py [--batch-size 100] [--keep-data]
+"""
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+from app.db.base import engine
+from app.utils.blob_storage import get_blob_storage
+
+
+async def migrate_selfies(batch_size: int, keep_data: bool):
+    storage = get_blob_storage()
+    last_id = 0
+    migrated_count = 0
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT id, selfie_data, selfie_content_type
+                FROM attendances
+                WHERE id > :last_id
+                  AND selfie_data IS NOT NULL
+                  AND selfie_blob_key IS NULL
+                ORDER BY id
+                LIMIT :batch_size
+            """), {"last_id": last_id, "batch_size": batch_size}).fetchall()
+
+            if not rows:
+                break
+
+            for row in rows:
+                key = await storage.put(bytes(row.selfie_data), row.selfie_content_type or "image/jpeg")
+                conn.execute(
+                    text("""
+                        UPDATE attendances
+                        SET selfie_blob_key = :key,
+                            selfie_path = COALESCE(:path, selfie_path)
+                            {clear_data}
+                        WHERE id = :id
+                    """.format(clear_data="" if keep_data else ", selfie_data = NULL")),
+                    {"key": key, "path": storage.url(key), "id": row.id}
+                )
+
+            last_id = rows[-1].id
+            migrated_count += len(rows)
+            print(f"Migrated {migrated_count} selfies (last id: {last_id})")
+
+    print(f"Done. Migrated {migrated_count} selfies to the blob store.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move selfie bytes into the blob store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--keep-data", action="store_true", help="Don't clear selfie_data after copying")
+    args = parser.parse_args()
+
+    asyncio.run(migrate_selfies(args.batch_size, args.keep_data))
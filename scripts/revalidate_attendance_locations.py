@@ -0,0 +1,96 @@
+"""
+Re-check stored attendance locations against the current venue geofences.
+
+Useful after a venue's coordinates, radius or zones have been corrected. Rows
+are processed in id order, in chunks, with the vectorized geofence checks;
+rows without a venue are checked against the institution default. With
+--apply, the daily_attendance_stats counters of changed rows are corrected in
+the same transaction.
+
+Usage:
+    python scripts/revalidate_attendance_locations.py [--chunk-size 20000] [--apply]
+"""
+import sys
+import argparse
+from pathlib import Path
+
+# Add project root to Python path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.services.geofence import compile_venue
+from app.services.geofence_batch import check_points
+from app.services.rollup import refolding
+
+
+def revalidate(db, chunk_size: int, apply: bool) -> tuple:
+    checked = changed = 0
+    last_id = 0
+    while True:
+        rows = db.execute(
+            text("""
+                SELECT a.id, a.location_lat, a.location_lon, a.is_valid_location,
+                       COALESCE(v.latitude, :default_lat) AS venue_lat,
+                       COALESCE(v.longitude, :default_lon) AS venue_lon,
+                       COALESCE(v.radius_meters, :default_radius) AS radius,
+                       v.geofence_zones
+                FROM attendances a
+                LEFT JOIN qr_sessions s ON s.session_id = a.session_id
+                LEFT JOIN venues v ON v.id = s.venue_id
+                WHERE a.id > :last_id
+                ORDER BY a.id
+                LIMIT :chunk_size
+            """),
+            {
+                "default_lat": settings.INSTITUTION_LAT,
+                "default_lon": settings.INSTITUTION_LON,
+                "default_radius": settings.GEOFENCE_RADIUS_M,
+                "last_id": last_id,
+                "chunk_size": chunk_size
+            }
+        ).fetchall()
+        if not rows:
+            break
+
+        ids, lats, lons, stored, venue_lats, venue_lons, radii, zones = (
+            np.array(column, dtype=object if i == 7 else None) for i, column in enumerate(zip(*rows))
+        )
+        inside, _ = check_points(lats, lons, venue_lats, venue_lons, radii)
+        # Multi-zone venues aren't vectorized; check those rows one by one
+        for i in np.flatnonzero(zones != None):
+            inside[i] = compile_venue(rows[i]).contains(float(lats[i]), float(lons[i]))
+        mismatched = inside != stored.astype(bool)
+
+        if apply and mismatched.any():
+            # The daily rollup already counted these rows as valid or invalid
+            with refolding(db, [int(i) for i in ids[mismatched]]):
+                db.execute(
+                    text("UPDATE attendances SET is_valid_location = :valid WHERE id = :id"),
+                    [{"id": int(i), "valid": bool(v)} for i, v in zip(ids[mismatched], inside[mismatched])]
+                )
+            db.commit()
+
+        checked += len(rows)
+        changed += int(mismatched.sum())
+        last_id = int(ids[-1])
+        print(f"Checked {checked} rows, {changed} with a different result")
+    return checked, changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-validate attendance locations")
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--apply", action="store_true", help="Update is_valid_location for rows that changed")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        checked, changed = revalidate(db, args.chunk_size, args.apply)
+        action = "Updated" if args.apply else "Would update"
+        print(f"{action} {changed} of {checked} attendance rows")
+    finally:
+        db.close()
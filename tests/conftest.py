@@ -11,10 +11,12 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 
 from app.main import app
-from app.db.base import Base, get_db
+from app.db.base import Base, get_db, get_async_db
+from app.services.session_cache import session_cache
 
 # Load environment variables
 load_dotenv()
@@ -56,15 +58,42 @@ def db():
         connection.close()
 
 @pytest.fixture(scope="function")
-def client(db):
+def async_db(db):
+    """
+    AsyncSession on the same connection and transaction as db, so async
+    endpoints see the rows a test added and everything is rolled back.
+    Its proxied sync Session runs the statements on the test connection
+    inside a savepoint, so an endpoint's rollback doesn't end the test's
+    transaction.
+    """
+    def sync_session(bind=None, binds=None, **kw):
+        return TestingSessionLocal(bind=db.bind, join_transaction_mode="create_savepoint", **kw)
+
+    session = AsyncSession(sync_session_class=sync_session, expire_on_commit=False)
+    yield session
+
+@pytest.fixture(scope="function")
+def client(db, async_db):
     """Get test client with database session"""
     def override_get_db():
         try:
             yield db
         finally:
             db.close()
+
+    async def override_get_async_db():
+        try:
+            yield async_db
+        except Exception:
+            await async_db.rollback()
+            raise
+        finally:
+            await async_db.close()
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # Sessions cached by an earlier test were rolled back with it
+    session_cache.clear()
     with TestClient(app) as c:
         yield c
 
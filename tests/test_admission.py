@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, AdmissionRejected
+
+
+async def _hold(controller, release: asyncio.Event):
+    async with controller.admit():
+        await release.wait()
+
+
+def test_sheds_when_queue_is_full():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=2, max_queue=1, max_queue_wait=5, jitter=lambda: 0)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(_hold(controller, release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert (controller.in_flight, controller.queued) == (2, 1)
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit():
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue full"
+    assert rejected.retry_after >= 1
+    assert controller.stats()["admitted"] == 3
+    assert controller.stats()["shed_queue_full"] == 1
+
+
+def test_sheds_after_max_queue_wait():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=10, max_queue_wait=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.admit():
+                pass
+        release.set()
+        await holder
+        return controller, rejected.value
+
+    controller, rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue wait exceeded"
+    assert controller.queued == 0
+    assert controller.shed_timeout == 1
+
+
+def test_queued_request_runs_when_a_slot_frees():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, max_queue=1, max_queue_wait=5)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(controller, release))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_hold(controller, asyncio.Event()))
+        await asyncio.sleep(0)
+        assert controller.queued == 1
+        waiter.cancel()
+        release.set()
+        await holder
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        async with controller.admit():
+            return controller.in_flight
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_retry_after_tracks_service_time_and_is_capped():
+    controller = AdmissionController(max_concurrency=10, max_retry_after=30, jitter=lambda: 0)
+    controller.service_time = 2.0
+    controller.queued = 49
+    assert controller.retry_after() == 10
+
+    controller.queued = 10_000
+    assert controller.retry_after() == 30
+
+    spread = AdmissionController(max_concurrency=10, jitter=lambda: 1.0)
+    spread.service_time = 2.0
+    spread.queued = 49
+    assert spread.retry_after() == 15
@@ -5,6 +5,22 @@ from app.models.attendance import Attendance
 from app.models.qr_session import QRSession
 from fastapi.testclient import TestClient
 
+SELFIE = {"selfie": ("selfie.jpg", b"\xff\xd8\xff\xe0" + b"0" * 100 + b"\xff\xd9", "image/jpeg")}
+
+def mark_form(session_id: str, roll_no: str = "12345") -> dict:
+    """Multipart fields of /attendance/mark, at a point inside the default geofence"""
+    return {
+        "session_id": session_id,
+        "name": "John Doe",
+        "email": "john@example.com",
+        "roll_no": roll_no,
+        "phone": "1234567890",
+        "branch": "CSE",
+        "section": "A",
+        "location_lat": "16.466167",
+        "location_lon": "80.674499"
+    }
+
 @pytest.mark.attendance
 def test_create_attendance(db: Session):
     qr_session = QRSession(
@@ -175,21 +191,13 @@ def test_attendance_expired_session(client: TestClient, db: Session):
 
     response = client.post(
         "/api/v1/attendance/mark",
-        json={
-            "session_id": "expired-session-123",
-            "name": "John Doe",
-            "email": "john@example.com",
-            "roll_no": "12345",
-            "phone": "1234567890",
-            "branch": "CSE",
-            "section": "A",
-            "location_lat": 16.466167,
-            "location_lon": 80.674499
-        }
+        data=mark_form("expired-session-123"),
+        files=SELFIE
     )
     
     assert response.status_code == 400
-    assert "expired" in response.json()["detail"].lower()
+    assert response.json()["detail"]["error"] == "session_expired"
+    assert "expired" in response.json()["detail"]["message"].lower()
 
 @pytest.mark.attendance
 def test_duplicate_attendance(client: TestClient, db: Session):
@@ -224,26 +232,61 @@ def test_duplicate_attendance(client: TestClient, db: Session):
     assert response.status_code == 400
     assert "already marked" in response.json()["detail"].lower()
 
+@pytest.mark.attendance
+def test_mark_attendance_records_once(client: TestClient, db: Session):
+    """The async marking path sees the test's session and rejects a second scan"""
+    qr_session = QRSession(
+        session_id="mark-session-123",
+        expires_at=datetime.now(UTC) + timedelta(minutes=15)
+    )
+    db.add(qr_session)
+    db.commit()
 
+    response = client.post("/api/v1/attendance/mark", data=mark_form("mark-session-123"), files=SELFIE)
+    assert response.status_code == 200
+    assert response.json()["success"] is True
 
+    recorded = db.query(Attendance).filter_by(session_id="mark-session-123", roll_no="12345").all()
+    assert len(recorded) == 1
+    assert recorded[0].selfie_blob_key is not None
 
+    response = client.post("/api/v1/attendance/mark", data=mark_form("mark-session-123"), files=SELFIE)
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "duplicate_attendance"
 
+@pytest.mark.attendance
+def test_mark_attendance_unknown_session(client: TestClient):
+    response = client.post("/api/v1/attendance/mark", data=mark_form("no-such-session"), files=SELFIE)
 
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"] == "session_not_found"
 
+@pytest.mark.attendance
+def test_mark_attendance_validates_session_once(client: TestClient, db: Session, monkeypatch):
+    """The endpoint hands its validated session and geofence result to the handler"""
+    from app.services.attendance_handler import AttendanceHandler
+    from app.services.geo_validation import GeoValidator
 
+    qr_session = QRSession(
+        session_id="mark-session-once",
+        expires_at=datetime.now(UTC) + timedelta(minutes=15)
+    )
+    db.add(qr_session)
+    db.commit()
 
+    checks = []
+    is_location_valid = GeoValidator.is_location_valid
 
+    def counting_check(self, lat, lon):
+        checks.append((lat, lon))
+        return is_location_valid(self, lat, lon)
 
+    async def no_second_lookup(self, session_id):
+        raise AssertionError("session validated twice")
 
+    monkeypatch.setattr(GeoValidator, "is_location_valid", counting_check)
+    monkeypatch.setattr(AttendanceHandler, "validate_session", no_second_lookup)
 
-
-
-
-
-
-
-
-
-
-
-
+    response = client.post("/api/v1/attendance/mark", data=mark_form("mark-session-once"), files=SELFIE)
+    assert response.status_code == 200
+    assert len(checks) == 1
@@ -0,0 +1,90 @@
+import asyncio
+
+from app.services.attendance_batcher import AttendanceBatcher
+
+
+class FakeWriter:
+    """Stands in for the database: unique on (session_id, roll_no)"""
+
+    def __init__(self, fail_roll_no=None):
+        self.batches = []
+        self.existing = {}
+        self.fail_roll_no = fail_roll_no
+
+    async def __call__(self, rows):
+        if any(row.values["roll_no"] == self.fail_roll_no for row in rows):
+            raise RuntimeError("bad row")
+        self.batches.append(len(rows))
+        inserted = {}
+        for row in rows:
+            if row.key not in self.existing:
+                self.existing[row.key] = inserted[row.key] = len(self.existing) + 1
+        return inserted
+
+
+def _row(roll_no, session_id="s1"):
+    return {"session_id": session_id, "roll_no": roll_no}
+
+
+def _run_burst(batcher, rows):
+    async def burst():
+        await batcher.start()
+        try:
+            return await asyncio.gather(*(batcher.submit(row) for row in rows), return_exceptions=True)
+        finally:
+            await batcher.stop()
+    return asyncio.run(burst())
+
+
+def test_burst_is_written_in_few_batches():
+    writer = FakeWriter()
+    batcher = AttendanceBatcher(max_rows=100, max_delay_ms=50, write=writer)
+
+    ids = _run_burst(batcher, [_row(str(i)) for i in range(500)])
+
+    assert sorted(ids) == list(range(1, 501))
+    assert writer.batches == [100] * 5
+    assert batcher.stats()["rows_per_batch"] == 100
+
+
+def test_duplicates_resolve_to_none():
+    writer = FakeWriter()
+    writer.existing[("s1", "old")] = 99
+    batcher = AttendanceBatcher(max_rows=10, max_delay_ms=50, write=writer)
+
+    ids = _run_burst(batcher, [_row("a"), _row("a"), _row("old"), _row("b")])
+
+    assert ids[0] is not None and ids[3] is not None
+    assert ids[1] is None and ids[2] is None
+
+
+def test_failed_batch_only_fails_the_bad_row():
+    writer = FakeWriter(fail_roll_no="bad")
+    batcher = AttendanceBatcher(max_rows=10, max_delay_ms=50, write=writer)
+
+    results = _run_burst(batcher, [_row("a"), _row("bad"), _row("b")])
+
+    assert isinstance(results[1], RuntimeError)
+    assert isinstance(results[0], int) and isinstance(results[2], int)
+
+
+def test_submit_without_start_writes_immediately():
+    writer = FakeWriter()
+    batcher = AttendanceBatcher(write=writer)
+
+    assert asyncio.run(batcher.submit(_row("a"))) == 1
+    assert writer.batches == [1]
+
+
+def test_stop_flushes_queued_rows():
+    writer = FakeWriter()
+    batcher = AttendanceBatcher(max_rows=1000, max_delay_ms=10_000, write=writer)
+
+    async def scenario():
+        await batcher.start()
+        pending = [asyncio.ensure_future(batcher.submit(_row(str(i)))) for i in range(3)]
+        await asyncio.sleep(0)
+        await batcher.stop()
+        return await asyncio.gather(*pending)
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
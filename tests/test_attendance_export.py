@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from app.services.attendance_export import EXPORT_FIELDS, iter_csv, iter_ndjson
+
+
+def _rows(count):
+    for i in range(count):
+        row = {field: f"{field}-{i}" for field in EXPORT_FIELDS}
+        row["timestamp"] = datetime(2025, 1, 1, 9, i).isoformat()
+        yield row
+
+
+def test_csv_export_has_header_and_all_rows():
+    chunks = list(iter_csv(_rows(5), batch_size=2))
+
+    # Header, two full batches and the remainder
+    assert len(chunks) == 4
+    parsed = list(csv.reader(io.StringIO("".join(chunks))))
+    assert parsed[0] == EXPORT_FIELDS
+    assert len(parsed) == 6
+    assert parsed[5][EXPORT_FIELDS.index("roll_no")] == "roll_no-4"
+
+
+def test_ndjson_export_is_one_object_per_line():
+    lines = "".join(iter_ndjson(_rows(3), batch_size=2)).splitlines()
+
+    assert [json.loads(line)["timestamp"] for line in lines] == [
+        "2025-01-01T09:00:00", "2025-01-01T09:01:00", "2025-01-01T09:02:00"
+    ]
+
+
+def test_empty_export_still_has_csv_header():
+    assert "".join(iter_csv(iter([]))).strip() == ",".join(EXPORT_FIELDS)
+    assert list(iter_ndjson(iter([]))) == []
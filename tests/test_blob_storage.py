@@ -0,0 +1,62 @@
+import asyncio
+import hashlib
+import pytest
+from app.utils.blob_storage import LocalBlobStorage, compute_blob_key
+
+def test_local_blob_storage_round_trip(tmp_path):
+    storage = LocalBlobStorage(root_dir=str(tmp_path))
+    data = b"\xff\xd8\xff\xe0" + b"0" * 1000 + b"\xff\xd9"
+
+    key = asyncio.run(storage.put(data))
+
+    assert key == hashlib.sha256(data).hexdigest()
+    assert storage.path_for(key) == tmp_path / key[:2] / key[2:4] / key
+    assert asyncio.run(storage.exists(key))
+    assert asyncio.run(storage.get(key)) == data
+
+def test_local_blob_storage_deduplicates_content(tmp_path):
+    storage = LocalBlobStorage(root_dir=str(tmp_path))
+    first = asyncio.run(storage.put(b"same bytes"))
+    second = asyncio.run(storage.put(b"same bytes"))
+
+    assert first == second == compute_blob_key(b"same bytes")
+    assert len(list(tmp_path.rglob("*"))) == 3  # two shard dirs and one blob
+
+def test_local_blob_storage_missing_and_invalid_keys(tmp_path):
+    storage = LocalBlobStorage(root_dir=str(tmp_path))
+    missing = compute_blob_key(b"never stored")
+
+    assert asyncio.run(storage.get(missing)) is None
+    asyncio.run(storage.delete(missing))
+    with pytest.raises(ValueError):
+        storage.path_for("../../etc/passwd")
+
+@pytest.fixture
+def fresh_blob_storage(monkeypatch):
+    """get_blob_storage() resolved again from the environment, as on startup"""
+    from app.utils import blob_storage
+
+    monkeypatch.setattr(blob_storage, "_blob_storage", None)
+    monkeypatch.delenv("CLOUDINARY_CLOUD_NAME", raising=False)
+    monkeypatch.setattr(blob_storage.settings, "BLOB_STORAGE_BACKEND", None)
+    return blob_storage
+
+def test_render_without_durable_blob_storage_fails(fresh_blob_storage, monkeypatch):
+    monkeypatch.setenv("RENDER", "true")
+    with pytest.raises(RuntimeError):
+        fresh_blob_storage.get_blob_storage()
+
+    monkeypatch.setattr(fresh_blob_storage.settings, "BLOB_STORAGE_BACKEND", "memory")
+    with pytest.raises(RuntimeError):
+        fresh_blob_storage.get_blob_storage()
+
+def test_explicit_local_blob_storage_is_allowed_on_render(fresh_blob_storage, monkeypatch, tmp_path):
+    monkeypatch.setenv("RENDER", "true")
+    monkeypatch.setattr(fresh_blob_storage.settings, "BLOB_STORAGE_BACKEND", "local")
+    monkeypatch.setattr(fresh_blob_storage.settings, "BLOB_STORAGE_DIR", str(tmp_path))
+    assert isinstance(fresh_blob_storage.get_blob_storage(), LocalBlobStorage)
+
+def test_local_blob_storage_is_the_default_off_render(fresh_blob_storage, monkeypatch, tmp_path):
+    monkeypatch.delenv("RENDER", raising=False)
+    monkeypatch.setattr(fresh_blob_storage.settings, "BLOB_STORAGE_DIR", str(tmp_path))
+    assert isinstance(fresh_blob_storage.get_blob_storage(), LocalBlobStorage)
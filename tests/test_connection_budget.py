@@ -0,0 +1,43 @@
+from app.db.budget import PoolLimits, detect_workers, mark_concurrency, plan_connection_budget
+
+
+def test_budget_is_never_exceeded():
+    for total in (20, 80, 97, 500):
+        for workers in (1, 2, 4, 8):
+            budget = plan_connection_budget(total, workers)
+            assert budget.workers * budget.per_worker <= total
+            assert budget.sync.pool_size >= 1 and budget.async_.pool_size >= 1
+
+
+def test_four_workers_share_eighty_connections():
+    budget = plan_connection_budget(80, 4)
+
+    assert budget.per_worker == 20
+    assert budget.async_.connections == 15
+    assert budget.sync.connections == 5
+    assert "4 workers x 20 connections" in budget.describe()
+
+
+def test_tiny_budget_keeps_one_connection_per_engine():
+    budget = plan_connection_budget(4, 4)
+    assert budget.sync.connections == 1
+    assert budget.async_.connections == 1
+
+
+def test_detect_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    assert detect_workers() == 4
+    assert detect_workers(2) == 2
+    monkeypatch.setenv("WEB_CONCURRENCY", "not-a-number")
+    assert detect_workers() == 1
+    monkeypatch.delenv("WEB_CONCURRENCY")
+    assert detect_workers() == 1
+
+
+def test_mark_concurrency_leaves_the_reserve_free():
+    budget = plan_connection_budget(80, 4)
+
+    # Upload workers, sweeper and revocation refresh at the defaults
+    assert mark_concurrency(budget.async_, reserved=6) == 9
+    assert mark_concurrency(budget.async_, reserved=0) == budget.async_.connections
+    assert mark_concurrency(PoolLimits(pool_size=1, max_overflow=1), reserved=6) == 1
@@ -0,0 +1,107 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.geofence import CircleGeofence, PolygonGeofence, compile_circle, compile_venue, haversine_m
+from app.services.geo_validation import GeoValidator
+from app.services.venue_index import VenueIndex
+
+
+def test_fast_path_agrees_with_haversine():
+    rng = random.Random(42)
+    geofence = CircleGeofence(16.4663, 80.6747, 500)
+
+    for _ in range(5000):
+        lat = 16.4663 + rng.uniform(-0.01, 0.01)
+        lon = 80.6747 + rng.uniform(-0.01, 0.01)
+        exact = haversine_m(16.4663, 80.6747, lat, lon)
+        inside, distance = geofence.check(lat, lon)
+
+        assert inside == (exact <= 500)
+        assert geofence.contains(lat, lon) == inside
+        assert distance == pytest.approx(exact, rel=1e-3)
+
+
+def test_far_points_report_exact_distance():
+    geofence = CircleGeofence(17.444, 78.3498, 100)
+    inside, distance = geofence.check(19.076, 72.8777)
+
+    assert inside is False
+    assert distance == pytest.approx(haversine_m(17.444, 78.3498, 19.076, 72.8777))
+
+
+def test_compiled_geofences_are_shared():
+    assert compile_circle(16.4663, 80.6747, 500.0) is compile_circle(16.4663, 80.6747, 500.0)
+
+
+def test_geo_validator_uses_engine():
+    validator = GeoValidator()
+    is_valid, distance = validator.is_location_valid(validator.venue_lat, validator.venue_lon)
+
+    assert is_valid is True
+    assert distance == 0.0
+
+
+def test_batch_api_matches_scalar_engine():
+    np = pytest.importorskip("numpy")
+    from app.services.geofence_batch import check_points, venue_membership
+
+    lats = np.array([16.4663, 16.4700, 16.5000])
+    lons = np.array([80.6747, 80.6747, 80.6747])
+    inside, distances = check_points(lats, lons, 16.4663, 80.6747, 500)
+
+    assert inside.tolist() == [True, True, False]
+    assert distances[1] == pytest.approx(haversine_m(16.4663, 80.6747, 16.47, 80.6747))
+
+    matrix = venue_membership(lats, lons, [16.4663, 16.5], [80.6747, 80.6747], [500, 100])
+    assert matrix.tolist() == [[True, False], [True, False], [False, True]]
+
+
+# L-shaped block: 200m x 200m with the north-east 100m x 100m quarter cut out
+L_BLOCK = [
+    (16.4660, 80.6740), (16.4660, 80.67587), (16.46690, 80.67587),
+    (16.46690, 80.67493), (16.4678, 80.67493), (16.4678, 80.6740)
+]
+
+
+def test_polygon_contains_and_distance():
+    geofence = PolygonGeofence(L_BLOCK)
+
+    assert geofence.contains(16.4663, 80.6745)
+    # The cut-out corner is inside the bounding box but not the polygon
+    assert not geofence.contains(16.4675, 80.6755)
+    inside, distance = geofence.check(16.4660, 80.6770)
+    assert inside is False
+    assert distance == pytest.approx(haversine_m(16.4660, 80.67587, 16.4660, 80.6770), rel=1e-3)
+
+
+def test_multi_zone_venue():
+    venue = SimpleNamespace(
+        latitude=16.4660, longitude=80.6740, radius_meters=50,
+        geofence_zones=[
+            {"type": "polygon", "points": [list(point) for point in L_BLOCK]},
+            {"type": "circle", "latitude": 16.4700, "longitude": 80.6800, "radius_meters": 60}
+        ]
+    )
+    geofence = compile_venue(venue)
+
+    assert geofence.contains(16.4663, 80.6745)
+    assert geofence.contains(16.4703, 80.6801)
+    assert not geofence.contains(16.4690, 80.6790)
+    assert GeoValidator(venue).is_location_valid(16.4703, 80.6801)[0] is True
+
+
+def test_venue_index_finds_containing_venues():
+    rng = random.Random(7)
+    venues = [
+        SimpleNamespace(id=i, latitude=16.4 + rng.uniform(0, 0.2), longitude=80.6 + rng.uniform(0, 0.2),
+                        radius_meters=rng.uniform(30, 300), geofence_zones=None)
+        for i in range(2000)
+    ]
+    index = VenueIndex.build(venues)
+
+    for _ in range(300):
+        lat, lon = 16.4 + rng.uniform(0, 0.2), 80.6 + rng.uniform(0, 0.2)
+        expected = sorted(v.id for v in venues if haversine_m(v.latitude, v.longitude, lat, lon) <= v.radius_meters)
+        assert sorted(index.locate(lat, lon)) == expected
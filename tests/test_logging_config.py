@@ -0,0 +1,83 @@
+import json
+import logging
+import sys
+
+import pytest
+
+from app.core.logging_config import (
+    JsonFormatter,
+    SamplingFilter,
+    parse_levels,
+    request_id_var,
+    setup_logging,
+    stop_logging
+)
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    yield
+    stop_logging()
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_records_are_written_by_the_listener_with_request_id(capsys, restore_root_logger):
+    setup_logging(level="INFO", fmt="json")
+    token = request_id_var.set("req-123")
+    try:
+        logging.getLogger("app.test").info("marked %s in %s", "21A01", "hall", extra={"stage": "commit"})
+    finally:
+        request_id_var.reset(token)
+    logging.getLogger("app.test").debug("not written at INFO")
+    stop_logging()
+
+    lines = capsys.readouterr().out.strip().splitlines()
+    entry = json.loads(lines[-1])
+    assert entry["message"] == "marked 21A01 in hall"
+    assert entry["request_id"] == "req-123"
+    assert entry["stage"] == "commit"
+    assert entry["level"] == "INFO"
+    assert not any("not written" in line for line in lines)
+
+
+def test_per_logger_levels(capsys, restore_root_logger):
+    setup_logging(level="WARNING", fmt="json", levels={"app.chatty": "DEBUG"})
+    logging.getLogger("app.chatty").debug("kept")
+    logging.getLogger("app.quiet").info("dropped")
+    stop_logging()
+    logging.getLogger("app.chatty").setLevel(logging.NOTSET)
+
+    out = capsys.readouterr().out
+    assert "kept" in out and "dropped" not in out
+
+
+def test_sampling_keeps_warnings():
+    samples = iter([0.5, 0.005])
+    sampler = SamplingFilter(0.01, rng=lambda: next(samples))
+
+    def record(level):
+        return logging.LogRecord("app", level, __file__, 1, "msg", None, None)
+
+    assert not sampler.filter(record(logging.DEBUG))
+    assert sampler.filter(record(logging.INFO))
+    assert sampler.filter(record(logging.WARNING))
+
+
+def test_json_formatter_includes_exceptions():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+    entry = json.loads(JsonFormatter().format(record))
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_parse_levels():
+    assert parse_levels("app.services=debug, sqlalchemy.engine=WARNING,") == {
+        "app.services": "DEBUG",
+        "sqlalchemy.engine": "WARNING"
+    }
+    assert parse_levels("") == {}
@@ -0,0 +1,111 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import (
+    RequestMetrics,
+    instrument_queries,
+    mark_stage,
+    render_metrics,
+    request_metrics_var,
+    time_upload
+)
+from app.core.middleware import MetricsMiddleware
+from app.services.statistics import TTLCache
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_mark_stage_observes_stages_that_raise():
+    before = _sample("attendance_mark_stage_seconds_count", stage="test_stage")
+
+    with mark_stage("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with mark_stage("test_stage"):
+            raise ValueError("boom")
+
+    assert _sample("attendance_mark_stage_seconds_count", stage="test_stage") == before + 2
+
+
+def test_time_upload_records_outcome():
+    ok = _sample("selfie_upload_seconds_count", kind="test", outcome="ok")
+    error = _sample("selfie_upload_seconds_count", kind="test", outcome="error")
+
+    with time_upload("test"):
+        pass
+    with pytest.raises(OSError):
+        with time_upload("test"):
+            raise OSError("disk full")
+
+    assert _sample("selfie_upload_seconds_count", kind="test", outcome="ok") == ok + 1
+    assert _sample("selfie_upload_seconds_count", kind="test", outcome="error") == error + 1
+
+
+def test_named_cache_counts_hits_and_misses():
+    cache = TTLCache(ttl_seconds=60, name="test_cache")
+    hits = _sample("cache_requests_total", cache="test_cache", result="hit")
+    misses = _sample("cache_requests_total", cache="test_cache", result="miss")
+
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+
+    assert _sample("cache_requests_total", cache="test_cache", result="hit") == hits + 2
+    assert _sample("cache_requests_total", cache="test_cache", result="miss") == misses + 1
+
+
+def test_queries_are_added_to_the_current_request(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.sqlite3'}")
+    instrument_queries(engine, "test")
+    request_metrics = RequestMetrics(started=0.0)
+    token = request_metrics_var.set(request_metrics)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+    finally:
+        request_metrics_var.reset(token)
+        engine.dispose()
+
+    assert request_metrics.queries == 2
+    assert request_metrics.query_seconds > 0
+    assert _sample("db_query_duration_seconds_count", engine="test") >= 2
+
+
+def test_middleware_labels_requests_by_route_template(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.sqlite3'}")
+    instrument_queries(engine, "test_app")
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    before = _sample("http_requests_total", method="GET", route="/items/{item_id}", status="200")
+    queries = _sample("db_queries_per_request_sum", route="/items/{item_id}")
+    client = TestClient(app)
+
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    assert client.get("/missing").status_code == 404
+    engine.dispose()
+
+    assert _sample("http_requests_total", method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert _sample("db_queries_per_request_sum", route="/items/{item_id}") == queries + 2
+    assert _sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert _sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}") >= 2
+
+
+def test_render_metrics_exposes_text_format():
+    data, content_type = render_metrics()
+    assert content_type.startswith("text/plain")
+    assert b"http_requests_total" in data
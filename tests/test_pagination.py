@@ -0,0 +1,173 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import Column, DateTime, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_page
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2025, 3, 1, 9, 30, 15, 123456)
+    cursor = encode_cursor(created_at, 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+def test_empty_cursor_means_first_page():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "W10", "WyJub3QtYS1kYXRlIiwxXQ"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.parametrize("payload", ['["2025-01-01T00:00:00","x"]', '["2025-01-01T00:00:00",true]', '[1,1]'])
+def test_forged_cursor_values_are_rejected(payload):
+    import base64
+
+    cursor = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
+
+
+def test_cursor_for_a_row_without_timestamp():
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+def test_keyset_page_walks_all_rows_once():
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = "rows"
+        id = Column(Integer, primary_key=True)
+        timestamp = Column(DateTime)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = datetime(2025, 1, 1)
+    with Session(engine) as db:
+        # Pairs of rows share a timestamp so the id tie-breaker matters
+        db.add_all([Row(id=i, timestamp=start + timedelta(minutes=i // 2)) for i in range(1, 12)])
+        db.commit()
+
+        seen, cursor = [], ""
+        while cursor is not None:
+            rows, cursor = keyset_page(db.query(Row), Row.timestamp, Row.id, cursor, 3)
+            seen.extend(row.id for row in rows)
+
+    assert seen == list(range(11, 0, -1))
+
+
+def test_keyset_page_includes_rows_without_timestamp():
+    Base = declarative_base()
+
+    class Row(Base):
+        __tablename__ = "rows"
+        id = Column(Integer, primary_key=True)
+        timestamp = Column(DateTime, nullable=True)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = datetime(2025, 1, 1)
+    with Session(engine) as db:
+        # Every third row has no timestamp, so pages end on NULLs and on dates
+        db.add_all([
+            Row(id=i, timestamp=None if i % 3 == 0 else start + timedelta(minutes=i))
+            for i in range(1, 11)
+        ])
+        db.commit()
+
+        seen, cursor = [], ""
+        while cursor is not None:
+            rows, cursor = keyset_page(db.query(Row), Row.timestamp, Row.id, cursor, 2)
+            seen.extend(row.id for row in rows)
+
+    # Undated rows first, then newest first
+    assert seen == [9, 6, 3, 10, 8, 7, 5, 4, 2, 1]
+
+
+def test_recent_activity_has_no_cursor_after_a_full_last_page():
+    from fastapi import Response
+
+    import app.models  # noqa: F401  (configures the mappers that refer to each other)
+    import app.models.institution  # noqa: F401
+    import app.models.venue  # noqa: F401
+    from app.api.endpoints.admin import get_recent_activity
+    from app.db.base_class import Base
+    from app.models.attendance import Attendance
+    from app.models.institution import Institution
+    from app.models.qr_session import QRSession
+    from app.models.venue import Venue
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[Institution.__table__, Venue.__table__, QRSession.__table__, Attendance.__table__]
+    )
+    start = datetime(2025, 1, 1)
+    with Session(engine) as db:
+        db.add_all([
+            QRSession(id=i, session_id=f"s{i}", created_at=start + timedelta(minutes=i),
+                      expires_at=start + timedelta(minutes=i + 5))
+            for i in range(1, 5)
+        ])
+        db.add(Attendance(session_id="s4", name="A", email="a@example.com", roll_no="1", phone="1",
+                          branch="CSE", section="A", location_lat=0.0, location_lon=0.0))
+        db.commit()
+
+        first = Response()
+        page = get_recent_activity(first, limit=2, cursor=None, db=db, current_user={})
+        last = Response()
+        rest = get_recent_activity(last, limit=2, cursor=first.headers["X-Next-Cursor"], db=db, current_user={})
+
+    assert [row["session_id"] for row in page] == ["s4", "s3"]
+    assert [row["attendee_count"] for row in page] == [1, 0]
+    assert page[0]["duration"] == 5
+    assert [row["session_id"] for row in rest] == ["s2", "s1"]
+    # Exactly `limit` rows were left, so there is no further page
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_cursor_listing_counts_only_on_request():
+    import app.models  # noqa: F401  (configures the mappers that refer to each other)
+    import app.models.institution  # noqa: F401
+    import app.models.venue  # noqa: F401
+    from app.api.endpoints.admin import get_all_attendances
+    from app.db.base_class import Base
+    from app.models.attendance import Attendance
+    from app.models.institution import Institution
+    from app.models.qr_session import QRSession
+    from app.models.venue import Venue
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(
+        engine,
+        tables=[Institution.__table__, Venue.__table__, QRSession.__table__, Attendance.__table__]
+    )
+    with Session(engine) as db:
+        db.add_all([
+            Attendance(session_id="s1", name="Student", email="student@example.com",
+                       roll_no=f"2100{i}", phone="9876543210", branch="CSE", section="A",
+                       location_lat=16.4663, location_lon=80.6747, timestamp=datetime(2025, 1, 1, 9, i))
+            for i in range(3)
+        ])
+        db.commit()
+
+        def first_page(**kwargs):
+            return get_all_attendances(
+                skip=0, limit=2, branch=None, section=None, date=None, cursor="",
+                db=db, current_user={}, **kwargs
+            )
+
+        default = first_page()
+        counted = first_page(include_total=True)
+
+    assert default.total is None and default.size == 2 and default.next_cursor
+    assert counted.total == 3
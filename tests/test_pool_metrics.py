@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.db.pool_metrics import PoolMetrics
+
+
+@pytest.fixture
+def engine_and_metrics(tmp_path):
+    metrics = PoolMetrics("test")
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.sqlite3'}",
+        poolclass=metrics.pool_class(QueuePool),
+        pool_size=2,
+        max_overflow=1,
+        pool_timeout=0.1
+    )
+    metrics.attach(engine)
+    yield engine, metrics
+    engine.dispose()
+
+
+def test_counts_checkouts_and_pool_usage(engine_and_metrics):
+    engine, metrics = engine_and_metrics
+
+    first = engine.connect()
+    second = engine.connect()
+    first.execute(text("SELECT 1"))
+    stats = metrics.snapshot()
+
+    assert stats["checkouts"] == 2
+    assert stats["in_use"] == 2
+    assert stats["idle"] == 0
+    assert stats["connections_opened"] == 2
+    assert stats["checkout_wait_ms"]["max"] >= 0
+
+    first.close()
+    second.close()
+    stats = metrics.snapshot()
+    assert stats["in_use"] == 0
+    assert stats["idle"] == 2
+    assert stats["peak_in_use"] == 2
+
+
+def test_records_overflow_and_timeouts(engine_and_metrics):
+    engine, metrics = engine_and_metrics
+
+    held = [engine.connect() for _ in range(3)]
+    assert metrics.snapshot()["overflow"] == 1
+
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+    assert metrics.snapshot()["timeouts"] == 1
+
+    for connection in held:
+        connection.close()
+
+
+def test_closed_connections_leave_the_age_tracking(engine_and_metrics):
+    engine, metrics = engine_and_metrics
+
+    engine.connect().close()
+    assert metrics.snapshot()["connection_age_seconds"]["oldest"] >= 0
+
+    engine.dispose()
+    stats = metrics.snapshot()
+    assert stats["connections_closed"] == 1
+    assert stats["connection_age_seconds"]["oldest"] == 0.0
@@ -0,0 +1,46 @@
+from app.core.config import settings
+from app.services import qr_renderer as qr_renderer_module
+from app.services.qr_renderer import QRRenderer, QRSessionPool, attendance_url, new_session_id
+from app.utils.qr_render import render_qr
+
+
+def test_render_png_and_svg():
+    assert render_qr("https://example.com/x").startswith(b"\x89PNG")
+    assert b"<svg" in render_qr("https://example.com/x", fmt="svg")
+
+
+def test_renderer_caches_images():
+    renderer = QRRenderer(processes=0)
+
+    first = renderer.render("https://example.com/a")
+    assert renderer.render("https://example.com/a") is first
+
+
+def test_pool_hands_out_unique_pre_rendered_sessions():
+    pool = QRSessionPool(QRRenderer(processes=0), size=3)
+    pool.refill()
+    assert len(pool) == 3
+
+    taken = [pool.take() for _ in range(5)]
+    session_ids = [session_id for session_id, _ in taken]
+
+    assert len(set(session_ids)) == 5
+    # Refilled after every take
+    assert len(pool) == 3
+    session_id, png = taken[0]
+    assert png == render_qr(attendance_url(session_id))
+
+
+def test_session_ids_skip_the_pool_when_urls_carry_tokens(monkeypatch):
+    pool = QRSessionPool(QRRenderer(processes=0), size=2)
+    monkeypatch.setattr(qr_renderer_module, "qr_session_pool", pool)
+
+    monkeypatch.setattr(settings, "QR_SESSION_TOKENS_ENABLED", True)
+    new_session_id()
+    monkeypatch.setattr(settings, "QR_SESSION_TOKENS_ENABLED", False)
+    new_session_id(rotation_seconds=30)
+    assert len(pool) == 0  # nothing rendered that would never be served
+
+    pooled = new_session_id()
+    assert len(pool) == 2  # taken from the pool, which refills
+    assert pooled not in [session_id for session_id, _ in pool._ready]
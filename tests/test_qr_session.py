@@ -210,3 +210,19 @@ def test_validate_nonexistent_session(client: TestClient):
 
 
 
+
+@pytest.mark.qr_session
+def test_revoke_session_requires_authentication(client: TestClient, db: Session):
+    """Students see the session ID in the QR code, so they must not be able to revoke it"""
+    qr_session = QRSession(
+        session_id="revoke-session-123",
+        expires_at=datetime.now(UTC) + timedelta(minutes=15)
+    )
+    db.add(qr_session)
+    db.commit()
+
+    response = client.post("/api/v1/qr-session/revoke-session-123/revoke")
+
+    assert response.status_code == 401
+    db.refresh(qr_session)
+    assert qr_session.revoked_at is None
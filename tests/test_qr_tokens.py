@@ -0,0 +1,209 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401  (configures the mappers that refer to each other)
+import app.models.institution  # noqa: F401
+from app.db.base_class import Base
+from app.models.venue import Venue
+from app.services.geo_validation import GeoValidator
+from app.services.qr_tokens import (
+    current_slot,
+    make_rotating_token,
+    make_session_token,
+    read_session_token,
+    seconds_left_in_slot,
+    session_from_claims,
+    verify_rotating_token
+)
+from app.services.session_cache import venue_cache
+
+SESSION_ID = "3f6c1d2e-8a41-4b7e-9c55-0d2b7f1e6a90"
+NOW = 1_800_000_000.0
+
+
+def test_token_valid_within_its_slot():
+    token = make_rotating_token(SESSION_ID, 30, now=NOW)
+    assert verify_rotating_token(SESSION_ID, token, now=NOW, skew_seconds=0)
+    assert verify_rotating_token(SESSION_ID, token, now=NOW + 29, skew_seconds=0)
+
+
+def test_token_rejected_after_rotation():
+    token = make_rotating_token(SESSION_ID, 30, now=NOW)
+    assert not verify_rotating_token(SESSION_ID, token, now=NOW + 30, skew_seconds=0)
+    assert not verify_rotating_token(SESSION_ID, token, now=NOW + 300, skew_seconds=10)
+
+
+def test_clock_skew_window():
+    token = make_rotating_token(SESSION_ID, 30, now=NOW)
+    assert verify_rotating_token(SESSION_ID, token, now=NOW + 35, skew_seconds=10)
+    assert verify_rotating_token(SESSION_ID, token, now=NOW - 5, skew_seconds=10)
+    assert not verify_rotating_token(SESSION_ID, token, now=NOW + 45, skew_seconds=10)
+
+
+def test_token_bound_to_session():
+    token = make_rotating_token(SESSION_ID, 30, now=NOW)
+    assert not verify_rotating_token("another-session", token, now=NOW, skew_seconds=0)
+
+
+def test_forged_and_malformed_tokens_rejected():
+    rotation, slot, signature = make_rotating_token(SESSION_ID, 30, now=NOW).split(".")
+    # Moving the slot forward invalidates the signature
+    assert not verify_rotating_token(SESSION_ID, f"{rotation}.{int(slot) + 1}.{signature}", now=NOW + 30)
+    # So does claiming a longer rotation
+    assert not verify_rotating_token(SESSION_ID, f"3600.{slot}.{signature}", now=NOW)
+    for token in (None, "", "garbage", "30.abc.def", "0.0.sig", "a.b.c.d"):
+        assert not verify_rotating_token(SESSION_ID, token, now=NOW)
+
+
+def test_slot_helpers():
+    assert current_slot(30, now=NOW) == int(NOW // 30)
+    assert seconds_left_in_slot(30, now=current_slot(30, now=NOW) * 30 + 10) == 20
+
+
+ZONES = [
+    {"type": "circle", "latitude": 12.9716, "longitude": 77.5946, "radius_meters": 50},
+    {"type": "polygon", "points": [[12.9720, 77.5950], [12.9725, 77.5950], [12.9725, 77.5958], [12.9720, 77.5958]]}
+]
+
+
+def _venue(**overrides):
+    fields = dict(
+        id=7, institution_id=1, name="Main Hall", latitude=12.9716, longitude=77.5946,
+        radius_meters=80.0, geofence_zones=None
+    )
+    fields.update(overrides)
+    return SimpleNamespace(**fields)
+
+
+def _resolve(tmp_path, token, session_id=SESSION_ID, venue=None, before=None):
+    """Read a token and resolve its session against a database holding venue"""
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'venues.sqlite3'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all, tables=[Venue.__table__])
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            if venue is not None:
+                db.add(Venue(**vars(venue)))
+                await db.commit()
+            if before is not None:
+                await before(db)
+            claims = read_session_token(token, session_id)
+            session = None if claims is None else await session_from_claims(db, session_id, claims)
+        await engine.dispose()
+        return session
+
+    venue_cache.clear()
+    try:
+        return asyncio.run(scenario())
+    finally:
+        venue_cache.clear()
+
+
+def test_session_token_round_trip(tmp_path):
+    expires_at = datetime(2026, 10, 18, 12, 30, tzinfo=UTC)
+    token = make_session_token(SESSION_ID, expires_at, _venue(), rotation_seconds=30)
+
+    session = _resolve(tmp_path, token, venue=_venue())
+
+    assert session.session_id == SESSION_ID
+    assert session.expires_at == expires_at
+    assert session.venue_id == 7
+    assert session.rotation_seconds == 30
+    assert session.revoked_at is None
+    assert (session.venue.latitude, session.venue.longitude, session.venue.radius_meters) == (12.9716, 77.5946, 80.0)
+    assert session.venue.name == "Main Hall"
+
+
+def test_session_token_carries_no_geometry():
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue(geofence_zones=ZONES))
+    claims = read_session_token(token, SESSION_ID)
+
+    assert claims.venue_id == 7 and claims.geometry_version
+    # The same size as for a plain circle, so zones don't grow the QR code
+    assert len(token) == len(make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue()))
+
+
+def test_session_token_geofence_comes_from_the_venue(tmp_path):
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue(geofence_zones=ZONES))
+
+    venue = _resolve(tmp_path, token, venue=_venue(geofence_zones=ZONES)).venue
+
+    assert venue.geofence_zones == ZONES
+    assert GeoValidator(venue).is_location_valid(12.9716, 77.5946)[0]
+    assert not GeoValidator(venue).is_location_valid(12.99, 77.5946)[0]
+
+
+def test_cached_venue_is_used_while_its_geometry_is_current(tmp_path):
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue())
+
+    async def warm_then_delete(db):
+        venue_cache.put(_venue())
+        await db.execute(delete(Venue))
+        await db.commit()
+
+    session = _resolve(tmp_path, token, venue=_venue(), before=warm_then_delete)
+    assert session.venue.radius_meters == 80.0
+
+
+def test_changed_geometry_is_reloaded(tmp_path):
+    moved = _venue(radius_meters=200.0)
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), moved)
+
+    async def move_venue(db):
+        venue_cache.put(_venue())  # still holds the old radius
+        await db.execute(update(Venue).values(radius_meters=200.0))
+        await db.commit()
+
+    session = _resolve(tmp_path, token, venue=_venue(), before=move_venue)
+    assert session.venue.radius_meters == 200.0
+
+
+def test_session_token_for_deleted_venue(tmp_path):
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue())
+    assert _resolve(tmp_path, token) is None
+
+
+def test_session_token_without_venue(tmp_path):
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5))
+    session = _resolve(tmp_path, token)
+    assert session.venue is None and session.venue_id is None
+
+
+def test_expired_session_token_is_reported_as_expired(tmp_path):
+    token = make_session_token(SESSION_ID, datetime.now(UTC) - timedelta(minutes=1), _venue())
+    assert _resolve(tmp_path, token, venue=_venue()).is_expired()
+
+
+def test_forged_session_tokens_rejected():
+    token = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue())
+    payload, signature = token.split(".")
+
+    # Pointing at another venue or extending the expiry breaks the signature
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    for field, value in (("vid", 8), ("exp", claims["exp"] + 3600)):
+        forged_claims = dict(claims, **{field: value})
+        forged = base64.urlsafe_b64encode(json.dumps(forged_claims).encode()).decode().rstrip("=")
+        assert read_session_token(f"{forged}.{signature}", SESSION_ID) is None
+
+    # A valid token only works for its own session
+    assert read_session_token(token, "another-session") is None
+    for bad in ("", "garbage", f"{payload}.", f"{payload}.{signature}.x"):
+        assert read_session_token(bad, SESSION_ID) is None
+
+
+def test_non_ascii_tokens_rejected():
+    rotation, slot, _ = make_rotating_token(SESSION_ID, 30, now=NOW).split(".")
+    assert not verify_rotating_token(SESSION_ID, f"{rotation}.{slot}.sïgnature", now=NOW)
+    assert not verify_rotating_token(SESSION_ID, "30.1.\u00e9\u00e9", now=NOW)
+
+    payload, _ = make_session_token(SESSION_ID, datetime.now(UTC) + timedelta(minutes=5), _venue()).split(".")
+    assert read_session_token(f"{payload}.sïgnature", SESSION_ID) is None
+    assert read_session_token("päyload.signature", SESSION_ID) is None
+
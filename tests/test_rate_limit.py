@@ -0,0 +1,108 @@
+import asyncio
+from datetime import timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.middleware import RateLimitMiddleware, rate_limit_key
+from app.core.rate_limit import MemoryRateLimiter, SQLiteRateLimiter, evaluate_window
+from app.core.security import create_access_token
+
+
+def _hits(limiter, key, times):
+    return [asyncio.run(limiter.hit(key, now=t)).allowed for t in times]
+
+
+def test_limit_is_enforced_within_a_window():
+    limiter = MemoryRateLimiter(limit=3, window_seconds=60)
+
+    assert _hits(limiter, "ip:1", [0, 1, 2, 3]) == [True, True, True, False]
+    # Other clients have their own budget
+    assert _hits(limiter, "ip:2", [4]) == [True]
+
+
+def test_previous_window_is_weighted_by_overlap():
+    # 10 requests last window; a quarter of the way into this one 7.5 still count
+    assert evaluate_window(10, 2, 15, 10, 60).allowed is False
+    assert evaluate_window(10, 1, 15, 10, 60).allowed is True
+    # Three quarters in only 2.5 of them count
+    assert evaluate_window(10, 6, 45, 10, 60).allowed is True
+
+
+def test_denied_result_has_retry_after():
+    result = evaluate_window(0, 5, 20, 5, 60)
+
+    assert result.allowed is False
+    assert result.retry_after == 40
+
+
+def test_idle_keys_are_evicted():
+    limiter = MemoryRateLimiter(limit=10, window_seconds=60)
+    asyncio.run(limiter.hit("ip:idle", now=0))
+    asyncio.run(limiter.hit("ip:active", now=170))
+
+    assert len(limiter) == 1
+
+
+def test_sqlite_limiter_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    worker_a = SQLiteRateLimiter(limit=2, window_seconds=60, path=path)
+    worker_b = SQLiteRateLimiter(limit=2, window_seconds=60, path=path)
+
+    assert _hits(worker_a, "ip:1", [0]) == [True]
+    assert _hits(worker_b, "ip:1", [1]) == [True]
+    assert _hits(worker_a, "ip:1", [2]) == [False]
+
+
+def test_middleware_returns_429_with_retry_after():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=MemoryRateLimiter(limit=1, window_seconds=60))
+    client = TestClient(app)
+
+    first = client.get("/ping")
+    assert first.status_code == 200
+    assert first.headers["X-RateLimit-Remaining"] == "0"
+
+    second = client.get("/ping")
+    assert second.status_code == 429
+    assert int(second.headers["Retry-After"]) >= 1
+    assert second.json() == {"detail": "Too many requests. Please try again later."}
+
+
+def _scope(authorization=None, ip="10.0.0.1"):
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return {"type": "http", "headers": headers, "client": (ip, 50000)}
+
+
+def test_verified_tokens_are_limited_per_subject():
+    first = create_access_token({"sub": "admin"})
+    second = create_access_token({"sub": "admin"}, expires_delta=timedelta(minutes=5))
+
+    assert rate_limit_key(_scope(f"Bearer {first}")) == "user:admin"
+    assert rate_limit_key(_scope(f"Bearer {second}", ip="10.0.0.2")) == "user:admin"
+
+
+def test_forged_and_expired_tokens_fall_back_to_the_client_ip():
+    expired = create_access_token({"sub": "admin"}, expires_delta=timedelta(minutes=-1))
+
+    assert rate_limit_key(_scope("Bearer not-a-jwt")) == "ip:10.0.0.1"
+    assert rate_limit_key(_scope(f"Bearer {expired}")) == "ip:10.0.0.1"
+
+
+def test_forged_bearers_from_one_ip_share_a_bucket():
+    app = FastAPI()
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    app.add_middleware(RateLimitMiddleware, limiter=MemoryRateLimiter(limit=1, window_seconds=60))
+    client = TestClient(app)
+
+    assert client.get("/ping", headers={"Authorization": "Bearer forged-1"}).status_code == 200
+    assert client.get("/ping", headers={"Authorization": "Bearer forged-2"}).status_code == 429
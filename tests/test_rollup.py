@@ -0,0 +1,146 @@
+from datetime import date, datetime, timedelta, UTC
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.models.attendance import Attendance
+from app.models.institution import Institution
+from app.models.qr_session import QRSession
+from app.models.venue import Venue
+from app.services.rollup import backfill_daily_stats, daily_counts, refolding, roll_up_daily_stats
+
+# Noon UTC is the same calendar day in the statistics timezone
+DAY_ONE = datetime(2025, 3, 3, 12, 0, tzinfo=UTC)
+DAY_TWO = datetime(2025, 3, 4, 12, 0, tzinfo=UTC)
+
+
+def _venue(db: Session) -> Venue:
+    institution = Institution(name="Rollup Test Institute", city="Vijayawada")
+    db.add(institution)
+    db.flush()
+    venue = Venue(
+        institution_id=institution.id, name="Rollup Hall",
+        latitude=16.4663, longitude=80.6747, radius_meters=100.0
+    )
+    db.add(venue)
+    db.flush()
+    db.add(QRSession(
+        session_id="rollup-session", venue_id=venue.id,
+        expires_at=datetime.now(UTC) + timedelta(minutes=15)
+    ))
+    db.flush()
+    return venue
+
+
+def _attend(db: Session, venue: Venue, roll_no: str, timestamp: datetime, valid: bool = True) -> Attendance:
+    attendance = Attendance(
+        session_id="rollup-session", venue_id=venue.id, name="Student", roll_no=roll_no,
+        branch="CSE", section="A", location_lat=16.4663, location_lon=80.6747,
+        is_valid_location=valid, timestamp=timestamp, created_at=timestamp
+    )
+    db.add(attendance)
+    db.flush()
+    return attendance
+
+
+def _rolled_up(db: Session, venue: Venue) -> dict:
+    rows = db.execute(
+        text("SELECT day, total, valid, invalid FROM daily_attendance_stats WHERE venue_id = :venue_id ORDER BY day"),
+        {"venue_id": venue.id}
+    ).fetchall()
+    return {row.day: (row.total, row.valid, row.invalid) for row in rows}
+
+
+@pytest.mark.attendance
+def test_rollup_folds_rows_once(db: Session):
+    backfill_daily_stats(db)
+    venue = _venue(db)
+    _attend(db, venue, "1", DAY_ONE)
+    _attend(db, venue, "2", DAY_ONE, valid=False)
+    _attend(db, venue, "3", DAY_TWO)
+    db.commit()
+
+    assert roll_up_daily_stats(db, lag_seconds=0) == 3
+    expected = {date(2025, 3, 3): (2, 1, 1), date(2025, 3, 4): (1, 1, 0)}
+    assert _rolled_up(db, venue) == expected
+
+    # Nothing new: a second run folds nothing and counts stay the same
+    assert roll_up_daily_stats(db, lag_seconds=0) == 0
+    assert _rolled_up(db, venue) == expected
+
+    # Rebuilding from scratch gives the same result
+    backfill_daily_stats(db)
+    assert _rolled_up(db, venue) == expected
+
+
+@pytest.mark.attendance
+def test_rollup_skips_rows_without_a_day(db: Session):
+    backfill_daily_stats(db)
+    venue = _venue(db)
+    no_timestamp = _attend(db, venue, "1", DAY_ONE)
+    no_time_at_all = _attend(db, venue, "2", DAY_ONE)
+    _attend(db, venue, "3", DAY_ONE)
+    db.execute(
+        text("UPDATE attendances SET timestamp = NULL WHERE id IN (:a, :b)"),
+        {"a": no_timestamp.id, "b": no_time_at_all.id}
+    )
+    db.execute(text("UPDATE attendances SET created_at = NULL WHERE id = :id"), {"id": no_time_at_all.id})
+    db.commit()
+
+    # The row without any time doesn't stall the job; the other falls back to created_at
+    assert roll_up_daily_stats(db, lag_seconds=0) == 2
+    assert _rolled_up(db, venue) == {date(2025, 3, 3): (2, 2, 0)}
+    assert roll_up_daily_stats(db, lag_seconds=0) == 0
+
+
+@pytest.mark.attendance
+def test_daily_counts_adds_rows_not_yet_rolled_up(db: Session):
+    backfill_daily_stats(db)
+    venue = _venue(db)
+    _attend(db, venue, "1", DAY_ONE)
+    _attend(db, venue, "2", DAY_TWO)
+    db.commit()
+    roll_up_daily_stats(db, lag_seconds=0)
+
+    # Written after the last rollup run
+    _attend(db, venue, "3", DAY_TWO, valid=False)
+    db.commit()
+
+    counts = daily_counts(db, date(2025, 3, 1), date(2025, 3, 31), venue_id=venue.id)
+    assert counts == {
+        "2025-03-03": {"total": 1, "valid": 1, "invalid": 0},
+        "2025-03-04": {"total": 2, "valid": 1, "invalid": 1}
+    }
+    assert daily_counts(db, date(2025, 3, 4), date(2025, 3, 4), venue_id=venue.id) == {
+        "2025-03-04": {"total": 2, "valid": 1, "invalid": 1}
+    }
+
+
+@pytest.mark.attendance
+def test_refolding_keeps_counters_in_step_with_changed_rows(db: Session):
+    backfill_daily_stats(db)
+    venue = _venue(db)
+    folded = _attend(db, venue, "1", DAY_ONE)
+    _attend(db, venue, "2", DAY_ONE)
+    db.commit()
+    roll_up_daily_stats(db, lag_seconds=0)
+    not_yet_folded = _attend(db, venue, "3", DAY_ONE)
+    db.commit()
+
+    # As the location revalidation script does with --apply
+    changed = [folded.id, not_yet_folded.id]
+    with refolding(db, changed):
+        db.execute(
+            text("UPDATE attendances SET is_valid_location = FALSE WHERE id IN (:a, :b)"),
+            {"a": changed[0], "b": changed[1]}
+        )
+    db.commit()
+
+    assert _rolled_up(db, venue) == {date(2025, 3, 3): (2, 1, 1)}
+    # The row past the watermark is counted once, by the next run
+    roll_up_daily_stats(db, lag_seconds=0)
+    assert _rolled_up(db, venue) == {date(2025, 3, 3): (3, 1, 2)}
+    backfill_daily_stats(db)
+    assert _rolled_up(db, venue) == {date(2025, 3, 3): (3, 1, 2)}
+
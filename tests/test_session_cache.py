@@ -0,0 +1,68 @@
+import pytest
+from types import SimpleNamespace
+from datetime import datetime, timedelta, UTC
+from app.services.session_cache import SessionCache
+
+def make_session(session_id: str, minutes: int = 2, venue_id: int = 1):
+    now = datetime.now(UTC)
+    return SimpleNamespace(
+        session_id=session_id,
+        created_at=now,
+        expires_at=now + timedelta(minutes=minutes),
+        venue_id=venue_id
+    )
+
+def make_venue(venue_id: int = 1):
+    return SimpleNamespace(
+        id=venue_id,
+        institution_id=1,
+        name="Seminar Hall",
+        latitude=16.4663003,
+        longitude=80.6747153,
+        radius_meters=100.0,
+        geofence_zones=None
+    )
+
+@pytest.mark.qr_session
+def test_cache_hit_and_miss_counters():
+    cache = SessionCache(max_entries=10)
+    assert cache.get("missing") is None
+
+    cache.put(make_session("s1"), make_venue())
+    cached = cache.get("s1")
+    assert cached is not None
+    assert cached.venue.name == "Seminar Hall"
+    assert not cached.is_expired()
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+@pytest.mark.qr_session
+def test_cache_entry_expires_with_session():
+    cache = SessionCache(max_entries=10)
+    session = make_session("s1")
+    cache.put(session)
+    cache._entries["s1"].expires_at = datetime.now(UTC) - timedelta(seconds=1)
+
+    assert cache.get("s1") is None
+    assert cache.stats()["entries"] == 0
+
+@pytest.mark.qr_session
+def test_cache_skips_already_expired_sessions():
+    cache = SessionCache(max_entries=10)
+    cache.put(make_session("old", minutes=-1))
+    assert cache.stats()["entries"] == 0
+
+@pytest.mark.qr_session
+def test_cache_evicts_least_recently_used():
+    cache = SessionCache(max_entries=2)
+    cache.put(make_session("s1"))
+    cache.put(make_session("s2"))
+    cache.get("s1")
+    cache.put(make_session("s3"))
+
+    assert cache.get("s2") is None
+    assert cache.get("s1") is not None
+    assert cache.get("s3") is not None
@@ -0,0 +1,43 @@
+import pytest
+from app.services.statistics import TTLCache
+
+def test_ttl_cache_computes_once_until_invalidated():
+    cache = TTLCache(ttl_seconds=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"total_attendance": len(calls)}
+
+    assert cache.get_or_compute("summary", compute) == {"total_attendance": 1}
+    assert cache.get_or_compute("summary", compute) == {"total_attendance": 1}
+    cache.invalidate()
+    assert cache.get_or_compute("summary", compute) == {"total_attendance": 2}
+
+def test_ttl_cache_entries_expire(monkeypatch):
+    cache = TTLCache(ttl_seconds=5)
+    now = [1000.0]
+    monkeypatch.setattr("app.services.statistics.time.monotonic", lambda: now[0])
+
+    cache.set("summary", 42)
+    assert cache.get("summary") == 42
+    now[0] += 5
+    assert cache.get("summary") is None
+
+def test_ttl_cache_disabled_with_zero_ttl():
+    cache = TTLCache(ttl_seconds=0)
+    cache.set("summary", 42)
+    assert cache.get("summary") is None
+
+def test_compute_started_before_invalidate_is_not_stored():
+    cache = TTLCache(ttl_seconds=60)
+
+    def slow_compute():
+        # An attendance write invalidates while the summary is being computed
+        cache.invalidate()
+        return {"total_attendance": 1}
+
+    assert cache.get_or_compute("summary", slow_compute) == {"total_attendance": 1}
+    assert cache.get("summary") is None
+    assert cache.get_or_compute("summary", lambda: {"total_attendance": 2}) == {"total_attendance": 2}
+    assert cache.get("summary") == {"total_attendance": 2}
@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta, UTC
+
+from prometheus_client import REGISTRY
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app.models  # noqa: F401  (configures the mappers that refer to each other)
+import app.models.institution  # noqa: F401
+import app.models.venue  # noqa: F401
+from app.models.upload_outbox import UploadOutbox
+from app.services.upload_queue import SelfieUploadQueue
+from app.utils.blob_storage import InMemoryBlobStorage, LocalBlobStorage
+
+SELFIE = b"\xff\xd8\xff\xe0" + b"0" * 100 + b"\xff\xd9"
+
+
+class FailingBlobStorage(InMemoryBlobStorage):
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> str:
+        raise ConnectionError("storage unavailable")
+
+
+async def _setup(tmp_path, target, max_attempts: int = 5):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.sqlite3'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(UploadOutbox.__table__.create)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    queue = SelfieUploadQueue(
+        target=target,
+        staging=LocalBlobStorage(root_dir=str(tmp_path / "staging")),
+        max_attempts=max_attempts,
+        session_factory=session_factory
+    )
+    return engine, session_factory, queue
+
+
+async def _stage(queue, session_factory) -> str:
+    async with session_factory() as db:
+        key = await queue.stage(db, SELFIE, "image/jpeg")
+        await db.commit()
+    return key
+
+
+async def _make_due(session_factory) -> None:
+    # Skip the grace period the in-process worker gets before the sweeper
+    async with session_factory() as db:
+        await db.execute(update(UploadOutbox).values(next_attempt_at=datetime.now(UTC) - timedelta(seconds=1)))
+        await db.commit()
+
+
+async def _row(session_factory) -> UploadOutbox:
+    async with session_factory() as db:
+        return (await db.execute(select(UploadOutbox))).scalars().one()
+
+
+def test_staged_upload_is_claimed_uploaded_and_marked_done(tmp_path):
+    async def scenario():
+        target = InMemoryBlobStorage()
+        engine, session_factory, queue = await _setup(tmp_path, target)
+        key = await _stage(queue, session_factory)
+
+        assert await queue.claim_due(limit=10) == []  # still within the grace period
+        await _make_due(session_factory)
+        claimed = await queue.claim_due(limit=10)
+        assert await queue.claim_due(limit=10) == []  # leased by the first claim
+
+        uploaded = await queue.upload(key)
+        row = await _row(session_factory)
+        staged = await queue.staging.exists(key)
+        await engine.dispose()
+        return key, claimed, uploaded, row, staged, target
+
+    key, claimed, uploaded, row, staged, target = asyncio.run(scenario())
+    assert claimed == [key]
+    assert uploaded
+    assert target.blobs[key] == SELFIE
+    assert row.status == "done"
+    assert not staged
+
+
+def test_failed_upload_backs_off_then_gives_up(tmp_path):
+    async def scenario():
+        engine, session_factory, queue = await _setup(tmp_path, FailingBlobStorage(), max_attempts=2)
+        key = await _stage(queue, session_factory)
+
+        first = await queue.upload(key)
+        after_first = await _row(session_factory)
+        second = await queue.upload(key)
+        after_second = await _row(session_factory)
+        staged = await queue.staging.exists(key)
+        await engine.dispose()
+        return first, after_first, second, after_second, staged
+
+    first, after_first, second, after_second, staged = asyncio.run(scenario())
+    assert not first and not second
+    assert after_first.status == "pending"
+    assert after_first.attempts == 1
+    assert "storage unavailable" in after_first.last_error
+    retry_in = after_first.next_attempt_at.replace(tzinfo=UTC) - datetime.now(UTC)
+    assert timedelta(seconds=5) < retry_in <= timedelta(seconds=10)
+    assert after_second.status == "failed"
+    assert after_second.attempts == 2
+    assert staged  # kept for a manual retry
+
+
+def test_missing_staged_bytes_are_not_marked_done(tmp_path):
+    async def scenario():
+        engine, session_factory, queue = await _setup(tmp_path, InMemoryBlobStorage())
+        key = await _stage(queue, session_factory)
+        await queue.staging.delete(key)  # e.g. staging wiped by a redeploy
+
+        missing_before = REGISTRY.get_sample_value("selfie_uploads_missing_staged_total") or 0.0
+        uploaded = await queue.upload(key)
+        missing_after = REGISTRY.get_sample_value("selfie_uploads_missing_staged_total")
+        row = await _row(session_factory)
+        await engine.dispose()
+        return uploaded, row, missing_after - missing_before
+
+    uploaded, row, missing = asyncio.run(scenario())
+    assert not uploaded
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert "missing" in row.last_error
+    assert missing == 1
+
+
+def test_missing_staged_bytes_already_in_storage_are_done(tmp_path):
+    async def scenario():
+        target = InMemoryBlobStorage()
+        engine, session_factory, queue = await _setup(tmp_path, target)
+        key = await _stage(queue, session_factory)
+        # Another worker uploaded it and cleaned up staging
+        await target.put(SELFIE)
+        await queue.staging.delete(key)
+
+        uploaded = await queue.upload(key)
+        row = await _row(session_factory)
+        await engine.dispose()
+        return uploaded, row
+
+    uploaded, row = asyncio.run(scenario())
+    assert uploaded
+    assert row.status == "done"